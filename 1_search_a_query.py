@@ -5,6 +5,9 @@ parser = argparse.ArgumentParser()
 parser.add_argument("query", help='The search query, e.g.:\'TITLE-ABS-KEY(sentiment analysis) '
                                   'AND PUBYEAR > 2000 AND PUBYEAR < 2010 '
                                   'AND SUBJAREA(COMP) OR SUBJAREA(MATH) OR SUBJAREA(DECI) OR SUBJAREA(SOCI)\'')
+parser.add_argument("--workers", type=int, default=1, help='number of result pages downloaded concurrently')
+parser.add_argument("--cursor", action='store_true', help='use cursor paging to download more than 5000 results')
+parser.add_argument("--max-items", type=int, default=5000, help='max number of results to download')
 args = parser.parse_args()
 
 #q = 'TITLE-ABS-KEY({args.keys}) AND PUBYEAR > {args.start_year} AND PUBYEAR < {args.end_year}'.format(args=args)
@@ -13,4 +16,7 @@ q = args.query
 ScopusSearch(query=q,
              items_per_query=25,
              view='COMPLETE',  # ONLY STANDARD AT HOME; need complete to get authors data!
+             workers=args.workers,
+             cursor=args.cursor,
+             max_items=args.max_items,
              )
\ No newline at end of file
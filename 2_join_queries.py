@@ -1,49 +1,78 @@
+"""
+Joins cached search queries into a single data/joined_searches/{folder}/ dataset
+Entries are streamed from each query and written as they come, duplicated eids are written once
+
+    python 2_join_queries.py "TITLE-ABS-KEY(deep learning)*" "TITLE(neural network)" --output dl --format parquet
+
+Without queries the cached queries are listed and the ones to join are asked for
+"""
+
+import argparse
+import logging
 import os
-import json
 import time
 import sys
 
-SCOPUS_SEARCH_DIR = os.path.abspath('data/search')
+from api.scopus_dataset import JOINED_FORMATS
+from api.scopus_join import JOINED_SEARCHES_DIR, cached_queries, join_queries, match_queries
 
-combined_results_list = []
+# log config
+logging.basicConfig()
+logging.getLogger().setLevel(logging.INFO)
+script_log = logging.getLogger(' JoinQueries ')
 
-folders_list = os.listdir(SCOPUS_SEARCH_DIR)
-queries_list = [x.replace('_',' ') for x in folders_list if "REFEID" not in x and '.' not in x]
+# parse arguments from terminal
+parser = argparse.ArgumentParser()
+parser.add_argument("queries", nargs='*',
+                    help='cached queries to join, by name or by shell-style pattern (*, ?, [seq]), quote them in the shell')
+parser.add_argument("--list", action='store_true', help='list the cached queries and exit')
+parser.add_argument("--output", help='name of the folder created inside data/joined_searches/, the current time by default')
+parser.add_argument("--format", choices=JOINED_FORMATS, default='json',
+                    help='json: a pretty printed clean.json list; parquet: a columnar, compressed clean.parquet file '
+                         '(requires pyarrow), the 3_* builders only read the columns they need from it')
+args = parser.parse_args()
 
-for i in range(len(queries_list)):
-    print('{}\t-->\t{}\t'.format(i, queries_list[i]))
+queries_list = cached_queries()
 
-join_str = input('Please type the list of queries to join (indexes, comma-separated: i.e. \'1,2,4,12\'):')
+if args.list:
+    for query in queries_list:
+        print(query)
+    sys.exit(0)
 
-for i in join_str.split(','):
-    if int(i) not in range(len(queries_list)):
-        raise IndexError('Please, be sure to input the correct query list indexes.')
+if args.queries:
+    try:
+        join_list = match_queries(args.queries, queries_list)
+    except ValueError as e:
+        parser.error(str(e))
+else:
+    for i in range(len(queries_list)):
+        print('{}\t-->\t{}\t'.format(i, queries_list[i]))
 
-join_list = [queries_list[int(i)] for i in join_str.split(',') if int(i) in range(len(queries_list))]
+    join_str = input('Please type the list of queries to join (indexes, comma-separated: i.e. \'1,2,4,12\'):')
 
-for i in join_list:
-    print('Join query {}'.format(i))
-    JSON_DATA_FILE = os.path.join(SCOPUS_SEARCH_DIR, i.replace(' ', '_'), 'clean.json')
-    # load results list from a previously saved JSON data file
-    with open(JSON_DATA_FILE) as data:
-        combined_results_list += json.load(data)
-        data.close()
+    for i in join_str.split(','):
+        if int(i) not in range(len(queries_list)):
+            raise IndexError('Please, be sure to input the correct query list indexes.')
 
-OUTPUT_DIR = os.path.abspath('data/joined_searches/{}'.format(time.strftime("%d%m%Y_%H%M%S")))
-os.makedirs(OUTPUT_DIR)
+    join_list = [queries_list[int(i)] for i in join_str.split(',') if int(i) in range(len(queries_list))]
 
-OUTPUT_FILE = os.path.join(OUTPUT_DIR, 'clean.json')
+OUTPUT_DIR = os.path.join(JOINED_SEARCHES_DIR, args.output or time.strftime("%d%m%Y_%H%M%S"))
+if os.path.exists(OUTPUT_DIR):
+    parser.error('{} already exists'.format(OUTPUT_DIR))
 
-with open(OUTPUT_FILE, 'w') as f:
-    json.dump(combined_results_list, f, indent=4)
-    f.close()
+try:
+    OUTPUT_FILE, written_n = join_queries(join_list, OUTPUT_DIR, args.format)
+except ValueError as e:
+    parser.error(str(e))
 
 INFO_FILE = os.path.join(OUTPUT_DIR, 'README')
 with open(INFO_FILE,'w') as f:
-    f.write('Queries joined in clean.json:\n\n')
+    f.write('Queries joined in {}:\n\n'.format(os.path.basename(OUTPUT_FILE)))
     for i in join_list:
         if sys.version_info[0] == 3:
             f.write('{}\n'.format(i))
         else:
             f.write('{}\n'.format(i).encode('utf-8'))
     f.close()
+
+script_log.info('OK. {} unique entries of {} queries written to {}'.format(written_n, len(join_list), OUTPUT_FILE))
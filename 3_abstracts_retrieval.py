@@ -0,0 +1,50 @@
+"""
+Retrieves the abstracts of all the articles of a joined search json file
+Abstracts are cached in data/abstract, like ScopusAbstractRetrieval does, optionally also written to a single file
+"""
+
+import argparse
+import logging
+import os
+
+from api.scopus_bulk import iter_abstracts
+from api.scopus_cache import NdjsonGzWriter
+from api.scopus_dataset import joined_file, read_joined_entries
+
+# log config
+logging.basicConfig()
+logging.getLogger().setLevel(logging.INFO)
+script_log = logging.getLogger(' AbstractsRetrieval ')
+
+# parse arguments from terminal
+parser = argparse.ArgumentParser()
+parser.add_argument("folder", help='name of the folder inside data/joined_searches/ where the clean.json (or clean.parquet) file is located')
+parser.add_argument("--view", default='FULL', help='AbstractRetrieval view: BASIC, META, META_ABS, REF or FULL')
+parser.add_argument("--fields", help='comma-separated list of fields, overrides --view')
+parser.add_argument("--workers", type=int, default=8, help='number of abstracts downloaded concurrently')
+parser.add_argument("--output", help='also write the abstracts to this gzip compressed newline-delimited JSON file')
+args = parser.parse_args()
+
+DATA_DIR = os.path.join(os.path.abspath('data'), 'joined_searches')
+DATA_FILE = joined_file(os.path.join(DATA_DIR, args.folder))
+
+# only the eid column is read from a clean.parquet file
+eids = [entry['eid'] for entry in read_joined_entries(os.path.join(DATA_DIR, args.folder), columns=['eid']) if 'eid' in entry]
+script_log.info('{} articles in {}'.format(len(eids), DATA_FILE))
+
+writer = NdjsonGzWriter(args.output) if args.output else None
+retrieved_n = 0
+try:
+    for eid, abstract in iter_abstracts(eids, fields=args.fields, view=args.view if args.fields is None else None,
+                                        workers=args.workers):
+        retrieved_n += 1
+        if writer is not None:
+            writer.write({'eid': eid, 'abstract': abstract})
+except BaseException:
+    if writer is not None:
+        writer.discard()
+    raise
+if writer is not None:
+    writer.close()
+
+script_log.info('OK. {} abstracts retrieved'.format(retrieved_n))
@@ -7,13 +7,15 @@ CSVs are nodes (articles) and edges (citations) of the graph
 """
 
 import argparse
-from api.scopus_search import ScopusSearch
+from api.scopus_citations import CITATIONS_STATE_FILE, previous_citations_state, read_citations_state, \
+    update_citations, write_citations_state
+from api.scopus_dataset import read_joined_entries
+from api.scopus_graph_export import GRAPH_FORMATS, write_graph
 import os
 import logging
 import time
 import pandas as pd
 from pandas.io.json import json_normalize
-import json
 
 # log config
 logging.basicConfig()
@@ -23,11 +25,18 @@ script_log.info("Script started")
 
 # parse arguments from terminal  
 parser = argparse.ArgumentParser()
-parser.add_argument("folder", help='name of the folder inside data/joined_searches/ where the clean.json file is located')
+parser.add_argument("folder", help='name of the folder inside data/joined_searches/ where the clean.json (or clean.parquet) file is located')
+parser.add_argument("--workers", type=int, default=8, help='number of citations searches running at the same time')
+parser.add_argument("--max-requests", type=int, help='budget of HTTP requests for the citations searches')
+parser.add_argument("--batch-size", type=int, default=1, help='max articles with few citations OR-ed in a single REFEID search')
+parser.add_argument("--graph-format", choices=GRAPH_FORMATS, action='append', default=[],
+                    help='also write the graph to graph.{gdf,graphml,gexf}, without a 4_csv_to_gdf.py pass; can be repeated')
+parser.add_argument("--incremental", action='store_true',
+                    help='reuse the citing articles found by the most recent build of this folder for the articles whose '
+                         'citedby-count did not change, only search the new and the changed ones')
 args = parser.parse_args()
 
 DATA_DIR = os.path.join(os.path.abspath('data'),'joined_searches')
-DATA_FILE = os.path.join(DATA_DIR, args.folder, 'clean.json')
 OUTPUT_DIR = os.path.join('output', args.folder.replace('/', '_slash_'),'articles_citations',time.strftime("%d%m%Y_%H%M%S"))
 NODES_CSV = os.path.join(OUTPUT_DIR, 'nodes.csv')
 EDGES_CSV = os.path.join(OUTPUT_DIR, 'edges.csv')
@@ -35,9 +44,14 @@ EDGES_CSV = os.path.join(OUTPUT_DIR, 'edges.csv')
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-with open(DATA_FILE) as f:
-    keyword_results_list = json.load(f)
-    f.close()
+# clean keywords dataframe from useless columns to free some memory
+# var NODES_COLS will also be used later, shouldn't be changed
+NODES_COLS = [
+                "eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "author", "citedby-count", "dc:identifier",
+                "prism:aggregationType", "prism:coverDate", "prism:publicationName", "source-id", "subtype", "subtypeDescription"
+            ]
+# only NODES_COLS are loaded: a clean.parquet file is read column by column, the others are never decoded
+keyword_results_list = read_joined_entries(os.path.join(DATA_DIR, args.folder), columns=NODES_COLS)
 
 # fill pandas dataframe
 keywords_df = json_normalize(keyword_results_list)
@@ -48,12 +62,6 @@ keywords_df = keywords_df.dropna(subset=['author', 'eid']).drop_duplicates(subse
 # keywords_df.to_csv('debug/keyword_results_list.csv', sep=',', encoding='utf-8') # save csv to file (debug)
 script_log.info('Keyword search: found {} valid results'.format(len(keywords_df.index)))
 
-# clean keywords dataframe from useless columns to free some memory
-# var NODES_COLS will also be used later, shouldn't be changed
-NODES_COLS = [
-                "eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "author", "citedby-count", "dc:identifier",
-                "prism:aggregationType", "prism:coverDate", "prism:publicationName", "source-id", "subtype", "subtypeDescription"
-            ]
 try:
     keywords_df = keywords_df[NODES_COLS]
 except KeyError as e:
@@ -103,25 +111,30 @@ script_log.info('There are about {} citations...'.format(int(with_cit["citedby-c
 # first apply a function to the subset of keywords_df made only by rows where citedby-count > 0 (note: column previously converted to int)
 # a = with_cit_df.apply(lambda row: build_authors_eid_df(row), axis=1)
 
-citations_search_dict = {}
-# test_list = []
-
-# itertuples faster than iterrows, but int indexes: column order matters
+# with --incremental the citations saved by the previous build of this folder are reused, see update_citations()
+previous_citations = {}
+if args.incremental:
+    previous_state = previous_citations_state(os.path.dirname(OUTPUT_DIR))
+    if previous_state is None:
+        script_log.info('No previous build saved its citations, searching all of them')
+    else:
+        script_log.info('Incremental build, previous citations read from {}'.format(previous_state))
+        previous_citations = read_citations_state(previous_state)
+
+# citations searches run concurrently, most cited articles first (see api/scopus_citations.py)
 start = time.time()
-to_be_searched_n = len(with_cit.index)
-
-for row in with_cit.drop_duplicates('eid').itertuples():
-    to_be_searched_n -= 1
-    eid = row[1]
-
-    citations_search_dict[eid] = ScopusSearch(query='REFEID({})'.format(eid),
-                                              items_per_query=25,
-                                              view='COMPLETE', # ONLY STANDARD AT HOME
-                                              no_log=True
-                                              ).valid_results_list
-    script_log.info("Ok, still {} articles with citations to be searched".format(to_be_searched_n))
+cited_eids = list(zip(with_cit['eid'], with_cit['citedby-count']))
+citations_search_dict = update_citations(cited_eids, previous_citations,
+                                         workers=args.workers,
+                                         max_requests=args.max_requests,
+                                         batch_size=args.batch_size,
+                                         items_per_query=25,
+                                         view='COMPLETE', # ONLY STANDARD AT HOME
+                                         )
 
 script_log.info("Citing articles search completed in %.3fs" % (time.time() - start))
+# saved for the next incremental build, only the citing articles columns used here
+write_citations_state(os.path.join(OUTPUT_DIR, CITATIONS_STATE_FILE), cited_eids, citations_search_dict, columns=NODES_COLS)
 
 # create a dataframe from the citations_search_dict
 ddf = pd.DataFrame(dict([(k,pd.Series(v)) for k,v in citations_search_dict.items()]))
@@ -164,4 +177,10 @@ script_log.info("Writing CSV files...")
 nodes_df.to_csv(NODES_CSV, sep=',', encoding='utf-8')
 edges_df.to_csv(EDGES_CSV, sep=',', encoding='utf-8')
 
+# graph files written straight from the nodes and edges dataframes, see api/scopus_graph_export.py
+for graph_format in args.graph_format:
+    graph_file = os.path.join(OUTPUT_DIR, 'graph.{}'.format(graph_format))
+    nodes_n, edges_n = write_graph(graph_file, nodes_df, edges_df, graph_format)
+    script_log.info('Graph written to {}: {} nodes, {} edges'.format(graph_file, nodes_n, edges_n))
+
 script_log.info("OK. ALL DONE. Script terminated.")
@@ -5,14 +5,16 @@ CSVs are nodes (authors) and edges (citations) of the graph
 """
 
 import argparse
-from api.scopus_search import ScopusSearch
-from api.scopus_author_retrieval import ScopusAuthorRetrieval
+from api.scopus_citations import CITATIONS_STATE_FILE, previous_citations_state, read_citations_state, \
+    update_citations, write_citations_state
+from api.scopus_dataset import read_joined_entries
+from api.scopus_affiliation_index import resolve_affiliations
+from api.scopus_flatten import flatten_entries, authorship_with
+from api.scopus_graph_export import GRAPH_FORMATS, write_graph
 import os
 import logging
 import time
 import pandas as pd
-from pandas.io.json import json_normalize
-import json
 
 # log config
 logging.basicConfig()
@@ -21,37 +23,34 @@ script_log = logging.getLogger(' CitationsGraphBuilder')
 script_log.info("Script started")
 
 # % (time.localtime().tm_hour,time.localtime().tm_min,time.localtime().tm_sec)
-def get_current_afid(afid_list):
-    if type(afid_list) is list:
-        return afid_list[-1]['$']
-    else:
-        return ''
-
-        
-def get_missing_afid(row):
-    s = ScopusAuthorRetrieval(authid=row['authid'],view='FULL')
-    row['afid'] = s.afid
-    row['affilname'] = s.affilname
-    row['affiliation-country'] = s.affilname
-    row['affiliation-city'] = s.affilcity
-    return row
-
-    
-def build_authors_eid_series(row):
-    output = {}
-    output['dc:title'] = row['dc:title']
-    output['eid'] = row['eid']
-    #output['author'] = []
-    output['author'] = [a['authid'] for a in row['author']]
-    return pd.Series(output)
+def fill_missing_afid(nodes_df):
+    # authors without affiliation: looked up in the affiliation index of all the cached searches first,
+    # then AuthorRetrieval profiles fetched with multi-ID requests (or from the cache) for the unknown ones;
+    # every affiliation column is filled at once by mapping authid to the resolved values;
+    # as before, the filled rows follow the rows that had an afid
+    missing = nodes_df['afid'].isnull()
+    found = pd.DataFrame.from_dict(resolve_affiliations(nodes_df.loc[missing, 'authid'], view='FULL'), orient='index')
+    for col in ['afid', 'affilname', 'affiliation-city', 'affiliation-country']:
+        if col in found:
+            nodes_df.loc[missing, col] = nodes_df.loc[missing, 'authid'].map(found[col]).fillna('')
+        else:
+            nodes_df.loc[missing, col] = ''
+    return pd.concat([nodes_df[~missing], nodes_df[missing]], axis=0)
 
 # parse arguments from terminal  
 parser = argparse.ArgumentParser()
-parser.add_argument("folder", help='name of the folder inside data/joined_searches/ where the clean.json file is located')
+parser.add_argument("folder", help='name of the folder inside data/joined_searches/ where the clean.json (or clean.parquet) file is located')
+parser.add_argument("--workers", type=int, default=8, help='number of citations searches running at the same time')
+parser.add_argument("--max-requests", type=int, help='budget of HTTP requests for the citations searches')
+parser.add_argument("--batch-size", type=int, default=1, help='max articles with few citations OR-ed in a single REFEID search')
+parser.add_argument("--graph-format", choices=GRAPH_FORMATS, action='append', default=[],
+                    help='also write the graph to graph.{gdf,graphml,gexf}, without a 4_csv_to_gdf.py pass; can be repeated')
+parser.add_argument("--incremental", action='store_true',
+                    help='reuse the citing articles found by the most recent build of this folder for the articles whose '
+                         'citedby-count did not change, only search the new and the changed ones')
 args = parser.parse_args()
 
 DATA_DIR = os.path.join(os.path.abspath('data'),'joined_searches')
-DATA_FILE = os.path.join(DATA_DIR, args.folder, 'clean.json')
 OUTPUT_DIR = os.path.join('output', args.folder.replace('/', '_slash_'),'authors_citations',time.strftime("%d%m%Y_%H%M%S"))
 NODES_CSV = os.path.join(OUTPUT_DIR, 'nodes.csv')
 EDGES_CSV = os.path.join(OUTPUT_DIR, 'edges.csv')
@@ -63,68 +62,43 @@ ITEMS_PER_QUERY=25
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
+# clean keywords dataframe from useless columns to free some memory
+NODES_COLS = [
+        "eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "citedby-count", "dc:identifier",
+        "prism:aggregationType", "prism:coverDate",
+        "prism:publicationName", "source-id", "subtype", "subtypeDescription"
+        ]
+
 # loads the articles dataset coming from the script 2_join_queries.py
-# read JSON data file from the given folder
-with open(DATA_FILE) as f:
-    keyword_results_list = json.load(f)
-    f.close()
+# read JSON (or Parquet) data file from the given folder, only the columns used here: a clean.parquet file is
+# read column by column, the others are never decoded
+keyword_results_list = read_joined_entries(os.path.join(DATA_DIR, args.folder), columns=NODES_COLS + ['author', 'affiliation'])
 
-# fill pandas dataframe with the given joined_search data
-keywords_df = json_normalize(keyword_results_list)
-keywords_df.to_csv('debug/keyword_raw.csv', sep=',', encoding='utf-8')
-# drop rows with null authors
-keywords_df = keywords_df.dropna(subset=['author', 'eid'])
-#keywords_df.to_csv('debug/keyword_dropautheid.csv', sep=',', encoding='utf-8')
+# drop articles with null authors
+keyword_results_list = [e for e in keyword_results_list if e.get('author') is not None and e.get('eid') is not None]
 
+# flatten the search entries in a single pass: articles, authors (first occurrence of each authid, with the
+# last afid of its list as current affiliation), affiliations (first occurrence of each afid) and authorship
+# (one row per article author) tables, see api/scopus_flatten.py
+keywords_flat = flatten_entries(keyword_results_list, NODES_COLS)
+keywords_df = keywords_flat.articles
 
 # keywords_df.to_csv('debug/keyword_results_list.csv', sep=',', encoding='utf-8') # save csv to file (debug)
 script_log.info('Keyword search: found {} valid results'.format(len(keywords_df.index)))
 
-# create a new pandas.Series with affiliations data before clening keywords_df from useless columns
-# one row per each list element inside column affiliation -> Series of dicts
-affiliations_df = keywords_df.apply(lambda x: pd.Series(x['affiliation']), axis=1).stack().reset_index(level=1, drop=True)
-# make pandas.DataFrame from eries of dicts, drop rows without afid and rows with non-unique afid
-affiliations_df = pd.DataFrame(list(affiliations_df)).dropna(subset=['afid']).drop_duplicates(subset=['afid'])
-# clean affiliations dataframe from useless columns
-cols = ['afid', 'affilname', 'affiliation-city', 'affiliation-country']
-affiliations_df = affiliations_df[cols]
+affiliations_df = keywords_flat.affiliations
 # affiliations_df.to_csv('debug/affiliations.csv', sep=',', encoding='utf-8')
 
-# clean keywords dataframe from useless columns to free some memory
-NODES_COLS = [
-        "eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "author", "citedby-count", "dc:identifier",
-        "prism:aggregationType", "prism:coverDate",
-        "prism:publicationName", "source-id", "subtype", "subtypeDescription"
-        ]
-keywords_df = keywords_df[NODES_COLS]
-
-    
-
 # convert the citedby-count column from whatever type it is to int
 keywords_df['citedby-count'] = keywords_df['citedby-count'].apply(int)
 keywords_df.to_csv('debug/keyword_clean.csv', sep=',', encoding='utf-8') # save csv to file (debug)
 
-# create a new pandas.Series with authors data, will be joined with affiliations to make graph nodes
-# one row per each list element inside column author -> Series of dicts
-author_series = keywords_df.apply(lambda x: pd.Series(x['author']), axis=1).stack().reset_index(level=1, drop=True)
-author_series.name = 'author'
-
-
+# one row per article author, with the article columns needed for the edges and the textblobs
+authorship_df = authorship_with(keywords_flat, ["eid", "dc:title", "dc:description", "authkeywords", "citedby-count"])
 
-# Series of dicts to list of dicts and then to a dataframe; also drop duplicates in the end
-authors = pd.DataFrame(list(author_series)).drop_duplicates(subset=['authid'])
+authors = keywords_flat.authors
 authors.to_csv('debug/authors.csv', sep=',', encoding='utf-8')
 
-
-
-# authors['afid'] is a list, we need to keep just the last element of this list (current affiliation)
-authors['afid'] = authors.apply(lambda row: get_current_afid(row['afid']),axis=1)
-# drop the first two columns, useless. [authors = authors.drop(authors.columns[[0, 1]], axis=1)]
-# do this while reordering columns: leave out columns [0:1], make authid [3] first column, afid last
-cols = ['authid', 'authname', 'surname', 'given-name', 'initials', 'afid']
-authors = authors[cols]
-# authors.to_csv('debug/authors.csv', sep=',', encoding='utf-8' # save csv to file (debug)
-
 # create nodes dataframe: left outer join between authors_df and affliations_df on key 'afid'
 # nodes_df columns are the union of authors_df.columns and affiliations_df.columns
 # and information has been joined on afid -> authors now have also affiliation name, city, country
@@ -141,85 +115,61 @@ nodes_df = pd.merge(left=authors, right=affiliations_df, left_on='afid', right_o
 # add null_data rows to nodes_df
 #nodes_df = pd.concat([nodes_df, null_data], axis=0)
 
-# ...like all above but in a single line of code... 
-nodes_df = pd.concat([nodes_df.dropna(subset=['afid']), nodes_df[nodes_df.isnull().afid].apply(lambda row: get_missing_afid(row),axis=1)], axis=0)
+# ...like all above but with batched AuthorRetrieval requests and a single update of the null-afid rows
+nodes_df = fill_missing_afid(nodes_df)
 
 # rename some column to import as a nodes spreadsheed in gephi
-nodes_df.rename(columns={'authid': 'Id', 'authname': 'Label', 'given-name':'firstname', 'affiliation-city':'affilcity','affiliation-country':'affilcountry'}).to_csv(NODES_CSV, sep=',', encoding='utf-8')
+graph_nodes_df = nodes_df.rename(columns={'authid': 'Id', 'authname': 'Label', 'given-name':'firstname', 'affiliation-city':'affilcity','affiliation-country':'affilcountry'})
+graph_nodes_df.to_csv(NODES_CSV, sep=',', encoding='utf-8')
 script_log.info('Nodes written to CSV file.')
 #script_log.info('There are {} authors'.format(len(nodes_df.index)))
 
 # create a dataframe representing relations between eid from keywords search and authors:
-with_cit_authid_eid = keywords_df[keywords_df['citedby-count'] > 0]
+with_cit_df = keywords_df[keywords_df['citedby-count'] > 0]
 # with_cit_df.to_csv('debug/with_cit.csv', sep=',', encoding='utf-8')
-to_be_searched_n = len(with_cit_authid_eid.index)
+to_be_searched_n = len(with_cit_df.index)
 script_log.info('Searching citations for {} articles'.format(to_be_searched_n))
-script_log.info('There are about {} citations...'.format(int(with_cit_authid_eid["citedby-count"].mean()*len(with_cit_authid_eid.index))))
+script_log.info('There are about {} citations...'.format(int(with_cit_df["citedby-count"].mean()*len(with_cit_df.index))))
+# (eid, citedby-count) of the cited articles, used to schedule the citations searches
+cited_eids = list(zip(with_cit_df['eid'], with_cit_df['citedby-count']))
 
-# first apply a function to the subset of keywords_df made only by rows where citedby-count > 0 (note: column previously converted to int)
-# a = with_cit_df.apply(lambda row: build_authors_eid_df(row), axis=1)
-with_cit_authid_eid = with_cit_authid_eid.apply(lambda row: build_authors_eid_series(row), axis=1)
-# a.to_csv('debug/a.csv', sep=',', encoding='utf-8')
-# create a Series of all the authors unpacking the lists inside the author columns
-authid_series = with_cit_authid_eid['author'].apply(pd.Series).stack().reset_index(level=1, drop=True)
-# give a name to the Series to be used as a column
-authid_series.name = 'authid'
-# join the authid_series and the with_cit_authid_eid dataframe after dropping the author column
-with_cit_authid_eid = with_cit_authid_eid.drop('author', axis=1).join(authid_series)
+# one row per author of each article with citations
+with_cit_authid_eid = authorship_df.loc[authorship_df['citedby-count'] > 0, ['dc:title', 'eid', 'authid']]
 
 
+# with --incremental the citations saved by the previous build of this folder are reused, see update_citations()
+previous_citations = {}
+if args.incremental:
+    previous_state = previous_citations_state(os.path.dirname(OUTPUT_DIR))
+    if previous_state is None:
+        script_log.info('No previous build saved its citations, searching all of them')
+    else:
+        script_log.info('Incremental build, previous citations read from {}'.format(previous_state))
+        previous_citations = read_citations_state(previous_state)
+
 # do the second search: for each article with citations, fetch citing articles data from the API
-# iter over all rows inside with_cit_authid_eid and fill a dict with json data from citations search
-citations_search_dict = {}
-# itertuples faster than iterrows, but int indexes: column order matters
+# the searches run concurrently, most cited articles first (see api/scopus_citations.py)
 start = time.time()
-
-for row in with_cit_authid_eid.drop_duplicates('eid').itertuples():
-    to_be_searched_n -= 1
-    # authid = row[0]
-    # title = row[1]
-    eid = row[2]
-
-    citations_search_dict[eid] = ScopusSearch(query='REFEID({})'.format(eid),
-                                              items_per_query=ITEMS_PER_QUERY,
-                                              view='COMPLETE', # ONLY STANDARD AT HOME
-                                              no_log=True
-                                              ).valid_results_list
-    script_log.info("Still {} articles with citations to be searched".format(to_be_searched_n))
+citations_search_dict = update_citations(cited_eids, previous_citations,
+                                         workers=args.workers,
+                                         max_requests=args.max_requests,
+                                         batch_size=args.batch_size,
+                                         items_per_query=ITEMS_PER_QUERY,
+                                         view='COMPLETE', # ONLY STANDARD AT HOME
+                                         )
 
 script_log.info("Second search completed in %.3fs" % (time.time() - start))
-
-# create a dataframe from the dict
-citations_search_df = pd.DataFrame(dict([(k, pd.Series(v)) for k, v in citations_search_dict.items()]))
-citations_search_df = citations_search_df.transpose().stack().reset_index(level=1, drop=True)
-citations_search_df = citations_search_df.to_frame()
-citations_search_df.reset_index(level=0, inplace=True)
-
-# add columns unpacking dict inside the '0' column of new_df
-citations_search_df = pd.concat([citations_search_df.drop([0], axis=1).rename(columns={'index': 'external_eid'}), citations_search_df[0].apply(pd.Series)], axis=1)
-citations_search_df.to_csv('debug/new_df0.csv', sep=',', encoding='utf-8')
-# copy authors data intoa new dataframe, unpacking authors lists. will later be joined to the citations_search_df
-cit_author_df = citations_search_df.apply(lambda x: pd.Series(x['author']),axis=1).stack().reset_index(level=1, drop=True).apply(pd.Series)
-cols = ['authid', 'authname', 'surname', 'given-name', 'initials']
-cit_author_df = cit_author_df[cols]
-# cleanup citations_search_df: select only a few columns
-cols =  [
-    "external_eid",
-    "eid",
-    #"author",
-    #"citedby-count",
-    "dc:title",
-    #"prism:coverDate",
-    #"prism:publicationName",
-    #"subtype",
-    #"subtypeDescription",
-    "dc:description", 
-    "authkeywords"
-]
-
-citations_search_df = citations_search_df[cols]
-# join back author data
-citations_search_df = citations_search_df.join(cit_author_df)
+# saved for the next incremental build, only the citing articles fields used here
+write_citations_state(os.path.join(OUTPUT_DIR, CITATIONS_STATE_FILE), cited_eids, citations_search_dict,
+                      columns=["eid", "dc:title", "dc:description", "authkeywords", "author", "affiliation"])
+
+# flatten the citing articles of every cited article (external_eid) in a single pass, like the keywords search
+citing_entries = [entry for entries in citations_search_dict.values() for entry in entries]
+citations_flat = flatten_entries(citing_entries, ["eid", "dc:title", "dc:description", "authkeywords"])
+citations_flat.articles.insert(0, 'external_eid', [eid for eid, entries in citations_search_dict.items() for _ in entries])
+citations_flat.articles.to_csv('debug/new_df0.csv', sep=',', encoding='utf-8')
+# one row per author of each citing article
+citations_search_df = authorship_with(citations_flat, ["external_eid", "eid", "dc:title", "dc:description", "authkeywords"])
 # drop duplicate rows
 citations_search_df = citations_search_df.drop_duplicates(subset=['eid','authid'])
 # keep only the rows which have a known authid (only authors that have already been found with the first search)
@@ -270,15 +220,18 @@ edges_df.to_csv(EDGES_CSV, sep=',', encoding='utf-8')
 
 script_log.info('Edges written to CSV file.')
 
+# graph files written straight from the nodes and edges dataframes, see api/scopus_graph_export.py
+for graph_format in args.graph_format:
+    graph_file = os.path.join(OUTPUT_DIR, 'graph.{}'.format(graph_format))
+    nodes_n, edges_n = write_graph(graph_file, graph_nodes_df, edges_df, graph_format)
+    script_log.info('Graph written to {}: {} nodes, {} edges'.format(graph_file, nodes_n, edges_n))
+
 new_df = citations_search_df[["eid", "dc:title", "dc:description", "authkeywords","authid"]]
 #new_df.to_csv('debug/new_df4.csv', sep=',', encoding='utf-8')
 
 
 # eid_author_df for tf-idf classification
-eid_author_df = keywords_df.drop('author', axis=1).join(author_series)
-eid_author_df = eid_author_df[["eid", "author", "dc:title", "dc:description", "authkeywords"]]
-# author column is a dict, unpack it into many columns
-eid_author_df = pd.concat([ eid_author_df.drop(['author'], axis=1), eid_author_df['author'].apply(pd.Series)['authid'] ], axis=1).drop_duplicates(subset=['eid', 'authid'])
+eid_author_df = authorship_df[["eid", "dc:title", "dc:description", "authkeywords", "authid"]].drop_duplicates(subset=['eid', 'authid'])
 eid_author_df.to_csv('debug/eid_author_df.csv', sep=',', encoding='utf-8')
 eid_author_df = pd.concat([eid_author_df, new_df], axis=0).fillna(' ');
 eid_author_df['text'] = eid_author_df['dc:title'] + ' ' + eid_author_df['dc:description'].apply(str) + ' ' + eid_author_df['authkeywords']
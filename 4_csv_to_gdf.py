@@ -3,45 +3,41 @@
 """
 Created on Tue Oct 25 09:56:27 2016
 
+Converts the nodes and edges .csv files of a 3_* builder to a graph file (GDF by default, GraphML or GEXF)
+Rows are streamed from the CSV files to a buffered writer, see api/scopus_graph_export.py
+The builders can also write the graph file directly with their --graph-format option
+
 @author: michele
 """
 import argparse
 import csv
-import time
 import os
 
+from api.scopus_graph_export import GRAPH_FORMATS, graph_writer
+
 parser = argparse.ArgumentParser()
 parser.add_argument("folder", help='relative path to the folder containing the nodes and edges .csv files')
+parser.add_argument("--format", choices=GRAPH_FORMATS, default='gdf', help='graph file format, default: gdf')
 args = parser.parse_args()
 
-t = time.strftime("%d%m%Y_%H%M%S")
-
 DIR = os.path.abspath(args.folder)
 NODES_CSV = os.path.join(DIR,'nodes.csv')
 EDGES_CSV = os.path.join(DIR,'edges.csv')
-OUTPUT_GDF = os.path.join(DIR,'graph.gdf')
-
-def write_file(line):
-    with open(OUTPUT_GDF, 'a') as output:
-        output.write(line+'\n')
-        
+OUTPUT_FILE = os.path.join(DIR,'graph.{}'.format(args.format))
 
+with open(NODES_CSV, 'rt') as nodes, open(EDGES_CSV, 'rt') as edges:
+    nodes_reader = csv.reader(nodes)
+    edges_reader = csv.reader(edges)
+    # the first column of both files is the DataFrame index, then node id or source and target, then the attributes
+    nodes_header = next(nodes_reader)
+    edges_header = next(edges_reader)
+    writer = graph_writer(OUTPUT_FILE, args.format, nodes_header[2:], edges_header[3:])
+    try:
+        writer.write_nodes(row[1:] for row in nodes_reader)
+        writer.write_edges(row[1:] for row in edges_reader)
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
 
-with open(NODES_CSV, 'rt') as nodes:
-    reader = csv.reader(nodes)
-    header = next(reader)
-    write_file('nodedef>name VARCHAR,'+' VARCHAR, '.join(header[2:]) +' VARCHAR')
-    #print ', '.join(header[1:])
-    for row in reader:
-        write_file(', '.join('"{}"'.format(i.replace(',',';')) for i in row[1:]))
-    nodes.close()
-    
-with open(EDGES_CSV, 'rt') as edges:
-    reader = csv.reader(edges)
-    header = next(reader)
-    write_file('edgedef>node1 VARCHAR, node2 VARCHAR, '+' VARCHAR, '.join(header[3:-1]) + ' VARCHAR, directed BOOLEAN')
-    #print ', '.join(header[1:])
-    for row in reader:
-        edge_str = ', '.join(i.replace(',',';') for i in row[1:]) #+ ', ' + ', '.join('"{}"'.format(i.replace(',',';')) for i in row[3:-2]) 
-        write_file(edge_str)
-    edges.close()
\ No newline at end of file
+print('{} nodes and {} edges written to {}'.format(writer.nodes_n, writer.edges_n, OUTPUT_FILE))
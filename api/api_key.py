@@ -0,0 +1 @@
+MY_API_KEY = 'test'
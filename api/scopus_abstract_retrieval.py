@@ -1,11 +1,10 @@
-import requests
 import sys
 import os
-import json
 
+from api import scopus_json
 from api.api_key import MY_API_KEY
-
-SCOPUS_ABSTRACT_DIR = os.path.abspath('data/abstract')
+from api.scopus_session import SCOPUS_API_URL, get_session
+from api.scopus_cache import SCOPUS_ABSTRACT_DIR, abstract_file, load_document, store_document
 
 
 class ScopusAbstractRetrieval(object):
@@ -30,9 +29,11 @@ class ScopusAbstractRetrieval(object):
     :type fields: str or unicode
     :param view: 'BASIC','META','META_ABS', 'REF' or 'FULL', default=None
     :type view: str or unicode
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    :type session: requests.Session
     """
 
-    def __init__(self, eid, fields=None, view=None):
+    def __init__(self, eid, fields=None, view=None, session=None):
 
         print ('ScopusAbstractRetrieval class initialization')
 
@@ -53,8 +54,9 @@ class ScopusAbstractRetrieval(object):
         print ('Abstract data directory found at \n\t{}\n'.format(SCOPUS_ABSTRACT_DIR))
 
         # attributes declaration
-        self._url = ("http://api.elsevier.com/content/abstract/eid/" + eid)
+        self._url = (SCOPUS_API_URL + "/content/abstract/eid/" + eid)
         self._EID = eid
+        self._session = session if session is not None else get_session()
         self._JSON = []
         self._json_loaded = False
 
@@ -64,16 +66,17 @@ class ScopusAbstractRetrieval(object):
         self._description = None
         self._authors = []
 
-        JSON_DATA_FILE = os.path.join(SCOPUS_ABSTRACT_DIR,
-                                      self._EID.replace('/', '_slash_').replace(' ', '_') + '.json')
+        JSON_DATA_FILE = abstract_file(self._EID, view if fields is None else None)
+        # cache key of the sqlite backend
+        self._cache_params = {'eid': self._EID, 'field': fields} if fields is not None else {'eid': self._EID, 'view': view}
 
         # check if the query has already been cached and load stored JSON file
-        if not os.path.exists(JSON_DATA_FILE):
+        cached = load_document('abstract', JSON_DATA_FILE, self._cache_params)
+        if cached is None:
             print ('New query: results will be saved into this JSON file: \n\t{}\n'.format(JSON_DATA_FILE))
         else:
             print ('This query has already been cached in the data directory. Loading json from file \n\t{}\n'.format(JSON_DATA_FILE))
-            with open(JSON_DATA_FILE) as d:
-                self._JSON = json.load(d)
+            self._JSON = cached
             self._json_loaded = True
 
         # if not, send query to server, fill JSON from response and dump it to a file
@@ -83,34 +86,32 @@ class ScopusAbstractRetrieval(object):
 
             # view or fields search selection
             if fields is not None:
-                resp = requests.get(self._url,
-                                    headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                    params={'field': fields}
-                                    )
+                resp = self._session.get(self._url,
+                                         headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                         params={'field': fields}
+                                         )
             else:
-                resp = requests.get(self._url,
-                                    headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                    params={'view': view}
-                                    )
+                resp = self._session.get(self._url,
+                                         headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                         params={'view': view}
+                                         )
 
             print ('Current query url:\n\t{}\n'.format(resp.url))
 
             if resp.status_code != 200:
                 # error
                 raise Exception('AbstractRetrievalApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.json()))
-            self._JSON = resp.json()
+            self._JSON = scopus_json.loads(resp.content)
 
             # write fetched JSON file to disk
-            out_file = os.path.join(SCOPUS_ABSTRACT_DIR,
-                                    # remove any / in query to use it as a filename
-                                    self._EID.replace('/', '_slash_').replace(' ', '_') +'.json')
-
-            with open(out_file, 'w') as f:
-                json.dump(self._JSON, f, indent=4)
-                f.close()
+            store_document('abstract', JSON_DATA_FILE, self._cache_params, self._JSON)
 
         # endif
         # json loaded, fill the attributes
+        self._fill_attributes()
+
+    def _fill_attributes(self):
+        """Fill the basic attributes from the JSON response"""
         if 'coredata' in self._JSON.get('abstracts-retrieval-response', []):
             coredata = self._JSON.get('abstracts-retrieval-response', [])['coredata']
             if 'prism:coverDate' in coredata:
@@ -124,7 +125,6 @@ class ScopusAbstractRetrieval(object):
         if 'authors' in self._JSON.get('abstracts-retrieval-response', []):
             self._authors = self._JSON.get('abstracts-retrieval-response', [])['authors']['author']
 
-
     @property
     def query_url(self):
         """Query url"""
@@ -0,0 +1,192 @@
+"""
+Local index of the authors affiliations found in the cached search results.
+
+Every COMPLETE view search entry lists the afid of each author and the affiliations of the article:
+the index maps each authid to all its affiliations (afid, name, city, country) with the first and the last
+cover date the author was seen with it. It is built incrementally: only the search results written or changed
+since the last update() are read.
+
+    python -m api.scopus_affiliation_index
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from api.scopus_cache import SCOPUS_SEARCH_DIR, COMPACT_RESULTS_FILE
+from api.scopus_query_catalog import get_query_catalog, iter_catalog_results
+from api.scopus_bulk import author_affiliations
+
+DEFAULT_AFFILIATION_INDEX = os.path.abspath('data/affiliation_index.sqlite')
+
+AFFILIATION_COLUMNS = ('afid', 'affilname', 'affiliation-city', 'affiliation-country')
+
+# authids bound to each lookup query, below the SQLite limit of 999 host parameters of its older versions
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _search_results_file(query_dir):
+    """The validated results file of a cached search query, None if its download is not complete"""
+    for name in (COMPACT_RESULTS_FILE, 'clean.json'):
+        path = os.path.join(query_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class AffiliationIndex(object):
+    """
+    authid -> affiliations index stored in a SQLite database.
+
+    :param path: the SQLite database file, default=data/affiliation_index.sqlite
+    :type path: str
+    """
+
+    def __init__(self, path=DEFAULT_AFFILIATION_INDEX):
+        self._path = path
+        self._local = threading.local()
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS author_affiliation ('
+                         'authid TEXT NOT NULL, afid TEXT NOT NULL, first_seen TEXT, last_seen TEXT, '
+                         'PRIMARY KEY (authid, afid))')
+            conn.execute('CREATE TABLE IF NOT EXISTS affiliation ('
+                         'afid TEXT PRIMARY KEY, affilname TEXT, city TEXT, country TEXT)')
+            # search results already indexed, with the version (modification or creation time) read
+            conn.execute('CREATE TABLE IF NOT EXISTS source (source TEXT PRIMARY KEY, version REAL NOT NULL)')
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _iter_sources(self):
+        """
+        Yield (source, version, entries loader) for every cached search of the query catalog, citation searches
+        included, from the files and the sqlite store
+        """
+        for entry in get_query_catalog().entries(citations=None):
+            if entry['backend'] == 'sqlite':
+                source = 'sqlite:' + entry['location']
+            else:
+                source = _search_results_file(os.path.join(SCOPUS_SEARCH_DIR, entry['location']))
+                if source is None:
+                    continue
+            yield source, entry['fetched'], lambda entry=entry: iter_catalog_results(entry)
+
+    def update(self):
+        """Index the cached search results added or changed since the last update, return how many were read"""
+        conn = self._connection()
+        indexed = dict(conn.execute('SELECT source, version FROM source'))
+        updated_n = 0
+        for source, version, load_entries in self._iter_sources():
+            if indexed.get(source) == version:
+                continue
+            self.add_entries(load_entries(), source, version)
+            updated_n += 1
+        return updated_n
+
+    def add_entries(self, entries, source=None, version=None):
+        """Index the authors affiliations of search entries; source and version mark them as indexed"""
+        seen = {}
+        affiliations = {}
+        for entry in entries:
+            date = entry.get('prism:coverDate') or None
+            for affiliation in entry.get('affiliation') or []:
+                if affiliation.get('afid'):
+                    affiliations[affiliation['afid']] = (affiliation.get('affilname'), affiliation.get('affiliation-city'),
+                                                         affiliation.get('affiliation-country'))
+            for author in entry.get('author') or []:
+                if 'authid' not in author:
+                    continue
+                for afid in author.get('afid') or []:
+                    key = (author['authid'], afid.get('$'))
+                    if key[1] is None:
+                        continue
+                    first_seen, last_seen = seen.get(key, (date, date))
+                    if date is not None:
+                        first_seen = date if first_seen is None else min(first_seen, date)
+                        last_seen = date if last_seen is None else max(last_seen, date)
+                    seen[key] = (first_seen, last_seen)
+
+        conn = self._connection()
+        with conn:
+            conn.executemany('INSERT INTO author_affiliation (authid, afid, first_seen, last_seen) VALUES (?, ?, ?, ?) '
+                             'ON CONFLICT (authid, afid) DO UPDATE SET '
+                             'first_seen = COALESCE(MIN(first_seen, excluded.first_seen), first_seen, excluded.first_seen), '
+                             'last_seen = COALESCE(MAX(last_seen, excluded.last_seen), last_seen, excluded.last_seen)',
+                             [(authid, afid, first_seen, last_seen) for (authid, afid), (first_seen, last_seen) in seen.items()])
+            conn.executemany('INSERT OR REPLACE INTO affiliation (afid, affilname, city, country) VALUES (?, ?, ?, ?)',
+                             [(afid,) + values for afid, values in affiliations.items()])
+            if source is not None:
+                conn.execute('INSERT OR REPLACE INTO source (source, version) VALUES (?, ?)', (source, version))
+
+    def affiliations(self, authid):
+        """
+        All the affiliations of an author, most recently seen first, as a list of dicts with keys
+        afid, affilname, affiliation-city, affiliation-country, first_seen, last_seen
+        """
+        rows = self._connection().execute(
+            'SELECT aa.afid, a.affilname, a.city, a.country, aa.first_seen, aa.last_seen '
+            'FROM author_affiliation aa LEFT JOIN affiliation a ON a.afid = aa.afid '
+            'WHERE aa.authid = ? ORDER BY aa.last_seen DESC', (authid,))
+        return [dict(zip(AFFILIATION_COLUMNS + ('first_seen', 'last_seen'), row)) for row in rows]
+
+    def current_affiliations(self, authids):
+        """
+        Most recently seen affiliation of each author found in the index,
+        as {authid: {'afid', 'affilname', 'affiliation-city', 'affiliation-country'}}
+        """
+        current = {}
+        authids = list(dict.fromkeys(authids))
+        conn = self._connection()
+        for start in range(0, len(authids), LOOKUP_CHUNK_SIZE):
+            chunk = authids[start:start + LOOKUP_CHUNK_SIZE]
+            rows = conn.execute(
+                'SELECT aa.authid, aa.afid, a.affilname, a.city, a.country '
+                'FROM author_affiliation aa LEFT JOIN affiliation a ON a.afid = aa.afid '
+                'WHERE aa.authid IN ({}) ORDER BY aa.authid, aa.last_seen DESC'.format(', '.join('?' * len(chunk))),
+                chunk)
+            for row in rows:
+                # the first row of each author is its most recently seen affiliation
+                if row[0] not in current:
+                    current[row[0]] = dict((col, value or '') for col, value in zip(AFFILIATION_COLUMNS, row[1:]))
+        return current
+
+    def stats(self):
+        conn = self._connection()
+        return {'authors': conn.execute('SELECT COUNT(DISTINCT authid) FROM author_affiliation').fetchone()[0],
+                'affiliations': conn.execute('SELECT COUNT(*) FROM affiliation').fetchone()[0],
+                'sources': conn.execute('SELECT COUNT(*) FROM source').fetchone()[0]}
+
+
+def resolve_affiliations(authids, index=None, view='FULL'):
+    """
+    Current affiliation of many authors: looked up in the affiliation index first (updated with the latest cached
+    searches), the authors it does not know are retrieved with batched AuthorRetrieval requests.
+    Return {authid: {'afid', 'affilname', 'affiliation-city', 'affiliation-country'}}
+    """
+    index = index if index is not None else AffiliationIndex()
+    index.update()
+    authids = list(authids)
+    resolved = index.current_affiliations(authids)
+    missing = [authid for authid in authids if authid not in resolved]
+    if missing:
+        resolved.update(author_affiliations(missing, view=view))
+    return resolved
+
+
+if __name__ == '__main__':
+    index = AffiliationIndex()
+    print('{} cached searches indexed'.format(index.update()))
+    print(json.dumps(index.stats()))
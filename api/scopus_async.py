@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import os
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from api import scopus_json
+from api.api_key import MY_API_KEY
+from api.scopus_session import SCOPUS_API_URL
+from api.scopus_rate_limit import RETRY_STATUSES, MAX_RETRIES, backoff_delay, get_rate_limiter, retry_after
+from api.scopus_search import ScopusSearch
+from api.scopus_abstract_retrieval import ScopusAbstractRetrieval
+from api.scopus_author_retrieval import ScopusAuthorRetrieval
+from api.scopus_cache import SCOPUS_ABSTRACT_DIR, SCOPUS_AUTHOR_DIR, abstract_file, author_file, load_document, \
+    store_document
+
+DEFAULT_CONCURRENCY = 100
+
+client_log = logging.getLogger(' AsyncScopusClient ')
+
+
+class AsyncScopusClient(object):
+    """
+    Asyncio HTTP client shared by the async API classes.
+
+    Every request issued through the same client counts against a single concurrency limit,
+    so thousands of searches and retrievals can be scheduled at once with asyncio.gather().
+    The limit adapts like the rate of the RateLimiter: it is halved on each HTTP 429 and grows back by one
+    request on each success, up to concurrency.
+    Requires the aiohttp package.
+
+    Use it as an async context manager:
+
+        async with AsyncScopusClient(concurrency=200) as client:
+            results = await AsyncScopusSearch('REFEID(...)', view='COMPLETE', client=client).fetch()
+
+    :param concurrency: max number of requests in flight at the same time, default=100
+    :type concurrency: int
+    :param compression: ask the server for gzip/deflate compressed responses, default=True
+    :type compression: bool
+    :param rate_limiter: RateLimiter used by this client, default=None (the one shared by all the API clients)
+    :type rate_limiter: RateLimiter
+    :param max_retries: max retries on throttling, server and connection errors and timeouts, default=8
+    :type max_retries: int
+    :param timeout: seconds allowed to each request, default=None (the aiohttp default)
+    :type timeout: float
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, compression=True, rate_limiter=None, max_retries=MAX_RETRIES,
+                 timeout=None):
+        if aiohttp is None:
+            raise ImportError('The asyncio API clients need aiohttp, install it with: pip install aiohttp')
+        self._concurrency = concurrency
+        self._compression = compression
+        self._rate_limiter = rate_limiter
+        self._max_retries = max_retries
+        self._timeout = timeout
+        self._limit = concurrency
+        self._in_flight = 0
+        self._slots = None
+        self._session = None
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def open(self):
+        """Create the underlying aiohttp session, must be called from inside the event loop"""
+        if self._session is None:
+            self._slots = asyncio.Condition()
+            timeout = aiohttp.client.DEFAULT_TIMEOUT
+            if self._timeout is not None:
+                timeout = aiohttp.ClientTimeout(total=self._timeout)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._concurrency), timeout=timeout,
+                headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY,
+                         'Accept-Encoding': 'gzip, deflate' if self._compression else 'identity'}
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def concurrency_limit(self):
+        """Current max number of requests in flight"""
+        return self._limit
+
+    async def _acquire_slot(self):
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+
+    async def _release_slot(self, status=None):
+        async with self._slots:
+            self._in_flight -= 1
+            if status == 429:
+                self._limit = max(1, self._limit // 2)
+            elif status == 200:
+                self._limit = min(self._concurrency, self._limit + 1)
+            self._slots.notify_all()
+
+    async def get_json(self, url, params, api_name):
+        """
+        GET url and return the decoded JSON response.
+        Throttling (429), server (5xx) and connection errors and timeouts are retried with jittered backoff, as
+        ScopusSession.request() does; raise on any other non-200 status
+        """
+        self.open()
+        limiter = self._rate_limiter if self._rate_limiter is not None else get_rate_limiter()
+        # aiohttp only accepts str query values
+        params = dict((k, str(v)) for k, v in params.items())
+        attempt = 0
+        while True:
+            # a request holds its slot until its response, not while it waits to be retried
+            await self._acquire_slot()
+            status = None
+            try:
+                await limiter.acquire_async()
+                async with self._session.get(url, params=params) as resp:
+                    text = await resp.text()
+                    status, headers = resp.status, resp.headers
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self._max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                client_log.warning('{}, retrying in {:.1f}s'.format(repr(e), delay))
+            else:
+                limiter.update(status, headers)
+                try:
+                    data = scopus_json.loads(text)
+                except ValueError:
+                    data = text
+                if status == 200:
+                    return data
+                if status not in RETRY_STATUSES or attempt >= self._max_retries:
+                    # error
+                    raise Exception('{0} status {1}, JSON dump:\n{2}\n'.format(api_name, status, data))
+                delay = retry_after(headers)
+                if delay is not None:
+                    limiter.pause(delay)
+                else:
+                    delay = backoff_delay(attempt)
+                client_log.warning('HTTP {} from {}, retrying in {:.1f}s'.format(status, url, delay))
+            finally:
+                await self._release_slot(status)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def _blocking(func, *args):
+    """Run a blocking call (cache files and SQLite I/O) in the default executor, off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def _required_client(client):
+    """
+    The client of an async API object: it must be given, a client created here would have its own concurrency limit
+    and its aiohttp session would never be closed
+    """
+    if client is None:
+        raise ValueError('The asyncio API classes need an AsyncScopusClient, create it with: '
+                         'async with AsyncScopusClient() as client')
+    return client
+
+
+class AsyncScopusSearch(ScopusSearch):
+    """
+    Asyncio counterpart of ScopusSearch.
+
+    The constructor only checks the parameters, results are loaded from the cache or downloaded by fetch().
+    Data is stored with the same layout used by ScopusSearch, so both classes share the same cache.
+
+    :param client: the AsyncScopusClient used for the HTTP calls, required
+    :type client: AsyncScopusClient
+
+    Check the ScopusSearch class documentation for the other parameters.
+    """
+
+    def __init__(self, query, fields=None, view=None, items_per_query=100, max_items=5000, no_log=False, client=None,
+                 validators=None):
+        self._setup(query, fields, view, items_per_query, max_items, no_log, session=None, validators=validators)
+        self._client = _required_client(client)
+
+    def _load(self):
+        # data is loaded by fetch(), never by the blocking lazy loading of ScopusSearch
+        if not self._loaded:
+            raise RuntimeError('The results of an AsyncScopusSearch are loaded by fetch(), await it before reading them')
+
+    async def _get_page_json(self, start_item):
+        return await self._client.get_json(self._url, self._page_params(start_item), 'ScopusSearchApi')
+
+    async def fetch(self):
+        """
+        Load the results from the cache or download them, all pages after the first one concurrently.
+        Each page is stored as soon as it arrives, valid page files left by an interrupted download are reused.
+        """
+        if self._loaded:
+            return self._combined_results_list
+        await _blocking(self._load_cached)
+
+        if not self._json_loaded:
+            start = time.time()
+            stored_pages = await _blocking(self._load_stored_pages)
+            if stored_pages:
+                self._log.info('Resuming download, {} page files already on disk'.format(len(stored_pages)))
+                first_page = stored_pages[min(stored_pages)]
+            else:
+                first_page = await self._get_page_json(0)
+            self._results_n = int(first_page.get('search-results').get('opensearch:totalResults'))
+            self._log.info("Returned {} articles".format(self._results_n))
+
+            to_download_n = self._results_n
+            if to_download_n > self._max_items:
+                self._log.warning('Too many results, truncating to {}'.format(self._max_items))
+                to_download_n = self._max_items
+
+            async def load_or_fetch(start_item):
+                entries = self._stored_page_entries(stored_pages, start_item)
+                if entries is not None:
+                    return entries
+                page = first_page if start_item == 0 and not stored_pages else await self._get_page_json(start_item)
+                return await _blocking(self._store_page, start_item, page)
+
+            pages = await asyncio.gather(*[load_or_fetch(s) for s in range(0, to_download_n, self._items_per_query)],
+                                         return_exceptions=True)
+            # every page that arrived is stored before the first failure is raised, a new fetch() resumes from them
+            for entries in pages:
+                if isinstance(entries, BaseException):
+                    raise entries
+            for entries in pages:
+                self._combined_results_list += entries
+
+            self._log.info("Download completed in %.3fs" % (time.time() - start))
+            await _blocking(self._store_raw)
+
+        await _blocking(self._validate_results)
+        await _blocking(self._record_query, len(self._combined_results_list), not self._json_loaded)
+        self._filter_results()
+        self._loaded = True
+        return self._combined_results_list
+
+
+class AsyncScopusAbstractRetrieval(ScopusAbstractRetrieval):
+    """
+    Asyncio counterpart of ScopusAbstractRetrieval, data is loaded or downloaded by fetch().
+    Responses are cached in the same files used by ScopusAbstractRetrieval.
+
+    :param client: the AsyncScopusClient used for the HTTP calls, required
+    :type client: AsyncScopusClient
+
+    Check the ScopusAbstractRetrieval class documentation for the other parameters.
+    """
+
+    def __init__(self, eid, fields=None, view=None, client=None):
+        if fields is None and view is None:
+            raise ValueError('You must pass the fields parameter XOR the view parameter to select the result data.')
+        self._url = (SCOPUS_API_URL + "/content/abstract/eid/" + eid)
+        self._EID = eid
+        self._params = {'field': fields} if fields is not None else {'view': view}
+        self._cache_params = dict(self._params, eid=eid)
+        self._client = _required_client(client)
+        self._JSON = []
+        self._json_loaded = False
+
+        self._date = None
+        self._publication = None
+        self._title = None
+        self._description = None
+        self._authors = []
+
+    async def fetch(self):
+        """Load the abstract from the cache or download it, then fill the attributes"""
+        json_data_file = abstract_file(self._EID, self._params.get('view'))
+        cached = await _blocking(load_document, 'abstract', json_data_file, self._cache_params)
+        if cached is not None:
+            self._JSON = cached
+            self._json_loaded = True
+        else:
+            if not os.path.exists(SCOPUS_ABSTRACT_DIR):
+                os.makedirs(SCOPUS_ABSTRACT_DIR, exist_ok=True)
+            self._JSON = await self._client.get_json(self._url, self._params, 'AbstractRetrievalApi')
+            await _blocking(store_document, 'abstract', json_data_file, self._cache_params, self._JSON)
+
+        self._fill_attributes()
+        return self._JSON
+
+
+class AsyncScopusAuthorRetrieval(ScopusAuthorRetrieval):
+    """
+    Asyncio counterpart of ScopusAuthorRetrieval, data is loaded or downloaded by fetch().
+    Responses are cached in the same files used by ScopusAuthorRetrieval.
+
+    :param client: the AsyncScopusClient used for the HTTP calls, required
+    :type client: AsyncScopusClient
+
+    Check the ScopusAuthorRetrieval class documentation for the other parameters.
+    """
+
+    def __init__(self, authid, fields=None, view=None, client=None):
+        if fields is None and view is None:
+            raise ValueError('You must pass the fields parameter XOR the view parameter to select the result data.')
+        self._url = (SCOPUS_API_URL + "/content/author/author_id/" + authid)
+        self._EID = authid
+        self._params = {'field': fields} if fields is not None else {'view': view}
+        self._cache_params = dict(self._params, author_id=authid)
+        self._client = _required_client(client)
+        self._JSON = []
+        self._json_loaded = False
+
+    async def fetch(self):
+        """Load the author profile from the cache or download it, then fill the attributes"""
+        json_data_file = author_file(self._EID)
+        cached = await _blocking(load_document, 'author', json_data_file, self._cache_params)
+        if cached is not None:
+            self._JSON = cached
+            self._json_loaded = True
+        else:
+            if not os.path.exists(SCOPUS_AUTHOR_DIR):
+                os.makedirs(SCOPUS_AUTHOR_DIR, exist_ok=True)
+            self._JSON = await self._client.get_json(self._url, self._params, 'AuthorRetrievalApi')
+            await _blocking(store_document, 'author', json_data_file, self._cache_params, self._JSON)
+
+        self._fill_attributes()
+        return self._JSON
@@ -1,10 +1,32 @@
-import requests
 import os
-import json
 
+from api import scopus_json
 from api.api_key import MY_API_KEY
+from api.scopus_session import SCOPUS_API_URL, get_session
+from api.scopus_cache import SCOPUS_AUTHOR_DIR, author_file, load_document, store_document
 
-SCOPUS_AUTHOR_DIR = os.path.abspath('data/author')
+
+def current_affiliation(response):
+    """
+    Current affiliation in an AuthorRetrieval JSON response, as a dict with the same keys of a search entry affiliation:
+    afid, affilname, affiliation-city, affiliation-country; missing values are empty strings
+    """
+    affiliation = {'afid': '', 'affilname': '', 'affiliation-city': '', 'affiliation-country': ''}
+    if 'author-profile' in response.get('author-retrieval-response', [])[0]:
+        profile = response.get('author-retrieval-response', [])[0]['author-profile']
+        if 'affiliation-current' in profile:
+            ip_doc = profile['affiliation-current']['affiliation']['ip-doc']
+            if '@id' in ip_doc:
+                affiliation['afid'] = ip_doc['@id']
+            if 'afdispname' in ip_doc:
+                affiliation['affilname'] = ip_doc['afdispname']
+            if 'address' in ip_doc:
+                address = ip_doc['address']
+                if 'country' in address:
+                    affiliation['affiliation-country'] = address['country']
+                if 'city' in address:
+                    affiliation['affiliation-city'] = address['city']
+    return affiliation
 
 
 class ScopusAuthorRetrieval(object):
@@ -29,9 +51,11 @@ class ScopusAuthorRetrieval(object):
     :type fields: str or unicode
     :param view: 'BASIC','META','META_ABS', 'REF' or 'FULL', default=None
     :type view: str or unicode
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    :type session: requests.Session
     """
 
-    def __init__(self, authid, fields=None, view=None):
+    def __init__(self, authid, fields=None, view=None, session=None):
 
         print ('ScopusAuthorRetrieval class initialization')
 
@@ -52,8 +76,9 @@ class ScopusAuthorRetrieval(object):
         print ('Abstract data directory found at \n\t{}\n'.format(SCOPUS_AUTHOR_DIR))
 
         # attributes declaration
-        self._url = ("http://api.elsevier.com/content/author/author_id/" + authid)
+        self._url = (SCOPUS_API_URL + "/content/author/author_id/" + authid)
         self._EID = authid
+        self._session = session if session is not None else get_session()
         self._JSON = []
         self._json_loaded = False
 
@@ -63,16 +88,17 @@ class ScopusAuthorRetrieval(object):
         self._description = None
         self._authors = []
 
-        JSON_DATA_FILE = os.path.join(SCOPUS_AUTHOR_DIR,
-                                      self._EID.replace('/', '_slash_').replace(' ', '_') + '.json')
+        JSON_DATA_FILE = author_file(self._EID)
+        # cache key of the sqlite backend
+        self._cache_params = {'author_id': self._EID, 'field': fields} if fields is not None else {'author_id': self._EID, 'view': view}
 
         # check if the query has already been cached and load stored JSON file
-        if not os.path.exists(JSON_DATA_FILE):
+        cached = load_document('author', JSON_DATA_FILE, self._cache_params)
+        if cached is None:
             print ('New query: results will be saved into this JSON file: \n\t{}\n'.format(JSON_DATA_FILE))
         else:
             print ('This query has already been cached in the data directory. Loading json from file \n\t{}\n'.format(JSON_DATA_FILE))
-            with open(JSON_DATA_FILE) as d:
-                self._JSON = json.load(d)
+            self._JSON = cached
             self._json_loaded = True
 
         # if not, send query to server, fill JSON from response and dump it to a file
@@ -82,15 +108,15 @@ class ScopusAuthorRetrieval(object):
 
             # view or fields search selection
             if fields is not None:
-                resp = requests.get(self._url,
-                                    headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                    params={'field': fields}
-                                    )
+                resp = self._session.get(self._url,
+                                         headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                         params={'field': fields}
+                                         )
             else:
-                resp = requests.get(self._url,
-                                    headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                    params={'view': view}
-                                    )
+                resp = self._session.get(self._url,
+                                         headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                         params={'view': view}
+                                         )
 
             print ('Current query url:\n\t{}\n'.format(resp.url))
 
@@ -99,41 +125,22 @@ class ScopusAuthorRetrieval(object):
             if resp.status_code != 200:
                 # error
                 raise Exception('AuthorRetrievalApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.json()))
-            self._JSON = resp.json()
+            self._JSON = scopus_json.loads(resp.content)
 
             # write fetched JSON file to disk
-            out_file = os.path.join(SCOPUS_AUTHOR_DIR,
-                                    # remove any / in query to use it as a filename
-                                    self._EID.replace('/', '_slash_').replace(' ', '_') +'.json')
-
-            with open(out_file, 'w') as f:
-                json.dump(self._JSON, f, indent=4)
-                f.close()
+            store_document('author', JSON_DATA_FILE, self._cache_params, self._JSON)
 
         # endif
         # json loaded, fill the attributes ['afid', 'affilname', 'affiliation-city', 'affiliation-country']
-
-        self._afid = ''
-        self._affilname = ''
-        self._affilcountry = ''
-        self._affilcity = ''
-
-        if 'author-profile' in self._JSON.get('author-retrieval-response', [])[0]:
-            profile = self._JSON.get('author-retrieval-response', [])[0]['author-profile']
-            if 'affiliation-current' in profile:
-                affiliation = profile['affiliation-current']['affiliation']['ip-doc']
-                if '@id' in affiliation:
-                    self._afid = affiliation['@id']
-                if 'afdispname' in affiliation:
-                    self._affilname = affiliation['afdispname']
-                if 'address' in affiliation:
-                    address = affiliation['address']
-                    if 'country' in address:
-                        self._affilcountry = address['country']
-                    if 'city' in address:
-                        self._affilcity = address['city']
-
-
+        self._fill_attributes()
+
+    def _fill_attributes(self):
+        """Fill the basic attributes from the JSON response"""
+        affiliation = current_affiliation(self._JSON)
+        self._afid = affiliation['afid']
+        self._affilname = affiliation['affilname']
+        self._affilcountry = affiliation['affiliation-country']
+        self._affilcity = affiliation['affiliation-city']
 
     @property
     def query_url(self):
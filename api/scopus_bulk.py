@@ -0,0 +1,224 @@
+"""
+Bulk retrieval of many documents with the pooled session: cache lookups first, then concurrent downloads.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from api import scopus_json
+from api.api_key import MY_API_KEY
+from api.scopus_session import SCOPUS_API_URL, get_session
+from api.scopus_cache import SCOPUS_ABSTRACT_DIR, SCOPUS_AUTHOR_DIR, abstract_file, author_file, load_document, \
+    store_document
+from api.scopus_author_retrieval import current_affiliation
+
+DEFAULT_WORKERS = 8
+# max author ids in a single AuthorRetrieval request
+AUTHOR_BATCH_SIZE = 25
+# seconds between two throughput log lines
+PROGRESS_INTERVAL = 5.0
+
+bulk_log = logging.getLogger(' ScopusBulk ')
+
+
+def unique(ids):
+    """The ids in input order, without duplicates and empty values"""
+    seen = set()
+    unique_ids = []
+    for i in ids:
+        if i and i not in seen:
+            seen.add(i)
+            unique_ids.append(i)
+    return unique_ids
+
+
+class _Progress(object):
+    """Throughput counters of a bulk retrieval, logged every PROGRESS_INTERVAL seconds and at the end"""
+
+    def __init__(self, name, total_n, cached_n):
+        self._name = name
+        self._total_n = total_n
+        self._cached_n = cached_n
+        self._start = time.time()
+        self._last_log = self._start
+        self.downloaded_n = 0
+        self.failed_n = 0
+
+    def _line(self):
+        elapsed = time.time() - self._start
+        done_n = self.downloaded_n + self.failed_n
+        return '{}: {} cached, {}/{} downloaded, {} failed, {:.1f} downloads/s'.format(
+            self._name, self._cached_n, self.downloaded_n, self._total_n - self._cached_n, self.failed_n,
+            done_n / elapsed if elapsed > 0 else 0.0)
+
+    def update(self):
+        now = time.time()
+        if now - self._last_log >= PROGRESS_INTERVAL:
+            self._last_log = now
+            bulk_log.info(self._line())
+
+    def done(self):
+        bulk_log.info(self._line() + ', completed in %.3fs' % (time.time() - self._start))
+
+
+def iter_abstracts(eids, fields=None, view=None, workers=DEFAULT_WORKERS, session=None):
+    """
+    Retrieve the abstracts of many EIDs, yield (eid, JSON response) pairs as they are available.
+
+    The EIDs are deduplicated and the cache is checked once for each of them: cached abstracts are yielded first,
+    the missing ones are then downloaded by a pool of workers sharing the session (and its rate limiter),
+    stored in the same cache used by ScopusAbstractRetrieval and yielded in completion order.
+    An EID whose download fails is logged and skipped. Throughput is logged while the downloads run.
+
+    :param eids: iterable of abstract EIDs
+    :param fields: comma-separated list of fields to be loaded from the API, IMPORTANT: overrides the view parameter, default=None
+    :param view: 'BASIC','META','META_ABS', 'REF' or 'FULL', default=None
+    :param workers: number of concurrent downloads, default=8
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    """
+    if fields is None and view is None:
+        raise ValueError('You must pass the fields parameter XOR the view parameter to select the result data.')
+    params = {'field': fields} if fields is not None else {'view': view}
+    session = session if session is not None else get_session()
+
+    def cache_params(eid):
+        return dict(params, eid=eid)
+
+    def download(batch):
+        # one EID per request
+        eid, = batch
+        resp = session.get(SCOPUS_API_URL + '/content/abstract/eid/' + eid,
+                           headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY}, params=params)
+        if resp.status_code != 200:
+            raise Exception('AbstractRetrievalApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.text))
+        data = scopus_json.loads(resp.content)
+        store_document('abstract', abstract_file(eid, params.get('view')), cache_params(eid), data)
+        return [(eid, data)]
+
+    eids = unique(eids)
+    missing = []
+    for eid in eids:
+        cached = load_document('abstract', abstract_file(eid, params.get('view')), cache_params(eid))
+        if cached is None:
+            missing.append(eid)
+        else:
+            yield eid, cached
+
+    progress = _Progress('Abstracts', len(eids), len(eids) - len(missing))
+    if missing:
+        if not os.path.exists(SCOPUS_ABSTRACT_DIR):
+            os.makedirs(SCOPUS_ABSTRACT_DIR, exist_ok=True)
+        for eid, data in _iter_downloads(([eid] for eid in missing), download, workers, progress):
+            yield eid, data
+    progress.done()
+
+
+def iter_authors(authids, fields=None, view=None, batch_size=AUTHOR_BATCH_SIZE, workers=DEFAULT_WORKERS, session=None):
+    """
+    Retrieve the profiles of many authors, yield (authid, JSON response) pairs as they are available.
+
+    Like iter_abstracts(), but the missing authors are downloaded batch_size at a time with multi-ID requests
+    (author_id=id1,id2,...); the combined response is split into one cache entry per author, shaped like a single
+    ScopusAuthorRetrieval response, so both share the same cache.
+    Authors missing from a combined response (e.g. merged profiles) are logged and skipped.
+
+    :param authids: iterable of author ids
+    :param fields: comma-separated list of fields to be loaded from the API, IMPORTANT: overrides the view parameter, default=None
+    :param view: 'LIGHT', 'STANDARD', 'ENHANCED', 'METRICS' or 'FULL', default=None
+    :param batch_size: max author ids in a single request, default=25
+    :param workers: number of concurrent requests, default=8
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    """
+    if fields is None and view is None:
+        raise ValueError('You must pass the fields parameter XOR the view parameter to select the result data.')
+    params = {'field': fields} if fields is not None else {'view': view}
+    session = session if session is not None else get_session()
+
+    def cache_params(authid):
+        return dict(params, author_id=authid)
+
+    def download(batch):
+        resp = session.get(SCOPUS_API_URL + '/content/author',
+                           headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                           params=dict(params, author_id=','.join(batch)))
+        if resp.status_code != 200:
+            raise Exception('AuthorRetrievalApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.text))
+        data = scopus_json.loads(resp.content)
+        # a list of profiles, wrapped in author-retrieval-response-list when more than one id is requested
+        profiles = data.get('author-retrieval-response-list', data).get('author-retrieval-response', [])
+        if isinstance(profiles, dict):
+            profiles = [profiles]
+        retrieved = []
+        for profile in profiles:
+            authid = profile.get('coredata', {}).get('dc:identifier', '').replace('AUTHOR_ID:', '')
+            if authid in batch:
+                document = {'author-retrieval-response': [profile]}
+                store_document('author', author_file(authid), cache_params(authid), document)
+                retrieved.append((authid, document))
+        if len(retrieved) < len(batch):
+            bulk_log.warning('{} of {} authors missing from the response: {}'.format(
+                len(batch) - len(retrieved), len(batch), ','.join(set(batch) - set(a for a, _ in retrieved))))
+        return retrieved
+
+    authids = unique(authids)
+    missing = []
+    for authid in authids:
+        cached = load_document('author', author_file(authid), cache_params(authid))
+        if cached is None:
+            missing.append(authid)
+        else:
+            yield authid, cached
+
+    progress = _Progress('Authors', len(authids), len(authids) - len(missing))
+    if missing:
+        if not os.path.exists(SCOPUS_AUTHOR_DIR):
+            os.makedirs(SCOPUS_AUTHOR_DIR, exist_ok=True)
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        for authid, data in _iter_downloads(batches, download, workers, progress):
+            yield authid, data
+    progress.done()
+
+
+def author_affiliations(authids, view='FULL', batch_size=AUTHOR_BATCH_SIZE, workers=DEFAULT_WORKERS, session=None):
+    """
+    Current affiliation of many authors, from the cache or from multi-ID AuthorRetrieval requests,
+    as {authid: {'afid', 'affilname', 'affiliation-city', 'affiliation-country'}}
+    """
+    return dict((authid, current_affiliation(data))
+                for authid, data in iter_authors(authids, view=view, batch_size=batch_size, workers=workers,
+                                                 session=session))
+
+
+def _iter_downloads(tasks, download, workers, progress):
+    """
+    Run download(task) for every task (a list of ids) with a pool of workers,
+    download returns a list of (id, result) pairs; yield them in completion order
+    """
+    tasks = iter(tasks)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # keep a bounded number of downloads queued, so a long input does not become a long queue of futures
+        pending = {}
+        for task in tasks:
+            pending[executor.submit(download, task)] = task
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    progress.failed_n += len(task)
+                    bulk_log.warning('Download of {} failed: {}'.format(','.join(task), e))
+                else:
+                    progress.downloaded_n += len(results)
+                    progress.failed_n += len(task) - len(results)
+                    for i, result in results:
+                        yield i, result
+                next_task = next(tasks, None)
+                if next_task is not None:
+                    pending[executor.submit(download, next_task)] = next_task
+            progress.update()
@@ -0,0 +1,429 @@
+import os
+import gzip
+import hashlib
+import shutil
+import threading
+import time
+
+from api import scopus_json
+from api.scopus_cache_store import DEFAULT_SQLITE_CACHE, SqliteCacheStore
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# on-disk cache layout shared by the blocking and the asyncio API clients
+SCOPUS_SEARCH_DIR = os.path.abspath('data/search')
+SCOPUS_ABSTRACT_DIR = os.path.abspath('data/abstract')
+SCOPUS_AUTHOR_DIR = os.path.abspath('data/author')
+
+# search results storage formats:
+# 'json'      - pretty printed {start}.json page files, raw.json and clean.json
+# 'ndjson.gz' - only the valid entries, written once to a gzip compressed newline-delimited JSON file;
+#               compact page files are kept only until the download is complete
+SEARCH_CACHE_FORMATS = ('json', 'ndjson.gz')
+COMPACT_RESULTS_FILE = 'clean.ndjson.gz'
+# longest file or folder name, in bytes, allowed by most file systems
+MAX_NAME_LENGTH = 255
+
+# cache backends:
+# 'files'  - one folder per search query and one file per abstract or author, see the formats above
+# 'sqlite' - a single SQLite database keyed by the hash of endpoint and request parameters, see SqliteCacheStore
+CACHE_BACKENDS = ('files', 'sqlite')
+# cached endpoints, each one can have its own time to live
+CACHE_ENDPOINTS = ('search', 'abstract', 'author')
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+_SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_duration(value):
+    """Seconds in a duration like '90', '45m', '12h' or '7d', None for None or ''"""
+    if value is None or value == '':
+        return None
+    value = str(value).strip()
+    if value[-1:].lower() in _DURATION_UNITS:
+        return float(value[:-1]) * _DURATION_UNITS[value[-1:].lower()]
+    return float(value)
+
+
+def parse_size(value):
+    """Bytes in a size like '500000', '800M' or '2G', None for None or ''"""
+    if value is None or value == '':
+        return None
+    value = str(value).strip().upper().rstrip('B')
+    if value[-1:] in _SIZE_UNITS:
+        return int(float(value[:-1]) * _SIZE_UNITS[value[-1:]])
+    return int(value)
+
+
+def parse_ttls(value):
+    """Per endpoint time to live from a string like 'search=7d,abstract=90d', as {endpoint: seconds}"""
+    ttls = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        endpoint, _, duration = item.partition('=')
+        endpoint = endpoint.strip()
+        if endpoint not in CACHE_ENDPOINTS:
+            raise ValueError('Unknown cache endpoint {}, use one of {}'.format(endpoint, CACHE_ENDPOINTS))
+        ttls[endpoint] = parse_duration(duration)
+    return ttls
+
+
+_search_cache_format = os.environ.get('SCOPUS_CACHE_FORMAT', 'json')
+_cache_backend = os.environ.get('SCOPUS_CACHE_BACKEND', 'files')
+_sqlite_path = os.environ.get('SCOPUS_CACHE_SQLITE', DEFAULT_SQLITE_CACHE)
+_cache_ttls = parse_ttls(os.environ.get('SCOPUS_CACHE_TTL'))
+_cache_max_size = parse_size(os.environ.get('SCOPUS_CACHE_MAX_SIZE'))
+_cache_store = None
+_cache_store_lock = threading.Lock()
+
+
+def configure_cache(search_format=None, backend=None, sqlite_path=None, ttl=None, max_size=None):
+    """
+    Configure the cache used by all the API clients, parameters left to None are not changed.
+
+    :param search_format: storage format of new search results with the files backend, 'json' or 'ndjson.gz';
+        both formats are always readable, whatever format is selected
+    :param backend: 'files' or 'sqlite'
+    :param sqlite_path: database file of the sqlite backend, default=data/cache.sqlite
+    :param ttl: time to live of the cached responses by endpoint, e.g. {'search': '7d', 'abstract': '90d'};
+        older responses are downloaded again, None as a value means they never expire (the default)
+    :param max_size: size budget of the cache in bytes or as a string like '2G', enforced by prune_cache()
+    """
+    global _search_cache_format, _cache_backend, _sqlite_path, _cache_store, _cache_max_size
+    if search_format is not None:
+        if search_format not in SEARCH_CACHE_FORMATS:
+            raise ValueError('Unknown search cache format {}, use one of {}'.format(search_format, SEARCH_CACHE_FORMATS))
+        _search_cache_format = search_format
+    if backend is not None:
+        if backend not in CACHE_BACKENDS:
+            raise ValueError('Unknown cache backend {}, use one of {}'.format(backend, CACHE_BACKENDS))
+        _cache_backend = backend
+    if sqlite_path is not None:
+        _sqlite_path = sqlite_path
+    if ttl is not None:
+        for endpoint, duration in ttl.items():
+            if endpoint not in CACHE_ENDPOINTS:
+                raise ValueError('Unknown cache endpoint {}, use one of {}'.format(endpoint, CACHE_ENDPOINTS))
+            _cache_ttls[endpoint] = parse_duration(duration)
+    if max_size is not None:
+        _cache_max_size = parse_size(max_size)
+    with _cache_store_lock:
+        _cache_store = None
+
+
+def search_cache_format():
+    """Storage format of new search results"""
+    return _search_cache_format
+
+
+def cache_backend():
+    """Backend used by all the API clients, 'files' or 'sqlite'"""
+    return _cache_backend
+
+
+def cache_ttl(endpoint):
+    """Seconds a cached response of endpoint stays valid, None if it never expires"""
+    return _cache_ttls.get(endpoint)
+
+
+def cache_max_size():
+    """Size budget of the cache in bytes, None if unbounded"""
+    return _cache_max_size
+
+
+def is_expired(created, endpoint, now=None):
+    """True if a response of endpoint cached at the created timestamp is older than the endpoint time to live"""
+    ttl = cache_ttl(endpoint)
+    return ttl is not None and created < (now if now is not None else time.time()) - ttl
+
+
+def touch_cache_file(path):
+    """
+    Record a read of a cache file for the LRU eviction of prune_cache(): its access time is set to now,
+    its modification time is kept since it tells when the response was downloaded
+    """
+    try:
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+    except OSError:
+        # read-only cache, eviction falls back to the modification time
+        pass
+
+
+def get_cache_store():
+    """The SqliteCacheStore shared by all the API clients with the sqlite backend, None with the files backend"""
+    global _cache_store
+    if _cache_backend != 'sqlite':
+        return None
+    with _cache_store_lock:
+        if _cache_store is None:
+            _cache_store = SqliteCacheStore(_sqlite_path)
+        return _cache_store
+
+
+def load_document(endpoint, path, params):
+    """
+    Cached response of a retrieval request, None if it has not been cached.
+    With the files backend it is read from path, with the sqlite backend it is looked up by endpoint and params.
+    """
+    store = get_cache_store()
+    if store is not None:
+        return store.get(endpoint, params, ttl=cache_ttl(endpoint))
+    if os.path.exists(path) and not is_expired(os.path.getmtime(path), endpoint):
+        touch_cache_file(path)
+        return read_json(path)
+    return None
+
+
+def store_document(endpoint, path, params, data):
+    """Cache the response of a retrieval request, see load_document()"""
+    store = get_cache_store()
+    if store is not None:
+        store.put(endpoint, params, data)
+    else:
+        write_json(path, data)
+
+
+def safe_name(name):
+    """
+    Remove any / and space from a query or an id to use it as a file or folder name.
+    Only names too long for the file system (e.g. queries OR-ing many clauses), which could not be cached before,
+    are truncated and suffixed with their hash: every other name is the one always used
+    """
+    name = name.replace('/', '_slash_').replace(' ', '_')
+    encoded = name.encode('utf-8')
+    if len(encoded) > MAX_NAME_LENGTH:
+        name = encoded[:MAX_NAME_LENGTH - 41].decode('utf-8', 'ignore') + '_' + hashlib.sha1(encoded).hexdigest()
+    return name
+
+
+def search_query_dir(query):
+    """Folder holding the page files, raw.json and clean.json of a search query"""
+    return os.path.join(SCOPUS_SEARCH_DIR, safe_name(query))
+
+
+def search_page_file(query_dir, start_item):
+    """JSON file storing the page of results starting at start_item"""
+    return os.path.join(query_dir, str(start_item) + '.json')
+
+
+def compact_results_file(query_dir):
+    """gzip compressed newline-delimited JSON file storing the valid entries of a search query"""
+    return os.path.join(query_dir, COMPACT_RESULTS_FILE)
+
+
+def search_page_offsets(query_dir):
+    """Sorted start offsets of the page files stored in query_dir"""
+    if not os.path.isdir(query_dir):
+        return []
+    return sorted(int(f[:-len('.json')]) for f in os.listdir(query_dir) if f.endswith('.json') and f[:-len('.json')].isdigit())
+
+
+def abstract_file(eid, view=None):
+    """
+    JSON file storing the AbstractRetrieval response for eid.
+    REF view responses hold the reference list instead of the article data, they are stored in their own file
+    """
+    if view is not None and view.upper() == 'REF':
+        return os.path.join(SCOPUS_ABSTRACT_DIR, safe_name(eid) + '.ref.json')
+    return os.path.join(SCOPUS_ABSTRACT_DIR, safe_name(eid) + '.json')
+
+
+def author_file(authid):
+    """JSON file storing the AuthorRetrieval response for authid"""
+    return os.path.join(SCOPUS_AUTHOR_DIR, safe_name(authid) + '.json')
+
+
+def remove_search_pages(query_dir):
+    """Remove the page files of a completed download"""
+    for start_item in search_page_offsets(query_dir):
+        os.remove(search_page_file(query_dir, start_item))
+
+
+def search_query_created(query_dir):
+    """
+    Timestamp of the cached results of a search query: when its results file was written,
+    or when its first page was downloaded if the download is incomplete; None if nothing is cached
+    """
+    for name in (COMPACT_RESULTS_FILE, 'clean.json', 'raw.json'):
+        path = os.path.join(query_dir, name)
+        if os.path.exists(path):
+            return os.path.getmtime(path)
+    offsets = search_page_offsets(query_dir)
+    if offsets:
+        return min(os.path.getmtime(search_page_file(query_dir, start_item)) for start_item in offsets)
+    return None
+
+
+def search_query_expired(query_dir):
+    """True if the cached results of a search query are older than the search time to live"""
+    created = search_query_created(query_dir)
+    return created is not None and is_expired(created, 'search')
+
+
+def remove_search_query(query_dir):
+    """Remove every cached file of a search query"""
+    if os.path.isdir(query_dir):
+        shutil.rmtree(query_dir)
+
+
+def read_json(path):
+    with open(path, 'rb') as f:
+        return scopus_json.load(f)
+
+
+def iter_json_list(path):
+    """
+    Yield the items of a JSON list file. With ijson (optional dependency, pip install ijson) they are parsed
+    one at a time from the file, otherwise the whole list is decoded first.
+    """
+    if ijson is None:
+        for item in read_json(path):
+            yield item
+        return
+    with open(path, 'rb') as f:
+        for item in ijson.items(f, 'item', use_float=True):
+            yield item
+
+
+def write_json(path, data, compact=False):
+    with open(path, 'wb') as f:
+        scopus_json.dump(data, f, pretty=not compact)
+
+
+def iter_ndjson_gz(path):
+    """Yield the items of a gzip compressed newline-delimited JSON file, one at a time"""
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            yield scopus_json.loads(line)
+
+
+def read_ndjson_gz(path):
+    """
+    List of the items of a gzip compressed newline-delimited JSON file.
+    Faster than list(iter_ndjson_gz(path)): the lines are joined and decoded as a single JSON list
+    (they never contain a raw newline, JSON encoders escape it).
+    """
+    with gzip.open(path, 'rb') as f:
+        lines = f.read().rstrip(b'\n')
+    return scopus_json.loads(b'[' + lines.replace(b'\n', b',') + b']') if lines else []
+
+
+def iter_search_results(query_dir):
+    """
+    Yield the valid entries of a cached search query, from the compact file or from the legacy clean.json.
+    Return nothing if the query has not been cached.
+    """
+    if os.path.exists(compact_results_file(query_dir)):
+        for entry in iter_ndjson_gz(compact_results_file(query_dir)):
+            yield entry
+    elif os.path.exists(os.path.join(query_dir, 'clean.json')):
+        for entry in iter_json_list(os.path.join(query_dir, 'clean.json')):
+            yield entry
+
+
+def read_search_results(query_dir):
+    """List of the valid entries of a cached search query, in whatever format it has been stored"""
+    if os.path.exists(compact_results_file(query_dir)):
+        return read_ndjson_gz(compact_results_file(query_dir))
+    if os.path.exists(os.path.join(query_dir, 'clean.json')):
+        return read_json(os.path.join(query_dir, 'clean.json'))
+    return []
+
+
+class JsonListWriter(object):
+    """
+    Write a JSON list one item at a time, without keeping the list in memory.
+    Items go to a temporary file which replaces path only on close(), so an interrupted write never
+    leaves a truncated file behind.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._tmp_path = path + '.part'
+        self._f = open(self._tmp_path, 'wb')
+        self._f.write(b'[')
+        self._items_n = 0
+
+    def write(self, item):
+        self._f.write(b',\n' if self._items_n else b'\n')
+        scopus_json.dump(item, self._f, pretty=True)
+        self._items_n += 1
+
+    def close(self):
+        self._f.write(b'\n]' if self._items_n else b']')
+        self._f.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self):
+        self._f.close()
+        os.remove(self._tmp_path)
+
+
+class SearchPageWriter(object):
+    """
+    Write a search page file one entry at a time, for the pages whose entries are parsed from the response stream.
+    Same interface as JsonListWriter: the file replaces path only on close().
+
+    :param results: the members of search-results written before the entry list, e.g. opensearch:totalResults
+    :param pretty: pretty print the entries, as write_json() does
+    """
+
+    def __init__(self, path, results, pretty=True):
+        self._path = path
+        self._tmp_path = path + '.part'
+        self._pretty = pretty
+        self._f = open(self._tmp_path, 'wb')
+        self._f.write(b'{"search-results": {')
+        for key, value in results.items():
+            self._f.write(scopus_json.dumps(key) + b': ' + scopus_json.dumps(value) + b', ')
+        self._f.write(b'"entry": [')
+        self._items_n = 0
+
+    def write(self, item):
+        self._f.write(b',\n' if self._items_n else b'\n')
+        scopus_json.dump(item, self._f, pretty=self._pretty)
+        self._items_n += 1
+
+    def close(self):
+        self._f.write(b'\n]}}' if self._items_n else b']}}')
+        self._f.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self):
+        self._f.close()
+        os.remove(self._tmp_path)
+
+
+class NdjsonGzWriter(object):
+    """
+    Write items to a gzip compressed newline-delimited JSON file, one at a time.
+    Same interface as JsonListWriter: the file replaces path only on close().
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._tmp_path = path + '.part'
+        self._f = gzip.open(self._tmp_path, 'wb', compresslevel=6)
+
+    def write(self, item):
+        self._f.write(scopus_json.dumps(item))
+        self._f.write(b'\n')
+
+    def close(self):
+        self._f.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self):
+        self._f.close()
+        os.remove(self._tmp_path)
+
+
+def write_ndjson_gz(path, items):
+    writer = NdjsonGzWriter(path)
+    for item in items:
+        writer.write(item)
+    writer.close()
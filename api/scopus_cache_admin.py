@@ -0,0 +1,180 @@
+"""
+Cache policy: statistics, expiration and size budget of the data/ cache.
+
+    python -m api.scopus_cache_admin stats
+    python -m api.scopus_cache_admin prune --ttl search=7d --ttl abstract=90d --max-size 2G
+
+With the files backend a cache entry is a search query folder, an abstract file or an author file:
+its age is the modification time of its results, its last use is the access time set by the API clients when
+they read it. With the sqlite backend an entry is a row of the database, see SqliteCacheStore.
+Entries older than the time to live of their endpoint are removed first, then the least recently used ones
+until the cache fits in the size budget.
+"""
+
+import argparse
+import os
+import time
+
+from api.scopus_cache import SCOPUS_SEARCH_DIR, SCOPUS_ABSTRACT_DIR, SCOPUS_AUTHOR_DIR, CACHE_ENDPOINTS, \
+    cache_max_size, cache_ttl, get_cache_store, configure_cache, parse_duration, parse_size, \
+    search_query_created, remove_search_query
+from api.scopus_query_catalog import get_query_catalog
+
+_ENDPOINT_DIRS = (('search', SCOPUS_SEARCH_DIR), ('abstract', SCOPUS_ABSTRACT_DIR), ('author', SCOPUS_AUTHOR_DIR))
+
+
+def _iter_file_entries():
+    """Yield (endpoint, path, created, accessed, size) for every entry of the files backend"""
+    for endpoint, endpoint_dir in _ENDPOINT_DIRS:
+        if not os.path.isdir(endpoint_dir):
+            continue
+        for name in os.listdir(endpoint_dir):
+            path = os.path.join(endpoint_dir, name)
+            if os.path.isdir(path):
+                # a search query folder, an empty one only counts as old as the folder itself
+                files = [os.stat(os.path.join(path, f)) for f in os.listdir(path)] or [os.stat(path)]
+                created = search_query_created(path)
+                if created is None:
+                    created = min(st.st_mtime for st in files)
+                yield endpoint, path, created, max(max(st.st_atime, st.st_mtime) for st in files), \
+                    sum(st.st_size for st in files)
+            elif not name.endswith('.part'):
+                st = os.stat(path)
+                yield endpoint, path, st.st_mtime, max(st.st_atime, st.st_mtime), st.st_size
+
+
+def _remove_file_entry(path):
+    if os.path.isdir(path):
+        remove_search_query(path)
+        get_query_catalog().remove('files', os.path.basename(path))
+    else:
+        os.remove(path)
+
+
+def _ttls(ttls):
+    """Time to live of every endpoint, the configured ones updated with ttls"""
+    merged = dict((endpoint, cache_ttl(endpoint)) for endpoint in CACHE_ENDPOINTS)
+    merged.update(ttls or {})
+    return merged
+
+
+def cache_stats(ttls=None):
+    """
+    Entries of each endpoint of the configured backend as {endpoint: {'entries', 'bytes', 'expired', 'oldest', 'last_access'}}
+    expired counts the entries older than the configured time to live, updated with ttls ({endpoint: seconds})
+    """
+    ttls = _ttls(ttls)
+    store = get_cache_store()
+    if store is not None:
+        return store.stats(ttls)
+
+    now = time.time()
+    stats = {}
+    for endpoint, path, created, accessed, size in _iter_file_entries():
+        s = stats.setdefault(endpoint, {'entries': 0, 'bytes': 0, 'expired': 0, 'oldest': created, 'last_access': accessed})
+        s['entries'] += 1
+        s['bytes'] += size
+        s['oldest'] = min(s['oldest'], created)
+        s['last_access'] = max(s['last_access'], accessed)
+        if ttls.get(endpoint) is not None and created < now - ttls[endpoint]:
+            s['expired'] += 1
+    return stats
+
+
+def prune_cache(ttls=None, max_size=None, dry_run=False):
+    """
+    Remove the cache entries older than their endpoint time to live, then the least recently used ones
+    until the cache fits in max_size bytes. Return (removed entries number, freed bytes).
+
+    :param ttls: time to live by endpoint as {endpoint: seconds}, updating the configured ones, default=None
+    :param max_size: size budget in bytes, default=None (the configured one, unbounded if not configured)
+    :param dry_run: only count what would be removed, default=False
+    """
+    ttls = _ttls(ttls)
+    if max_size is None:
+        max_size = cache_max_size()
+    store = get_cache_store()
+    if store is not None:
+        pruned = store.prune(ttls, max_size, dry_run)
+        if not dry_run:
+            get_query_catalog().remove_evicted(store)
+        return pruned
+
+    now = time.time()
+    removed, lru, total = [], [], 0
+    for endpoint, path, created, accessed, size in _iter_file_entries():
+        if ttls.get(endpoint) is not None and created < now - ttls[endpoint]:
+            removed.append((path, size))
+        else:
+            lru.append((accessed, path, size))
+            total += size
+
+    if max_size is not None and total > max_size:
+        for accessed, path, size in sorted(lru):
+            if total <= max_size:
+                break
+            removed.append((path, size))
+            total -= size
+
+    if not dry_run:
+        for path, size in removed:
+            _remove_file_entry(path)
+    return len(removed), sum(size for path, size in removed)
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return '{:.1f} {}'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f} TB'.format(size)
+
+
+def _format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp)) if timestamp else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statistics and pruning of the Scopus data cache')
+    parser.add_argument('command', choices=('stats', 'prune'))
+    parser.add_argument('--backend', choices=('files', 'sqlite'), help='cache backend, default: the configured one')
+    parser.add_argument('--ttl', action='append', default=[], metavar='ENDPOINT=DURATION',
+                        help='time to live of an endpoint, e.g. search=7d or abstract=12h; can be repeated')
+    parser.add_argument('--max-size', help='size budget, e.g. 800M or 2G')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    parser.add_argument('--vacuum', action='store_true', help='shrink the sqlite database file after pruning')
+    args = parser.parse_args()
+
+    if args.backend is not None:
+        configure_cache(backend=args.backend)
+    ttls = {}
+    for item in args.ttl:
+        endpoint, _, duration = item.partition('=')
+        if endpoint not in CACHE_ENDPOINTS:
+            parser.error('unknown endpoint {}, use one of {}'.format(endpoint, ', '.join(CACHE_ENDPOINTS)))
+        ttls[endpoint] = parse_duration(duration)
+
+    if args.command == 'prune':
+        removed_n, freed = prune_cache(ttls, parse_size(args.max_size), args.dry_run)
+        print('{} {} entries, {} freed'.format('Would remove' if args.dry_run else 'Removed', removed_n,
+                                               _format_size(freed)))
+        if args.vacuum and not args.dry_run and get_cache_store() is not None:
+            get_cache_store().vacuum()
+
+    stats = cache_stats(ttls)
+    print('{:<10}{:>10}{:>12}{:>10}  {:<18}{:<18}'.format('endpoint', 'entries', 'size', 'expired', 'oldest', 'last access'))
+    for endpoint in CACHE_ENDPOINTS:
+        s = stats.get(endpoint)
+        if s is None:
+            continue
+        print('{:<10}{:>10}{:>12}{:>10}  {:<18}{:<18}'.format(endpoint, s['entries'], _format_size(s['bytes']),
+                                                              s['expired'], _format_time(s['oldest']),
+                                                              _format_time(s['last_access'])))
+    print('total {} entries, {}'.format(sum(s['entries'] for s in stats.values()),
+                                        _format_size(sum(s['bytes'] for s in stats.values()))))
+    if get_cache_store() is not None:
+        print('database file {}, {}'.format(get_cache_store().path, _format_size(os.path.getsize(get_cache_store().path))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from api import scopus_json
+
+DEFAULT_SQLITE_CACHE = os.path.abspath('data/cache.sqlite')
+# reads update the last access time of an entry at most once in this many seconds, so lookups rarely write
+ACCESS_RESOLUTION = 60.0
+
+
+def normalize_params(params):
+    """
+    Normalize request parameters so that equivalent requests get the same cache key:
+    None values are dropped, values are strings, views are upper case and field lists are sorted.
+    """
+    normalized = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        value = str(value)
+        if key == 'view':
+            value = value.upper()
+        elif key == 'field':
+            value = ','.join(sorted(f.strip() for f in value.split(',') if f.strip()))
+        normalized[key] = value
+    return normalized
+
+
+def cache_key(endpoint, params):
+    """Content address of a request: hash of the endpoint and of its normalized parameters"""
+    # always encoded with the json module: keys must not change with the JSON backend
+    payload = json.dumps([endpoint, normalize_params(params)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class SqliteCacheStore(object):
+    """
+    Single file cache shared by all the API clients, indexed by the hash of endpoint and request parameters.
+
+    Lookups hit the primary key index, values are stored as zlib compressed JSON.
+    Each write is a transaction, so readers never see a partial value; the database runs in WAL mode,
+    so any number of readers (threads or processes) can work while a write is in progress.
+    Each thread gets its own connection.
+    The last access time and the size of every entry are tracked for the TTL and LRU eviction of prune().
+
+    :param path: the SQLite database file, default=data/cache.sqlite
+    :type path: str
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_CACHE):
+        self._path = path
+        self._local = threading.local()
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                         'key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, params TEXT NOT NULL, '
+                         'data BLOB NOT NULL, created REAL NOT NULL, '
+                         'accessed REAL NOT NULL DEFAULT 0, size INTEGER NOT NULL DEFAULT 0)')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(cache)')]
+            if 'accessed' not in columns:
+                # database created before the access tracking
+                conn.execute('ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0')
+                conn.execute('ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0')
+                conn.execute('UPDATE cache SET accessed = created, size = length(data)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, endpoint, params, ttl=None):
+        """Cached value of a request, None if missing or stored more than ttl seconds ago"""
+        key = cache_key(endpoint, params)
+        conn = self._connection()
+        row = conn.execute('SELECT data, created, accessed FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        data, created, accessed = row
+        now = time.time()
+        if ttl is not None and created < now - ttl:
+            return None
+        if now - accessed > ACCESS_RESOLUTION:
+            with conn:
+                conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return scopus_json.loads(zlib.decompress(data))
+
+    def contains(self, endpoint, params, ttl=None):
+        row = self._connection().execute('SELECT created FROM cache WHERE key = ?', (cache_key(endpoint, params),)).fetchone()
+        return row is not None and (ttl is None or row[0] >= time.time() - ttl)
+
+    def put(self, endpoint, params, value):
+        """Store the value of a request, replacing any previous one"""
+        data = zlib.compress(scopus_json.dumps(value))
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO cache (key, endpoint, params, data, created, accessed, size) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (cache_key(endpoint, params), endpoint, json.dumps(normalize_params(params), sort_keys=True),
+                          sqlite3.Binary(data), now, now, len(data)))
+
+    def delete(self, endpoint, params):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (cache_key(endpoint, params),))
+
+    def contains_key(self, key):
+        """True if a value is stored under a cache_key()"""
+        return self._connection().execute('SELECT 1 FROM cache WHERE key = ?', (key,)).fetchone() is not None
+
+    def get_by_key(self, key):
+        """Cached value stored under a cache_key(), None if missing"""
+        row = self._connection().execute('SELECT data FROM cache WHERE key = ?', (key,)).fetchone()
+        return scopus_json.loads(zlib.decompress(row[0])) if row is not None else None
+
+    def iter_versions(self, endpoint):
+        """Yield (key, created) for every entry of endpoint, without reading the values"""
+        for key, created in self._connection().execute('SELECT key, created FROM cache WHERE endpoint = ?', (endpoint,)):
+            yield key, created
+
+    def iter_params(self, endpoint):
+        """Yield (key, normalized params, created) for every entry of endpoint, without reading the values"""
+        for key, params, created in self._connection().execute(
+                'SELECT key, params, created FROM cache WHERE endpoint = ?', (endpoint,)):
+            yield key, json.loads(params), created
+
+    def stats(self, ttls=None):
+        """
+        Entries of each endpoint as {endpoint: {'entries', 'bytes', 'expired', 'oldest', 'last_access'}},
+        expired counts the entries older than the ttls given as {endpoint: seconds}
+        """
+        ttls = ttls or {}
+        now = time.time()
+        stats = {}
+        for endpoint, entries_n, size, oldest, last_access in self._connection().execute(
+                'SELECT endpoint, COUNT(*), SUM(size), MIN(created), MAX(accessed) FROM cache GROUP BY endpoint'):
+            expired_n = 0
+            if ttls.get(endpoint) is not None:
+                expired_n = self._connection().execute('SELECT COUNT(*) FROM cache WHERE endpoint = ? AND created < ?',
+                                                       (endpoint, now - ttls[endpoint])).fetchone()[0]
+            stats[endpoint] = {'entries': entries_n, 'bytes': size, 'expired': expired_n,
+                               'oldest': oldest, 'last_access': last_access}
+        return stats
+
+    def prune(self, ttls=None, max_size=None, dry_run=False):
+        """
+        Delete the entries older than the ttls given as {endpoint: seconds}, then the least recently used ones
+        until the stored values fit in max_size bytes. Return (deleted entries number, freed bytes).
+        The database file does not shrink until vacuum() is called, freed pages are reused by new entries.
+        """
+        ttls = dict((endpoint, ttl) for endpoint, ttl in (ttls or {}).items() if ttl is not None)
+        now = time.time()
+
+        def expired(endpoint, created):
+            return endpoint in ttls and created < now - ttls[endpoint]
+
+        conn = self._connection()
+        removed, freed, total = [], 0, 0
+        lru = []
+        for key, endpoint, created, size in conn.execute('SELECT key, endpoint, created, size FROM cache ORDER BY accessed'):
+            if expired(endpoint, created):
+                removed.append((key,))
+                freed += size
+            else:
+                lru.append((key, size))
+                total += size
+
+        if max_size is not None:
+            for key, size in lru:
+                if total <= max_size:
+                    break
+                removed.append((key,))
+                freed += size
+                total -= size
+
+        if not dry_run and removed:
+            with conn:
+                conn.executemany('DELETE FROM cache WHERE key = ?', removed)
+        return len(removed), freed
+
+    def vacuum(self):
+        """Rewrite the database file to give the space freed by deleted entries back to the file system"""
+        self._connection().execute('VACUUM')
+
+
+class StoreListWriter(object):
+    """
+    Collect items and store them as a single list value on close().
+    Same interface as JsonListWriter, nothing is stored if the write is discarded.
+    """
+
+    def __init__(self, store, endpoint, params):
+        self._store = store
+        self._endpoint = endpoint
+        self._params = params
+        self._items = []
+
+    def write(self, item):
+        self._items.append(item)
+
+    def close(self):
+        self._store.put(self._endpoint, self._params, self._items)
+
+    def discard(self):
+        self._items = []
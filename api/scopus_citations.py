@@ -0,0 +1,353 @@
+"""
+Citation fan-out: the REFEID searches of many cited articles, run concurrently by a scheduler.
+
+Articles cited only a few times can be searched in batches: one search ORs the REFEID clauses of several cited
+articles, then each citing article is attributed back to the cited articles in its reference list (REF view of its
+abstract, cached like any other AbstractRetrieval response).
+
+A build can save its citations (write_citations_state()) so that the next one is incremental: update_citations()
+reuses the citing articles of the cited articles whose citedby-count did not change and only searches the others.
+"""
+
+import logging
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from api.scopus_search import ScopusSearch
+from api.scopus_session import get_session
+from api.scopus_bulk import iter_abstracts
+from api.scopus_cache import abstract_file, load_document, NdjsonGzWriter, iter_ndjson_gz
+
+DEFAULT_WORKERS = 8
+# seconds between two progress log lines
+PROGRESS_INTERVAL = 5.0
+# citations of a build, saved in its output folder for the next incremental build
+CITATIONS_STATE_FILE = 'citations.ndjson.gz'
+
+citations_log = logging.getLogger(' CitationsScheduler ')
+
+
+def _citedby_counts(cited):
+    """{eid: citedby-count} of (eid, citedby-count) pairs, the highest count of a duplicated eid"""
+    counts = {}
+    for eid, citedby_n in cited:
+        counts[eid] = max(counts.get(eid, 0), int(citedby_n))
+    return counts
+
+
+def _scheduling_order(counts):
+    """(eid, citedby-count) pairs of a {eid: citedby-count} dict, heavy hitters first, then in input order"""
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)
+
+
+def _estimated_requests(citedby_n, items_per_query, max_items):
+    """Pages needed to download the citing articles of an article cited citedby_n times"""
+    return max(1, int(math.ceil(min(citedby_n, max_items) / float(items_per_query))))
+
+
+def _batches(queue, batch_size, items_per_query, max_items):
+    """
+    Group the (eid, citedby-count) queue into searches, as [(eids tuple, estimated requests)].
+    Articles whose citing articles fit in a single page are batched, up to batch_size per search and as long as
+    the citing articles of the whole batch stay within max_items; the others are searched alone.
+    """
+    tasks = []
+    batch, batch_citedby_n = [], 0
+    for eid, citedby_n in queue:
+        if batch_size <= 1 or citedby_n > items_per_query:
+            tasks.append(((eid,), _estimated_requests(citedby_n, items_per_query, max_items)))
+            continue
+        if batch and (len(batch) >= batch_size or batch_citedby_n + citedby_n > max_items):
+            tasks.append((tuple(batch), _estimated_batch_requests(batch, batch_citedby_n, items_per_query, max_items)))
+            batch, batch_citedby_n = [], 0
+        batch.append(eid)
+        batch_citedby_n += citedby_n
+    if batch:
+        tasks.append((tuple(batch), _estimated_batch_requests(batch, batch_citedby_n, items_per_query, max_items)))
+    return tasks
+
+
+def _estimated_batch_requests(batch, citedby_n, items_per_query, max_items):
+    """Pages of a batch search, plus its attribution: REF abstracts or single searches, whichever is fewer"""
+    if len(batch) == 1:
+        return _estimated_requests(citedby_n, items_per_query, max_items)
+    return _estimated_requests(citedby_n, items_per_query, max_items) + min(citedby_n, len(batch))
+
+
+def reference_eids(response):
+    """EIDs in the reference list of a REF view AbstractRetrieval response"""
+    references = (response.get('abstracts-retrieval-response') or {}).get('references') or {}
+    reference_list = references.get('reference') or []
+    if isinstance(reference_list, dict):
+        reference_list = [reference_list]
+    eids = set()
+    for reference in reference_list:
+        if reference.get('scopus-eid'):
+            eids.add(reference['scopus-eid'])
+        elif reference.get('scopus-id'):
+            eids.add('2-s2.0-{}'.format(reference['scopus-id']))
+    return eids
+
+
+class _Progress(object):
+    """Searches and requests counters of a fan-out run, with throughput and ETA logged every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, searches_n, estimated_n, session):
+        self._searches_n = searches_n
+        self._estimated_n = estimated_n
+        self._session = session
+        self._start_requests_n = getattr(session, 'requests_n', 0)
+        self._start = time.time()
+        self._last_log = self._start
+        self.done_n = 0
+        self.done_estimated_n = 0
+
+    @property
+    def requests_n(self):
+        """Requests sent through the session since the run started, only counted by a ScopusSession"""
+        return getattr(self._session, 'requests_n', 0) - self._start_requests_n
+
+    def _line(self, eta=True):
+        elapsed = time.time() - self._start
+        rate = self.requests_n / elapsed if elapsed > 0 else 0.0
+        searches_rate = self.done_n / elapsed if elapsed > 0 else 0.0
+        remaining_n = max(0, self._estimated_n - self.done_estimated_n)
+        line = '{}/{} articles done, {} requests, {:.1f} requests/s, {:.2f} articles/s'.format(
+            self.done_n, self._searches_n, self.requests_n, rate, searches_rate)
+        if eta:
+            line += ', ETA {}'.format('{:.0f}s'.format(remaining_n / rate) if rate > 0 else '-')
+        return line
+
+    def update(self):
+        now = time.time()
+        if now - self._last_log >= PROGRESS_INTERVAL:
+            self._last_log = now
+            citations_log.info(self._line())
+
+    def done(self):
+        citations_log.info(self._line(eta=False) + ', completed in %.3fs' % (time.time() - self._start))
+
+
+def iter_citations(cited, workers=DEFAULT_WORKERS, max_requests=None, items_per_query=25, view='COMPLETE',
+                   max_items=5000, batch_size=1, session=None, refresh=None):
+    """
+    Search the citing articles of many cited articles (REFEID queries) concurrently,
+    yield (cited eid, valid results list) pairs in scheduling order (decreasing citedby-count, then the order of cited),
+    whatever order the searches complete in, so that the builds do not depend on thread timing. A pair is yielded
+    as soon as the searches of all the eids before it are complete; eids skipped by the budget or whose search
+    failed are left out.
+
+    The searches are scheduled by decreasing citedby-count, so the longest ones start first and the pool is not
+    left waiting on a heavy hitter at the end of the run. Searches cached by a previous run cost no request.
+    Throughput (requests/s, searches/s) and the ETA are logged while the searches run.
+
+    :param cited: iterable of (eid, citedby-count) pairs, duplicated eids are searched once
+    :param workers: number of searches running at the same time, default=8
+    :param max_requests: budget of HTTP requests for the whole run, default=None (unbounded); a search is not
+        started when its estimated pages could exceed the budget, the skipped eids are logged
+    :param items_per_query: results per page, default=25
+    :param view: ScopusSearch view, default='COMPLETE'
+    :param max_items: max citing articles downloaded for a single cited article, default=5000
+    :param batch_size: max cited articles OR-ed in a single search, only articles whose citing articles fit in one page
+        are batched, default=1 (one search per cited article); the citing articles of a batch are attributed back
+        with the REF view of their abstracts, a batch falls back to single searches when that would cost more
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    :param refresh: cited eids whose searches are downloaded again instead of being read from the cache, default=None
+    """
+    session = session if session is not None else get_session()
+    refresh = frozenset(refresh or ())
+    counts = _citedby_counts(cited)
+    queue = _scheduling_order(counts)
+    tasks = _batches(queue, batch_size, items_per_query, max_items)
+    estimated_n = sum(n for _, n in tasks)
+
+    progress = _Progress(len(queue), estimated_n, session)
+    citations_log.info('Searching citations of {} articles with {} searches, about {} requests'.format(
+        len(queue), len(tasks), estimated_n))
+
+    def search(query, stale=False):
+        return ScopusSearch(query=query, items_per_query=items_per_query, view=view, max_items=max_items,
+                            no_log=True, session=session, refresh=stale).valid_results_list
+
+    def search_task(eids):
+        """Return [(cited eid, citing articles)] for the cited eids of a task"""
+        if len(eids) > 1:
+            attributed = _attribute(eids, search(' OR '.join('REFEID({})'.format(eid) for eid in eids),
+                                                 not refresh.isdisjoint(eids)), session)
+            if attributed is not None:
+                return attributed
+        return [(eid, search('REFEID({})'.format(eid), eid in refresh)) for eid in eids]
+
+    skipped = []
+    # completed eids and the results waiting for the searches of the eids before them
+    order = deque(eid for eid, _ in queue)
+    finished = set()
+    ready = {}
+
+    def flush():
+        """The results of the completed eids at the head of the order"""
+        while order and order[0] in finished:
+            eid = order.popleft()
+            if eid in ready:
+                yield eid, ready.pop(eid)
+
+    tasks = deque(tasks)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit_next():
+            """Start the next search, return False if the queue is empty or the budget must wait for running searches"""
+            # the budget must cover the requests already sent and the whole estimate of every running search:
+            # when it does not, wait for the running searches to complete, skip the search if none is running
+            while tasks:
+                eids, estimate = tasks[0]
+                reserved_n = sum(n for _, n in pending.values())
+                if max_requests is not None and progress.requests_n + reserved_n + estimate > max_requests:
+                    if pending:
+                        return False
+                    eids = tasks.popleft()[0]
+                    skipped.extend(eids)
+                    finished.update(eids)
+                    continue
+                pending[executor.submit(search_task, eids)] = tasks.popleft()
+                return True
+            return False
+
+        while len(pending) < workers and submit_next():
+            pass
+        while pending:
+            done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                eids, estimate = pending.pop(future)
+                progress.done_n += len(eids)
+                progress.done_estimated_n += estimate
+                finished.update(eids)
+                try:
+                    ready.update(future.result())
+                except Exception as e:
+                    citations_log.warning('Citations search of {} failed: {}'.format(' '.join(eids), e))
+            while len(pending) < workers and submit_next():
+                pass
+            for item in flush():
+                yield item
+            progress.update()
+
+    for item in flush():
+        yield item
+    progress.done()
+    if skipped:
+        citations_log.warning('Request budget of {} reached, {} articles not searched: {}'.format(
+            max_requests, len(skipped), ' '.join(skipped[:20]) + (' ...' if len(skipped) > 20 else '')))
+
+
+def _attribute(cited_eids, citing_entries, session):
+    """
+    Split the results of a batch search by cited eid, using the reference list of each citing article.
+    Return [(cited eid, citing articles)], or None if the single searches are cheaper than downloading the missing
+    REF abstracts, or if some citing article could not be attributed (e.g. a truncated reference list)
+    """
+    references = {}
+    missing = []
+    for entry in citing_entries:
+        cached = load_document('abstract', abstract_file(entry['eid'], 'REF'), {'eid': entry['eid'], 'view': 'REF'})
+        if cached is None:
+            missing.append(entry['eid'])
+        else:
+            references[entry['eid']] = reference_eids(cached)
+    if len(missing) > len(cited_eids):
+        return None
+    for eid, response in iter_abstracts(missing, view='REF', workers=1, session=session):
+        references[eid] = reference_eids(response)
+
+    attributed = dict((eid, []) for eid in cited_eids)
+    for entry in citing_entries:
+        cited_by_entry = references.get(entry['eid'], set()).intersection(attributed)
+        if not cited_by_entry:
+            citations_log.info('Could not attribute {} to the cited articles of its batch'.format(entry['eid']))
+            return None
+        for eid in cited_by_entry:
+            attributed[eid].append(entry)
+    return [(eid, attributed[eid]) for eid in cited_eids]
+
+
+def search_citations(cited, **kwargs):
+    """Like iter_citations(), return a {cited eid: valid results list} dict once all the searches are complete"""
+    return dict(iter_citations(cited, **kwargs))
+
+
+def update_citations(cited, previous, **kwargs):
+    """
+    Incremental search_citations(): the citing articles of the cited articles whose citedby-count is the same as in
+    the previous build are reused, only the new cited articles and the ones whose citedby-count changed are searched,
+    the changed ones bypassing the search cache. Return a {cited eid: valid results list} dict, in the order of
+    iter_citations().
+
+    :param cited: iterable of (eid, citedby-count) pairs
+    :param previous: citations of the previous build, see read_citations_state(), {} for a full build
+    :param kwargs: iter_citations() parameters
+    """
+    counts = _citedby_counts(cited)
+    citations = {}
+    to_search = []
+    changed = set()
+    for eid, citedby_n in counts.items():
+        if eid in previous:
+            previous_n, citing = previous[eid]
+            if previous_n == citedby_n:
+                citations[eid] = citing
+                continue
+            changed.add(eid)
+        to_search.append((eid, citedby_n))
+    if previous:
+        citations_log.info('{} cited articles unchanged since the previous build, {} new, {} with a new citedby-count, '
+                           '{} no longer cited'.format(len(citations), len(to_search) - len(changed), len(changed),
+                                                       len(set(previous).difference(counts))))
+    if to_search:
+        citations.update(iter_citations(to_search, refresh=changed, **kwargs))
+    # same order as a full build: the builders attribute a citing article of several cited articles to the first one
+    return dict((eid, citations[eid]) for eid, _ in _scheduling_order(counts) if eid in citations)
+
+
+def write_citations_state(path, cited, citations, columns=None):
+    """
+    Save the citations of a build for the next incremental one: a gzip compressed newline-delimited JSON file with
+    the eid, the citedby-count and the citing articles of every searched cited article.
+
+    :param cited: iterable of the (eid, citedby-count) pairs searched
+    :param citations: {cited eid: citing articles}, cited articles left out (e.g. by the request budget) are
+        not saved, the next build searches them
+    :param columns: only save these fields of the citing articles, default=None (all of them)
+    """
+    counts = _citedby_counts(cited)
+    writer = NdjsonGzWriter(path)
+    try:
+        for eid, citing in citations.items():
+            if eid not in counts:
+                continue
+            if columns is not None:
+                citing = [dict((k, v) for k, v in entry.items() if k in columns) for entry in citing]
+            writer.write({'eid': eid, 'citedby-count': counts[eid], 'citing': citing})
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
+
+
+def read_citations_state(path):
+    """Citations saved by write_citations_state(), as {cited eid: (citedby-count, citing articles)}"""
+    return dict((item['eid'], (item['citedby-count'], item['citing'])) for item in iter_ndjson_gz(path))
+
+
+def previous_citations_state(builds_dir):
+    """
+    Citations state file of the most recent build among the output folders in builds_dir (the timestamped folders
+    of a builder for a joined search), None if no build saved one
+    """
+    if not os.path.isdir(builds_dir):
+        return None
+    states = [os.path.join(builds_dir, name, CITATIONS_STATE_FILE) for name in os.listdir(builds_dir)]
+    states = [path for path in states if os.path.exists(path)]
+    return max(states, key=os.path.getmtime) if states else None
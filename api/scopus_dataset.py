@@ -0,0 +1,223 @@
+"""
+Joined search datasets: the entries written by 2_join_queries.py to data/joined_searches/{folder}/ and read
+by the 3_* builders, either as a JSON list (clean.json) or as a columnar, zstd compressed Parquet file
+(clean.parquet, requires pyarrow).
+
+The Parquet file has one column per common search entry field, citedby-count as an integer and the author and
+affiliation lists as list columns of structs; read_joined_entries() only reads the requested columns.
+Values that do not fit the schema are kept as JSON: the other fields of each entry in the _extra column,
+a field whose value does not fit its column type (e.g. an author with an unexpected field) in the _overflow column.
+"""
+
+import gc
+import os
+
+from api import scopus_json
+from api.scopus_cache import read_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+JOINED_FORMATS = ('json', 'parquet')
+JOINED_JSON_FILE = 'clean.json'
+JOINED_PARQUET_FILE = 'clean.parquet'
+
+STRING_FIELDS = ['eid', 'dc:identifier', 'dc:title', 'dc:creator', 'dc:description', 'authkeywords',
+                 'prism:url', 'prism:publicationName', 'prism:issn', 'prism:eIssn', 'prism:isbn', 'prism:volume',
+                 'prism:issueIdentifier', 'prism:pageRange', 'prism:coverDate', 'prism:coverDisplayDate',
+                 'prism:doi', 'prism:aggregationType', 'pii', 'pubmed-id', 'orcid', 'subtype', 'subtypeDescription',
+                 'source-id', 'article-number', 'fund-acr', 'fund-no', 'fund-sponsor', 'openaccess', '@_fa']
+_STRING_COLUMNS = frozenset(STRING_FIELDS)
+AUTHOR_FIELDS = ['@_fa', '@seq', 'author-url', 'authid', 'authname', 'surname', 'given-name', 'initials']
+AFID_FIELDS = ['@_fa', '$']
+AFFILIATION_FIELDS = ['@_fa', 'affiliation-url', 'afid', 'affilname', 'affiliation-city', 'affiliation-country']
+EXTRA_COLUMN = '_extra'
+OVERFLOW_COLUMN = '_overflow'
+# rows written to the Parquet file at a time, each batch is a row group
+PARQUET_BATCH_SIZE = 10000
+
+_SCHEMA = None
+
+
+def has_parquet():
+    """True if pyarrow is installed"""
+    return pa is not None
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError('Parquet joined searches need pyarrow, install it with: pip install pyarrow')
+
+
+def parquet_schema():
+    """Arrow schema of the joined search Parquet files"""
+    global _SCHEMA
+    _check_pyarrow()
+    if _SCHEMA is None:
+        afid = pa.list_(pa.struct([(f, pa.string()) for f in AFID_FIELDS]))
+        author = pa.list_(pa.struct([(f, pa.string()) for f in AUTHOR_FIELDS] + [('afid', afid)]))
+        affiliation = pa.list_(pa.struct([(f, pa.string()) for f in AFFILIATION_FIELDS]))
+        _SCHEMA = pa.schema([(f, pa.string()) for f in STRING_FIELDS] +
+                            [('citedby-count', pa.int64()), ('author', author), ('affiliation', affiliation),
+                             (EXTRA_COLUMN, pa.string()), (OVERFLOW_COLUMN, pa.string())])
+    return _SCHEMA
+
+
+def _is_string(value):
+    return value is None or isinstance(value, str)
+
+
+def _fits_struct_list(value, fields, nested=None):
+    """True if value is a list of dicts with string values for fields (and fitting struct lists for nested)"""
+    if not isinstance(value, list):
+        return False
+    for item in value:
+        if not isinstance(item, dict):
+            return False
+        for key, v in item.items():
+            if nested is not None and key in nested:
+                if v is not None and not _fits_struct_list(v, nested[key]):
+                    return False
+            elif key not in fields or not _is_string(v):
+                return False
+    return True
+
+
+def _row(entry):
+    """Parquet row of a search entry"""
+    row = {}
+    extra = {}
+    overflow = {}
+    for key, value in entry.items():
+        if key in _STRING_COLUMNS:
+            fits = _is_string(value)
+        elif key == 'citedby-count':
+            fits = value is None or (isinstance(value, int) and not isinstance(value, bool))
+        elif key == 'author':
+            fits = value is None or _fits_struct_list(value, AUTHOR_FIELDS, {'afid': AFID_FIELDS})
+        elif key == 'affiliation':
+            fits = value is None or _fits_struct_list(value, AFFILIATION_FIELDS)
+        else:
+            extra[key] = value
+            continue
+        if fits:
+            row[key] = value
+        else:
+            overflow[key] = value
+    row[EXTRA_COLUMN] = scopus_json.dumps(extra).decode('utf-8') if extra else None
+    row[OVERFLOW_COLUMN] = scopus_json.dumps(overflow).decode('utf-8') if overflow else None
+    return row
+
+
+def _without_nulls(items):
+    """Drop the null fields Arrow adds to the structs of a list column, afid lists of authors included"""
+    stripped = []
+    for item in items:
+        item = {k: v for k, v in item.items() if v is not None}
+        if 'afid' in item and isinstance(item['afid'], list):
+            item['afid'] = [{k: v for k, v in afid.items() if v is not None} for afid in item['afid']]
+        stripped.append(item)
+    return stripped
+
+
+def _entry(row, columns):
+    extra = row.pop(EXTRA_COLUMN, None)
+    overflow = row.pop(OVERFLOW_COLUMN, None)
+    entry = {k: _without_nulls(v) if isinstance(v, list) else v for k, v in row.items() if v is not None}
+    for kept in (extra, overflow):
+        if kept:
+            kept = scopus_json.loads(kept)
+            entry.update(kept if columns is None else dict((k, v) for k, v in kept.items() if k in columns))
+    return entry
+
+
+class ParquetEntriesWriter(object):
+    """
+    Write search entries to a joined search Parquet file, PARQUET_BATCH_SIZE at a time.
+    Same interface as JsonListWriter: the file replaces path only on close().
+    """
+
+    def __init__(self, path, batch_size=PARQUET_BATCH_SIZE):
+        self._path = path
+        self._tmp_path = path + '.part'
+        self._writer = pq.ParquetWriter(self._tmp_path, parquet_schema(), compression='zstd')
+        self._batch_size = batch_size
+        self._rows = []
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(pa.Table.from_pylist(self._rows, schema=parquet_schema()))
+            self._rows = []
+
+    def write(self, entry):
+        self._rows.append(_row(entry))
+        if len(self._rows) >= self._batch_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self):
+        self._writer.close()
+        os.remove(self._tmp_path)
+
+
+def write_parquet(path, entries):
+    writer = ParquetEntriesWriter(path)
+    for entry in entries:
+        writer.write(entry)
+    writer.close()
+
+
+def iter_parquet_entries(path, columns=None):
+    """
+    Yield the entries of a joined search Parquet file, one row group at a time.
+    With columns, only those fields are read (and returned).
+    """
+    _check_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    read_columns = None
+    if columns is not None:
+        names = set(parquet_file.schema_arrow.names)
+        read_columns = [c for c in columns if c in names] + [OVERFLOW_COLUMN]
+        if any(c not in names for c in columns):
+            # fields outside the schema are only found in _extra
+            read_columns.append(EXTRA_COLUMN)
+    for batch in parquet_file.iter_batches(columns=read_columns):
+        # the python objects of a batch are all built at once and never form cycles: the collector would only
+        # scan them again and again while they are allocated
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            entries = [_entry(row, columns) for row in batch.to_pylist()]
+        finally:
+            if gc_enabled:
+                gc.enable()
+        for entry in entries:
+            yield entry
+
+
+def joined_file(joined_dir):
+    """The entries file of a joined search folder: clean.parquet if it has been written, clean.json otherwise"""
+    parquet_path = os.path.join(joined_dir, JOINED_PARQUET_FILE)
+    return parquet_path if os.path.exists(parquet_path) else os.path.join(joined_dir, JOINED_JSON_FILE)
+
+
+def read_joined_entries(joined_dir, columns=None):
+    """
+    List of the entries of a joined search folder, in whatever format it has been written.
+    With columns, the entries only hold those fields: from a Parquet file only those columns are read.
+    """
+    path = joined_file(joined_dir)
+    if path.endswith('.parquet'):
+        return list(iter_parquet_entries(path, columns))
+    entries = read_json(path)
+    if columns is not None:
+        columns = set(columns)
+        entries = [dict((k, v) for k, v in entry.items() if k in columns) for entry in entries]
+    return entries
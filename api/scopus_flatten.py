@@ -0,0 +1,85 @@
+"""
+Columnar flattening of search entries into flat tables, in a single pass over the entries.
+
+The nested author and affiliation lists of every entry are unpacked into plain python lists, one per column,
+then each table is built at once from its columns: no pandas object is created per entry or per author.
+"""
+
+from collections import namedtuple
+
+import pandas as pd
+
+AUTHOR_COLUMNS = ['authid', 'authname', 'surname', 'given-name', 'initials']
+AFFILIATION_COLUMNS = ['afid', 'affilname', 'affiliation-city', 'affiliation-country']
+
+FlatEntries = namedtuple('FlatEntries', ['articles', 'authors', 'affiliations', 'authorship'])
+
+
+def current_afid(author):
+    """Current affiliation of an author of a search entry: the last of its afid list, '' if it has none"""
+    afids = author.get('afid')
+    if isinstance(afids, list) and afids:
+        return afids[-1].get('$', '')
+    return ''
+
+
+def flatten_entries(entries, article_columns):
+    """
+    Flatten search entries into four DataFrames, returned as a FlatEntries namedtuple:
+
+    - articles: one row per entry, with article_columns (None where an entry has no such field)
+    - authorship: one row per author of each entry, in entry and then author order: 'article' (row of the entry
+      in articles), 'eid', 'authid' and 'afid', the current affiliation of the author ('' if unknown)
+    - authors: one row per authid, AUTHOR_COLUMNS and afid taken from its first authorship
+    - affiliations: one row per afid, AFFILIATION_COLUMNS taken from its first occurrence
+
+    Authors without authid and affiliations without afid are skipped.
+
+    :param entries: list of search entries
+    :param article_columns: fields of the entries copied to the articles table
+    """
+    articles = dict((col, []) for col in article_columns)
+    authorship = {'article': [], 'eid': [], 'authid': [], 'afid': []}
+    authors = dict((col, []) for col in AUTHOR_COLUMNS + ['afid'])
+    affiliations = dict((col, []) for col in AFFILIATION_COLUMNS)
+    seen_authors = set()
+    seen_affiliations = set()
+
+    for i, entry in enumerate(entries):
+        for col in article_columns:
+            articles[col].append(entry.get(col))
+
+        for affiliation in entry.get('affiliation') or []:
+            afid = affiliation.get('afid')
+            if afid is None or afid in seen_affiliations:
+                continue
+            seen_affiliations.add(afid)
+            for col in AFFILIATION_COLUMNS:
+                affiliations[col].append(affiliation.get(col))
+
+        eid = entry.get('eid')
+        for author in entry.get('author') or []:
+            authid = author.get('authid')
+            if authid is None:
+                continue
+            afid = current_afid(author)
+            authorship['article'].append(i)
+            authorship['eid'].append(eid)
+            authorship['authid'].append(authid)
+            authorship['afid'].append(afid)
+            if authid not in seen_authors:
+                seen_authors.add(authid)
+                for col in AUTHOR_COLUMNS:
+                    authors[col].append(author.get(col))
+                authors['afid'].append(afid)
+
+    return FlatEntries(articles=pd.DataFrame(articles, columns=article_columns),
+                       authors=pd.DataFrame(authors, columns=AUTHOR_COLUMNS + ['afid']),
+                       affiliations=pd.DataFrame(affiliations, columns=AFFILIATION_COLUMNS),
+                       authorship=pd.DataFrame(authorship, columns=['article', 'eid', 'authid', 'afid']))
+
+
+def authorship_with(flat, columns):
+    """The authorship table of flat with the given columns of the article of each row, in authorship order"""
+    articles = flat.articles[columns].iloc[flat.authorship['article'].values].reset_index(drop=True)
+    return pd.concat([articles, flat.authorship.drop(columns=[c for c in columns if c in flat.authorship])], axis=1)
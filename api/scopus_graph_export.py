@@ -0,0 +1,342 @@
+"""
+Graph files for Gephi and the other graph tools: GDF, GraphML and GEXF.
+
+The writers stream nodes and edges to a buffered file, row by row, so a graph is never held in memory twice.
+They have the interface of the other writers of the package: the file is written to path + '.part', which
+replaces path only on close(); discard() removes it. All the nodes are written before the first edge.
+
+write_graph() exports the nodes and edges DataFrames of the 3_* builders directly, without the CSV files:
+
+    write_graph('output/.../graph.gexf', nodes_df, edges_df)
+
+GDF lines are written like 4_csv_to_gdf.py always did: node values quoted, edge values bare, commas in values
+replaced by semicolons. Newlines in values are replaced by spaces, and double quotes in node values by single
+quotes, so that every node and edge stays on one well-formed line.
+"""
+
+import io
+import math
+import os
+import re
+
+GRAPH_FORMATS = ('gdf', 'graphml', 'gexf')
+# attribute types, as GraphML and GEXF name them
+ATTRIBUTE_TYPES = ('string', 'long', 'double', 'boolean')
+# edges column telling the graph is directed: a GDF column, the default edge type of GraphML and GEXF
+DIRECTED_COLUMN = 'directed'
+# nodes column used as the label of the GEXF nodes
+LABEL_COLUMN = 'Label'
+# bytes buffered before each write to the output file
+WRITE_BUFFER_SIZE = 1024 * 1024
+# DataFrame rows converted to python values at a time by write_graph()
+FRAME_CHUNK_SIZE = 100000
+
+_GDF_TYPES = {'string': 'VARCHAR', 'long': 'INTEGER', 'double': 'DOUBLE', 'boolean': 'BOOLEAN'}
+# characters XML 1.0 does not allow, even escaped
+_INVALID_XML_CHARS = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def _text(value):
+    """Text of an attribute value, None for a missing one (None, NaN or an empty string)"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    text = value if isinstance(value, str) else str(value)
+    return text or None
+
+
+def _xml(value):
+    """XML attribute value of an attribute value, None for a missing one"""
+    text = value if value.__class__ is str else _text(value)
+    if not text:
+        return None
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+    if not text.isprintable():
+        # control characters: whitespace kept as character references, the others dropped
+        text = _INVALID_XML_CHARS.sub('', text).replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;')
+    return text
+
+
+class _GraphWriter(object):
+    """
+    Base of the graph writers.
+
+    :param path: the graph file
+    :param node_attributes: names of the node attributes, the values of each node row after its id
+    :param edge_attributes: names of the edge attributes, the values of each edge row after source and target
+    :param attribute_types: {attribute name: type}, types in ATTRIBUTE_TYPES, default=None (all strings)
+    :param directed: True if the edges are directed, default=True
+    """
+
+    def __init__(self, path, node_attributes=(), edge_attributes=(), attribute_types=None, directed=True):
+        self._path = path
+        self._tmp_path = path + '.part'
+        self._node_attributes = list(node_attributes)
+        self._edge_attributes = list(edge_attributes)
+        self._types = attribute_types or {}
+        for name, attribute_type in self._types.items():
+            if attribute_type not in ATTRIBUTE_TYPES:
+                raise ValueError('Unknown type {} of attribute {}, use one of {}'.format(attribute_type, name, ATTRIBUTE_TYPES))
+        self._directed = directed
+        self._edges_started = False
+        self.nodes_n = 0
+        self.edges_n = 0
+        self._file = io.open(self._tmp_path, 'w', encoding='utf-8', newline='\n', buffering=WRITE_BUFFER_SIZE)
+        self._begin()
+
+    def _type(self, name):
+        return self._types.get(name, 'string')
+
+    def write_nodes(self, rows):
+        """Write the nodes of rows of (id, node attribute values...)"""
+        if self._edges_started:
+            raise ValueError('Every node must be written before the first edge')
+        self._write_nodes(rows)
+
+    def write_edges(self, rows):
+        """Write the edges of rows of (source id, target id, edge attribute values...)"""
+        if not self._edges_started:
+            self._start_edges()
+            self._edges_started = True
+        self._write_edges(rows)
+
+    def close(self):
+        if not self._edges_started:
+            self._start_edges()
+            self._edges_started = True
+        self._end()
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def _begin(self):
+        pass
+
+    def _start_edges(self):
+        pass
+
+    def _end(self):
+        pass
+
+
+class GdfWriter(_GraphWriter):
+    """GDF graph file writer, see _GraphWriter"""
+
+    def _begin(self):
+        self._file.write('nodedef>' + ', '.join(['name VARCHAR'] + ['{} {}'.format(name, _GDF_TYPES[self._type(name)])
+                                                                     for name in self._node_attributes]) + '\n')
+
+    def _start_edges(self):
+        columns = ['node1 VARCHAR', 'node2 VARCHAR']
+        for name in self._edge_attributes:
+            columns.append('{} {}'.format(name, 'BOOLEAN' if name == DIRECTED_COLUMN else _GDF_TYPES[self._type(name)]))
+        self._file.write('edgedef>' + ', '.join(columns) + '\n')
+
+    def _write_nodes(self, rows):
+        write = self._file.write
+        n = 0
+        for row in rows:
+            values = []
+            for value in row:
+                if value.__class__ is not str:
+                    value = _text(value) or ''
+                values.append('"' + value.replace(',', ';').replace('"', "'").replace('\r', ' ').replace('\n', ' ') + '"')
+            write(', '.join(values) + '\n')
+            n += 1
+        self.nodes_n += n
+
+    def _write_edges(self, rows):
+        write = self._file.write
+        n = 0
+        for row in rows:
+            values = []
+            for value in row:
+                if value.__class__ is not str:
+                    value = _text(value) or ''
+                values.append(value.replace(',', ';').replace('\r', ' ').replace('\n', ' '))
+            write(', '.join(values) + '\n')
+            n += 1
+        self.edges_n += n
+
+
+class GraphmlWriter(_GraphWriter):
+    """GraphML graph file writer, see _GraphWriter. A directed column of the edges is left out: edgedefault tells it"""
+
+    def _begin(self):
+        self._edge_keys = [(i, name) for i, name in enumerate(self._edge_attributes) if name != DIRECTED_COLUMN]
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<graphml xmlns="http://graphml.graphdrawing.org/xmlns" '
+                 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                 'xsi:schemaLocation="http://graphml.graphdrawing.org/xmlns '
+                 'http://graphml.graphdrawing.org/xmlns/1.0/graphml.xsd">']
+        for i, name in enumerate(self._node_attributes):
+            lines.append('<key id="n{}" for="node" attr.name="{}" attr.type="{}"/>'.format(i, _xml(name), self._type(name)))
+        for i, name in self._edge_keys:
+            lines.append('<key id="e{}" for="edge" attr.name="{}" attr.type="{}"/>'.format(i, _xml(name), self._type(name)))
+        lines.append('<graph id="G" edgedefault="{}">'.format('directed' if self._directed else 'undirected'))
+        self._file.write('\n'.join(lines) + '\n')
+
+    def _write_nodes(self, rows):
+        write = self._file.write
+        n = 0
+        tags = [(i + 1, '<data key="n{}">'.format(i)) for i in range(len(self._node_attributes))]
+        for row in rows:
+            parts = ['<node id="', _xml(row[0]) or '', '">']
+            for i, tag in tags:
+                value = _xml(row[i])
+                if value is not None:
+                    parts += (tag, value, '</data>')
+            parts.append('</node>\n')
+            write(''.join(parts))
+            n += 1
+        self.nodes_n += n
+
+    def _write_edges(self, rows):
+        write = self._file.write
+        tags = [(i + 2, '<data key="e{}">'.format(i)) for i, name in self._edge_keys]
+        n = 0
+        for row in rows:
+            parts = ['<edge source="', _xml(row[0]) or '', '" target="', _xml(row[1]) or '', '">']
+            for i, tag in tags:
+                value = _xml(row[i])
+                if value is not None:
+                    parts += (tag, value, '</data>')
+            parts.append('</edge>\n')
+            write(''.join(parts))
+            n += 1
+        self.edges_n += n
+
+    def _end(self):
+        self._file.write('</graph>\n</graphml>\n')
+
+
+class GexfWriter(_GraphWriter):
+    """
+    GEXF 1.2 graph file writer, see _GraphWriter. A Label node attribute is written as the node label,
+    a directed column of the edges is left out: defaultedgetype tells it
+    """
+
+    def _begin(self):
+        self._label = self._node_attributes.index(LABEL_COLUMN) if LABEL_COLUMN in self._node_attributes else None
+        self._node_keys = [(i, name) for i, name in enumerate(self._node_attributes) if i != self._label]
+        self._edge_keys = [(i, name) for i, name in enumerate(self._edge_attributes) if name != DIRECTED_COLUMN]
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">',
+                 '<graph mode="static" defaultedgetype="{}">'.format('directed' if self._directed else 'undirected')]
+        for attribute_class, keys in (('node', self._node_keys), ('edge', self._edge_keys)):
+            if keys:
+                lines.append('<attributes class="{}">'.format(attribute_class))
+                for i, name in keys:
+                    lines.append('<attribute id="{}" title="{}" type="{}"/>'.format(i, _xml(name), self._type(name)))
+                lines.append('</attributes>')
+        lines.append('<nodes>')
+        self._file.write('\n'.join(lines) + '\n')
+
+    @staticmethod
+    def _attvalue_tags(keys, offset):
+        """(row index, opening tag) of the attvalue elements of attribute keys"""
+        return [(i + offset, '<attvalue for="{}" value="'.format(i)) for i, name in keys]
+
+    @staticmethod
+    def _attvalues(parts, row, tags):
+        values = [(tag, _xml(row[i])) for i, tag in tags]
+        values = [item for item in values if item[1] is not None]
+        if values:
+            parts.append('<attvalues>')
+            for tag, value in values:
+                parts += (tag, value, '"/>')
+            parts.append('</attvalues>')
+
+    def _write_nodes(self, rows):
+        write = self._file.write
+        tags = self._attvalue_tags(self._node_keys, 1)
+        n = 0
+        for row in rows:
+            parts = ['<node id="', _xml(row[0]) or '']
+            if self._label is not None:
+                label = _xml(row[self._label + 1])
+                if label is not None:
+                    parts.extend(('" label="', label))
+            parts.append('">')
+            self._attvalues(parts, row, tags)
+            parts.append('</node>\n')
+            write(''.join(parts))
+            n += 1
+        self.nodes_n += n
+
+    def _start_edges(self):
+        self._file.write('</nodes>\n<edges>\n')
+
+    def _write_edges(self, rows):
+        write = self._file.write
+        tags = self._attvalue_tags(self._edge_keys, 2)
+        n = self.edges_n
+        for row in rows:
+            parts = ['<edge id="', str(n), '" source="', _xml(row[0]) or '', '" target="', _xml(row[1]) or '', '">']
+            self._attvalues(parts, row, tags)
+            parts.append('</edge>\n')
+            write(''.join(parts))
+            n += 1
+        self.edges_n = n
+
+    def _end(self):
+        self._file.write('</edges>\n</graph>\n</gexf>\n')
+
+
+_WRITERS = {'gdf': GdfWriter, 'graphml': GraphmlWriter, 'gexf': GexfWriter}
+
+
+def graph_writer(path, graph_format=None, node_attributes=(), edge_attributes=(), attribute_types=None, directed=True):
+    """Writer of a graph file, in graph_format or in the format of the path extension, see _GraphWriter"""
+    if graph_format is None:
+        graph_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if graph_format not in _WRITERS:
+        raise ValueError('Unknown graph format {}, use one of {}'.format(graph_format, GRAPH_FORMATS))
+    return _WRITERS[graph_format](path, node_attributes, edge_attributes, attribute_types, directed)
+
+
+def frame_attribute_types(df):
+    """{column: attribute type} of the numeric and boolean columns of a DataFrame"""
+    types = {}
+    for column, dtype in df.dtypes.items():
+        if dtype.kind in 'iu':
+            types[column] = 'long'
+        elif dtype.kind == 'f':
+            types[column] = 'double'
+        elif dtype.kind == 'b':
+            types[column] = 'boolean'
+    return types
+
+
+def _frame_rows(df, columns):
+    """Yield the rows of the columns of a DataFrame as tuples, FRAME_CHUNK_SIZE rows converted at a time"""
+    for start in range(0, len(df.index), FRAME_CHUNK_SIZE):
+        chunk = df.iloc[start:start + FRAME_CHUNK_SIZE]
+        # a column at a time: much faster than itertuples() over Arrow backed string columns
+        for row in zip(*[chunk[column].tolist() for column in columns]):
+            yield row
+
+
+def write_graph(path, nodes_df, edges_df, graph_format=None, node_id='Id', source='Source', target='Target'):
+    """
+    Write the nodes and edges DataFrames of a builder to a graph file, in graph_format or in the format of the
+    path extension. The other columns are the node and edge attributes, typed after the DataFrame columns.
+    Return (nodes number, edges number).
+    """
+    node_columns = [node_id] + [c for c in nodes_df.columns if c != node_id]
+    edge_columns = [source, target] + [c for c in edges_df.columns if c not in (source, target)]
+    attribute_types = frame_attribute_types(nodes_df)
+    attribute_types.update(frame_attribute_types(edges_df))
+    writer = graph_writer(path, graph_format, node_columns[1:], edge_columns[2:], attribute_types)
+    try:
+        writer.write_nodes(_frame_rows(nodes_df, node_columns))
+        writer.write_edges(_frame_rows(edges_df, edge_columns))
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
+    return writer.nodes_n, writer.edges_n
@@ -0,0 +1,118 @@
+"""
+Join of cached search queries into a single joined search folder, data/joined_searches/{folder}/.
+
+Queries are looked up in the query catalog (api/scopus_query_catalog.py) by their exact text.
+Entries are streamed from one cached query at a time and written to the output as they come, duplicated
+eids across the queries are skipped with a seen set of compact keys (see eid_key()): memory grows with the number of
+unique eids, not with the size of the queries.
+"""
+
+import fnmatch
+import logging
+import os
+
+from api.scopus_cache import JsonListWriter
+from api.scopus_dataset import JOINED_JSON_FILE, JOINED_PARQUET_FILE, ParquetEntriesWriter
+from api.scopus_query_catalog import catalog_results_exist, get_query_catalog, iter_catalog_results
+
+JOINED_SEARCHES_DIR = os.path.abspath('data/joined_searches')
+SCOPUS_EID_PREFIX = '2-s2.0-'
+
+join_log = logging.getLogger(' JoinQueries ')
+
+
+def eid_key(eid):
+    """
+    Compact deduplication key of an eid: the numeric part of a 2-s2.0- eid as an int, which takes less memory
+    in a seen set than the eid string; any other eid is returned as it is
+    """
+    if isinstance(eid, str) and eid.startswith(SCOPUS_EID_PREFIX) and eid[len(SCOPUS_EID_PREFIX):].isdigit():
+        return int(eid[len(SCOPUS_EID_PREFIX):])
+    return eid
+
+
+def cached_queries():
+    """Sorted texts of the cached search queries that can be joined, REFEID citation searches excluded"""
+    return get_query_catalog().queries()
+
+
+def match_queries(patterns, queries=None):
+    """
+    Cached queries matching any of the patterns, in pattern order and without duplicates.
+    A pattern is a query name or a shell-style wildcard (*, ?, [seq]) matched against the query names.
+    Raise ValueError if a pattern matches no query.
+    """
+    queries = cached_queries() if queries is None else queries
+    matched = []
+    for pattern in patterns:
+        found = [q for q in queries if q == pattern or fnmatch.fnmatchcase(q, pattern)]
+        if not found:
+            raise ValueError('No cached query matches {}'.format(pattern))
+        matched.extend(q for q in found if q not in matched)
+    return matched
+
+
+def resolve_query(query, catalog=None):
+    """
+    Catalog row of the most recent download of a query whose entries are still cached; the rows of removed
+    (e.g. pruned) downloads are dropped from the catalog. Raise ValueError if the query is not cached anymore.
+    """
+    catalog = catalog if catalog is not None else get_query_catalog()
+    cached = catalog.lookup(query)
+    if not cached:
+        raise ValueError('Query {} is not in the query catalog {}'.format(query, catalog.path))
+    for entry in cached:
+        if catalog_results_exist(entry):
+            return entry
+        catalog.remove(entry['backend'], entry['location'])
+    raise ValueError('The cached results of query {} have been removed, search it again'.format(query))
+
+
+def iter_joined(queries, seen=None):
+    """
+    Yield the entries of the cached queries one after the other, skipping the eids already yielded.
+    A query cached with several views (sqlite backend) is read from its most recent download, see resolve_query().
+    Pass the same seen set to several calls to deduplicate across them.
+    """
+    seen = seen if seen is not None else set()
+    catalog = get_query_catalog()
+    for query in queries:
+        read_n = new_n = 0
+        for entry in iter_catalog_results(resolve_query(query, catalog)):
+            read_n += 1
+            key = eid_key(entry.get('eid'))
+            if key in seen:
+                continue
+            seen.add(key)
+            new_n += 1
+            yield entry
+        join_log.info('Joined query {}: {} entries, {} new'.format(query, read_n, new_n))
+
+
+def join_queries(queries, output_dir, output_format='json'):
+    """
+    Join the cached queries into output_dir/clean.json (or clean.parquet with output_format='parquet'),
+    written incrementally; return (output file, unique entries number).
+    Raise ValueError before writing anything if a query is not cached anymore.
+    """
+    catalog = get_query_catalog()
+    for query in queries:
+        resolve_query(query, catalog)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    if output_format == 'parquet':
+        output_file = os.path.join(output_dir, JOINED_PARQUET_FILE)
+        writer = ParquetEntriesWriter(output_file)
+    else:
+        output_file = os.path.join(output_dir, JOINED_JSON_FILE)
+        writer = JsonListWriter(output_file)
+    written_n = 0
+    try:
+        for entry in iter_joined(queries):
+            writer.write(entry)
+            written_n += 1
+    except BaseException:
+        writer.discard()
+        raise
+    writer.close()
+    return output_file, written_n
@@ -0,0 +1,86 @@
+"""
+JSON codec of the data/ cache and of the scripts reading and writing it.
+
+orjson is used when it is installed (pip install orjson), the standard library json module otherwise.
+The backend can be forced with the SCOPUS_JSON_BACKEND environment variable ('orjson' or 'json') or with:
+
+    from api.scopus_json import configure_json
+    configure_json(backend='json')
+
+Both backends read what the other one writes. Encoded documents are UTF-8 bytes; pretty printed ones are indented
+by 4 spaces with json and by 2 with orjson (the only indentation it supports).
+Cache keys are not encoded here: they must not depend on the backend, see api/scopus_cache_store.py.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKENDS = ('orjson', 'json')
+
+_backend = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default_backend():
+    backend = os.environ.get('SCOPUS_JSON_BACKEND')
+    if backend is not None:
+        return _check_backend(backend)
+    return 'orjson' if orjson is not None else 'json'
+
+
+def _check_backend(backend):
+    if backend not in JSON_BACKENDS:
+        raise ValueError('Unknown JSON backend {}, use one of {}'.format(backend, ', '.join(JSON_BACKENDS)))
+    if backend == 'orjson' and orjson is None:
+        raise ImportError('The orjson JSON backend needs orjson, install it with: pip install orjson')
+    return backend
+
+
+def configure_json(backend=None):
+    """Select the JSON backend, 'orjson' or 'json'; None selects the default one (orjson if installed)"""
+    global _backend
+    _backend = _check_backend(backend) if backend is not None else _default_backend()
+
+
+def json_backend():
+    """Name of the JSON backend in use"""
+    if _backend is None:
+        configure_json()
+    return _backend
+
+
+def loads(data):
+    """Decode a JSON document from bytes or str"""
+    if json_backend() == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, pretty=False):
+    """Encode obj as UTF-8 JSON bytes, compact unless pretty"""
+    if json_backend() == 'orjson':
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS | orjson.OPT_INDENT_2 if pretty else _ORJSON_OPTIONS)
+        except TypeError:
+            # types orjson does not handle (e.g. integers over 64 bits) are left to json
+            pass
+    if pretty:
+        return json.dumps(obj, indent=4).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def load(f):
+    """Decode the JSON document of a file opened in binary mode"""
+    return loads(f.read())
+
+
+def dump(obj, f, pretty=False):
+    """Encode obj to a file opened in binary mode"""
+    f.write(dumps(obj, pretty))
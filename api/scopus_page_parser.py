@@ -0,0 +1,45 @@
+"""
+Decoding of the ScopusSearch page responses.
+
+Each response is decoded once: decode_page() parses the whole payload at once; with ijson (optional dependency,
+pip install ijson) parse_page() builds the same document straight from the response stream, without ever holding
+the raw payload, and iter_page_entries() yields the entries one at a time, without building the document at all:
+ScopusSearch uses it to stream the pages after the first one (whose totalResults tells the pages to download).
+"""
+
+from api import scopus_json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_ENTRY = 'search-results.entry.item'
+
+
+def has_incremental_parser():
+    """True if ijson is installed"""
+    return ijson is not None
+
+
+def decode_page(resp):
+    """The decoded JSON document of a whole response"""
+    return scopus_json.loads(resp.content)
+
+
+def iter_page_entries(stream):
+    """
+    Parse a search page from a binary file-like object (e.g. the raw stream of a response sent with stream=True),
+    yield its entries one at a time, as soon as each one is complete
+    """
+    if ijson is None:
+        raise ImportError('Incremental parsing needs ijson, install it with: pip install ijson')
+    return ijson.items(stream, _ENTRY, use_float=True)
+
+
+def parse_page(stream):
+    """Parse a whole search page incrementally from a binary file-like object, return the decoded document"""
+    if ijson is None:
+        raise ImportError('Incremental parsing needs ijson, install it with: pip install ijson')
+    # the members of search-results, the entry list included, are built one after the other from the stream
+    return {'search-results': dict(ijson.kvitems(stream, 'search-results', use_float=True))}
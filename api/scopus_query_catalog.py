@@ -0,0 +1,283 @@
+"""
+Catalog of the cached search queries, stored in a SQLite database (data/search_catalog.sqlite).
+
+ScopusSearch records every query it downloads or reads from the cache: exact query text, request parameters,
+totalResults, number of valid entries, fetch time and where the entries are stored (a folder of data/search with
+the files backend, a key of the SQLite cache otherwise). Listing and looking up queries is an indexed query,
+instead of a listing of data/search and of query texts rebuilt from folder names.
+REFEID citation searches are flagged, so they are left out of a listing without reading their names.
+
+Queries cached before the catalog existed are added by rebuild(), run when the catalog is created
+(their entries are counted the next time ScopusSearch reads them):
+
+    python -m api.scopus_query_catalog rebuild
+    python -m api.scopus_query_catalog list [--citations] [pattern]
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from api.scopus_cache import SCOPUS_SEARCH_DIR, COMPACT_RESULTS_FILE, get_cache_store, iter_search_results, \
+    read_json, search_page_file, search_page_offsets, search_query_created
+from api.scopus_cache_store import SqliteCacheStore
+
+DEFAULT_QUERY_CATALOG = os.path.abspath(os.environ.get('SCOPUS_QUERY_CATALOG', 'data/search_catalog.sqlite'))
+
+CATALOG_COLUMNS = ('query', 'params', 'backend', 'location', 'store', 'total_results', 'entries_n', 'fetched')
+
+
+def is_citation_query(query):
+    """True for the REFEID(...) searches of the citing articles of an article"""
+    return query.lstrip().upper().startswith('REFEID(')
+
+
+def _folder_query(name):
+    """Query text of a legacy search folder name, see safe_name(): lossy for queries holding _ or a long hash"""
+    return name.replace('_slash_', '/').replace('_', ' ')
+
+
+class QueryCatalog(object):
+    """
+    Cached search queries index stored in a SQLite database.
+
+    Rows are keyed by storage location: a files backend folder holds a single query (whatever its view),
+    a SQLite cache key a single set of request parameters.
+    Each thread gets its own connection, the database runs in WAL mode.
+
+    :param path: the SQLite database file, default=data/search_catalog.sqlite
+    :type path: str
+    """
+
+    def __init__(self, path=DEFAULT_QUERY_CATALOG):
+        self._path = path
+        self._local = threading.local()
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS query_catalog ('
+                         'backend TEXT NOT NULL, location TEXT NOT NULL, store TEXT, query TEXT NOT NULL, '
+                         'params TEXT NOT NULL, citation INTEGER NOT NULL, total_results INTEGER, '
+                         'entries_n INTEGER, fetched REAL NOT NULL, PRIMARY KEY (backend, location))')
+            conn.execute('CREATE INDEX IF NOT EXISTS query_catalog_query ON query_catalog (query)')
+            conn.execute('CREATE INDEX IF NOT EXISTS query_catalog_citation ON query_catalog (citation, query)')
+
+    @property
+    def path(self):
+        return self._path
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, query, params, backend, location, entries_n, total_results=None, fetched=None, store=None,
+               replace=True):
+        """
+        Record a cached query, replacing the row of the same location.
+        With replace=False an existing row is kept, only its unknown entries number is filled: used for the queries
+        read from the cache.
+
+        :param params: request parameters, as the SQLite cache key them
+        :param backend: 'files' or 'sqlite'
+        :param location: the query folder name inside data/search, or the SQLite cache key
+        :param entries_n: number of valid entries stored, None if unknown
+        :param total_results: opensearch:totalResults of the search, None if unknown
+        :param fetched: download timestamp, default=now
+        :param store: the SQLite cache database file with the sqlite backend
+        """
+        if replace:
+            sql = 'INSERT OR REPLACE INTO query_catalog '
+            conflict = ''
+        else:
+            sql = 'INSERT INTO query_catalog '
+            conflict = ' ON CONFLICT (backend, location) DO UPDATE SET entries_n = COALESCE(entries_n, excluded.entries_n)'
+        conn = self._connection()
+        with conn:
+            conn.execute(sql + '(backend, location, store, query, params, citation, total_results, entries_n, fetched) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)' + conflict,
+                         (backend, location, store, query, json.dumps(params, sort_keys=True),
+                          int(is_citation_query(query)), total_results, entries_n,
+                          fetched if fetched is not None else time.time()))
+
+    def contains(self, backend, location, counted=False):
+        """True if the location is recorded, with counted=True only if its entries number is known"""
+        row = self._connection().execute('SELECT entries_n FROM query_catalog WHERE backend = ? AND location = ?',
+                                         (backend, location)).fetchone()
+        return row is not None and (not counted or row[0] is not None)
+
+    def total_results(self, backend, location):
+        """The recorded totalResults of the search stored at a location, None if unknown"""
+        row = self._connection().execute('SELECT total_results FROM query_catalog WHERE backend = ? AND location = ?',
+                                         (backend, location)).fetchone()
+        return row[0] if row is not None else None
+
+    def remove(self, backend, location):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM query_catalog WHERE backend = ? AND location = ?', (backend, location))
+
+    def remove_evicted(self, store):
+        """Remove the rows of the queries stored in the SQLite cache store that are no longer in it, e.g. pruned"""
+        conn = self._connection()
+        rows = conn.execute('SELECT location FROM query_catalog WHERE backend = ? AND store = ?',
+                            ('sqlite', store.path)).fetchall()
+        evicted = [('sqlite', location) for location, in rows if not store.contains_key(location)]
+        if evicted:
+            with conn:
+                conn.executemany('DELETE FROM query_catalog WHERE backend = ? AND location = ?', evicted)
+        return len(evicted)
+
+    def _rows(self, where, args):
+        rows = self._connection().execute(
+            'SELECT query, params, backend, location, store, total_results, entries_n, fetched FROM query_catalog '
+            '{} ORDER BY query, fetched DESC'.format(where), args)
+        entries = []
+        for row in rows:
+            entry = dict(zip(CATALOG_COLUMNS, row))
+            entry['params'] = json.loads(entry['params'])
+            entries.append(entry)
+        return entries
+
+    def entries(self, citations=False):
+        """
+        Catalog rows sorted by query, as dicts with keys query, params, backend, location, store, total_results,
+        entries_n and fetched. citations=False leaves the REFEID searches out, None lists everything
+        """
+        if citations is None:
+            return self._rows('', ())
+        return self._rows('WHERE citation = ?', (int(bool(citations)),))
+
+    def lookup(self, query):
+        """Rows of a query, the most recently fetched first"""
+        return self._rows('WHERE query = ?', (query,))
+
+    def queries(self, citations=False):
+        """Sorted distinct query texts, see entries()"""
+        if citations is None:
+            rows = self._connection().execute('SELECT DISTINCT query FROM query_catalog ORDER BY query')
+        else:
+            rows = self._connection().execute('SELECT DISTINCT query FROM query_catalog WHERE citation = ? ORDER BY query',
+                                              (int(bool(citations)),))
+        return [row[0] for row in rows]
+
+    def rebuild(self):
+        """
+        Add the queries cached before the catalog existed, from the data/search folders and the SQLite cache,
+        without reading their entries. Folders are named after their query: the text is read from a page file
+        when one is left, otherwise rebuilt from the folder name. Return how many queries were added.
+        """
+        added_n = 0
+        if os.path.isdir(SCOPUS_SEARCH_DIR):
+            for name in sorted(os.listdir(SCOPUS_SEARCH_DIR)):
+                query_dir = os.path.join(SCOPUS_SEARCH_DIR, name)
+                if not os.path.isdir(query_dir) or self.contains('files', name) or not _folder_complete(query_dir):
+                    continue
+                query, total_results = _folder_query_text(query_dir, name)
+                self.record(query, {'query': query}, 'files', name, None, total_results,
+                            search_query_created(query_dir), replace=False)
+                added_n += 1
+        store = get_cache_store()
+        if store is not None:
+            for key, params, created in store.iter_params('search'):
+                if self.contains('sqlite', key):
+                    continue
+                self.record(params.get('query', ''), params, 'sqlite', key, None, None, created,
+                            store=store.path, replace=False)
+                added_n += 1
+        return added_n
+
+
+def _folder_complete(query_dir):
+    """True if the valid entries of a search folder have been written, i.e. its download is complete"""
+    return os.path.exists(os.path.join(query_dir, COMPACT_RESULTS_FILE)) or os.path.exists(os.path.join(query_dir, 'clean.json'))
+
+
+def _folder_query_text(query_dir, name):
+    """(query text, totalResults) of a legacy search folder, from its first page file if any is left"""
+    offsets = search_page_offsets(query_dir)
+    if offsets:
+        try:
+            results = read_json(search_page_file(query_dir, offsets[0])).get('search-results', {})
+            query = results.get('opensearch:Query', {}).get('@searchTerms')
+            if query:
+                return query, int(results.get('opensearch:totalResults'))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return _folder_query(name), None
+
+
+def _entry_store(entry):
+    """The SQLite cache store of a sqlite backend catalog row"""
+    store = get_cache_store()
+    if store is None or store.path != entry['store']:
+        store = SqliteCacheStore(entry['store'])
+    return store
+
+
+def catalog_results_exist(entry):
+    """True if the valid entries of a catalog row are still stored at its location"""
+    if entry['backend'] == 'sqlite':
+        return os.path.exists(entry['store']) and _entry_store(entry).contains_key(entry['location'])
+    return _folder_complete(os.path.join(SCOPUS_SEARCH_DIR, entry['location']))
+
+
+def iter_catalog_results(entry):
+    """Yield the valid entries stored at the location of a catalog row, nothing if they have been removed"""
+    if entry['backend'] == 'sqlite':
+        for result in _entry_store(entry).get_by_key(entry['location']) or []:
+            yield result
+    else:
+        for result in iter_search_results(os.path.join(SCOPUS_SEARCH_DIR, entry['location'])):
+            yield result
+
+
+_query_catalog = None
+_query_catalog_lock = threading.Lock()
+
+
+def get_query_catalog():
+    """The QueryCatalog shared by all the API clients, a new catalog is filled with the queries already cached"""
+    global _query_catalog
+    with _query_catalog_lock:
+        if _query_catalog is None:
+            created = not os.path.exists(DEFAULT_QUERY_CATALOG)
+            _query_catalog = QueryCatalog()
+            if created:
+                _query_catalog.rebuild()
+        return _query_catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog of the cached Scopus search queries')
+    parser.add_argument('command', choices=('list', 'rebuild'))
+    parser.add_argument('pattern', nargs='?', help='only list the queries matching this shell-style pattern')
+    parser.add_argument('--citations', action='store_true', help='list the REFEID citation searches too')
+    args = parser.parse_args()
+
+    catalog = get_query_catalog()
+    if args.command == 'rebuild':
+        print('{} cached queries added to {}'.format(catalog.rebuild(), catalog.path))
+        return
+    print('{:<60}{:>10}{:>10}  {:<18}{}'.format('query', 'total', 'entries', 'fetched', 'location'))
+    for entry in catalog.entries(None if args.citations else False):
+        if args.pattern is not None and not fnmatch.fnmatchcase(entry['query'], args.pattern):
+            continue
+        print('{:<60}{:>10}{:>10}  {:<18}{}'.format(
+            entry['query'], '-' if entry['total_results'] is None else entry['total_results'],
+            '-' if entry['entries_n'] is None else entry['entries_n'],
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['fetched'])),
+            entry['location'] if entry['backend'] == 'files' else 'sqlite:' + entry['location']))
+
+
+if __name__ == '__main__':
+    main()
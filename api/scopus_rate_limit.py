@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+# default requests/second allowed by the Scopus throttling for a subscriber APIKey
+DEFAULT_RATE = 9.0
+# default ceiling of the adaptive rate: it probes above the starting rate until the server throttles
+DEFAULT_MAX_RATE = 20.0
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 8
+
+limiter_log = logging.getLogger(' RateLimiter ')
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def backoff_delay(attempt, base=0.5, cap=60.0):
+    """Exponential backoff with full jitter: a random delay in [0, min(cap, base * 2**attempt)] seconds"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(headers):
+    """Seconds to wait as requested by a Retry-After header, None if missing or not a number"""
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter(object):
+    """
+    Thread-safe token bucket shared by all the API clients.
+
+    Every request takes a token, tokens are refilled at the current rate (requests/second).
+    The rate adapts to the server responses (additive increase, multiplicative decrease):
+    it grows slowly up to max_rate while requests succeed and it is halved on each HTTP 429.
+    When X-RateLimit-Remaining reaches 0, every client waits until X-RateLimit-Reset.
+    With quota_pacing, the quota headers of every response also cap the rate to remaining / (reset - now), never below
+    min_rate, so that the quota lasts until it is reset. Scopus resets its quotas weekly: the pace is meant for short
+    runs of a large batch against a quota nearly spent, it is off by default.
+
+    :param rate: initial requests/second, default=9
+    :type rate: float
+    :param max_rate: max requests/second the rate can grow to, default=20 (or rate, if higher)
+    :type max_rate: float
+    :param min_rate: min requests/second the rate can shrink to, default=0.5
+    :type min_rate: float
+    :param burst: max tokens stored while idle, default=rate
+    :type burst: float
+    :param quota_pacing: pace the requests by the quota headers, default=False
+    :type quota_pacing: bool
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, max_rate=None, min_rate=0.5, burst=None, quota_pacing=False):
+        self._rate = float(rate)
+        self._max_rate = float(max_rate if max_rate is not None else max(rate, DEFAULT_MAX_RATE))
+        self._min_rate = float(min_rate)
+        self._burst = float(burst if burst is not None else rate)
+        self._quota_pacing = quota_pacing
+        self._quota_rate = None
+        self._tokens = self._burst
+        self._last_refill = time.time()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Current requests/second: the adaptive rate, capped by the quota pace (never below min_rate)"""
+        return self._current_rate()
+
+    @property
+    def quota_rate(self):
+        """Requests/second that spend the quota left until its reset, None until the server sent the quota headers"""
+        return self._quota_rate
+
+    def _current_rate(self):
+        if self._quota_rate is None:
+            return self._rate
+        return min(self._rate, max(self._min_rate, self._quota_rate))
+
+    def _reserve(self):
+        """Take a token and return the seconds to wait before using it"""
+        with self._lock:
+            now = time.time()
+            rate = self._current_rate()
+            self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+            self._tokens -= 1
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """Block the calling thread until a request can be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Suspend the calling coroutine until a request can be sent"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, status_code, headers):
+        """Adapt the rate to a server response"""
+        with self._lock:
+            if status_code == 429:
+                self._rate = max(self._min_rate, self._rate / 2)
+                limiter_log.warning('Throttled by the server, rate lowered to %.2f requests/s' % self._rate)
+            elif status_code == 200:
+                self._rate = min(self._max_rate, self._rate + 0.1)
+
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            if remaining is not None and reset is not None:
+                try:
+                    remaining, reset = int(remaining), float(reset)
+                except ValueError:
+                    return
+                now = time.time()
+                if reset <= now:
+                    # the quota has been reset since, the next response tells the new one
+                    self._quota_rate = None
+                elif remaining <= 0:
+                    # quota exhausted: nobody sends anything until the quota is reset
+                    self._paused_until = reset
+                    self._quota_rate = None
+                    limiter_log.warning('Quota exhausted, waiting until {}'.format(time.ctime(reset)))
+                elif self._quota_pacing:
+                    self._quota_rate = remaining / (reset - now)
+
+    def pause(self, seconds):
+        """Stop every client for the given seconds, e.g. when the server sends a Retry-After header"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+def get_rate_limiter():
+    """Return the rate limiter shared by all the API clients, built with default settings on first use"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter()
+        return _shared_limiter
+
+
+def configure_rate_limiter(**kwargs):
+    """
+    Replace the shared rate limiter with a new one, kwargs are passed to RateLimiter().
+    Call it before creating any API client, e.g. configure_rate_limiter(rate=3)
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        _shared_limiter = RateLimiter(**kwargs)
+        return _shared_limiter
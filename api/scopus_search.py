@@ -1,11 +1,21 @@
-import requests
 # import sys
 import os
-import json
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+from api import scopus_json
 from api.api_key import MY_API_KEY
+from api.scopus_session import SCOPUS_API_URL, get_session
+from api.scopus_validation import DEFAULT_VALIDATORS, iter_valid_entries, validate_entries
+from api.scopus_cache import SCOPUS_SEARCH_DIR, search_query_dir, search_page_file, search_page_offsets, read_json, iter_json_list, write_json, \
+    JsonListWriter, NdjsonGzWriter, SearchPageWriter, compact_results_file, iter_ndjson_gz, read_ndjson_gz, remove_search_pages, search_cache_format, \
+    write_ndjson_gz, get_cache_store, cache_ttl, search_query_created, search_query_expired, remove_search_query, \
+    touch_cache_file
+from api.scopus_cache_store import StoreListWriter, cache_key, normalize_params
+from api.scopus_query_catalog import get_query_catalog
+from api.scopus_page_parser import decode_page, parse_page, iter_page_entries, has_incremental_parser
 
 # logging utility configuration
 logging.basicConfig()
@@ -14,9 +24,19 @@ requests_log = logging.getLogger(" requests.packages.urllib3 ")
 requests_log.setLevel(logging.DEBUG)
 requests_log.propagate = True
 
+# cached searches already read by this process: they are logged and touched for the LRU eviction only once
+_read_caches = set()
+_read_caches_lock = threading.Lock()
 
 
-SCOPUS_SEARCH_DIR = os.path.abspath('data/search')
+def _first_cache_read(location):
+    """True the first time this process reads the cached search stored at location"""
+    with _read_caches_lock:
+        if location in _read_caches:
+            return False
+        _read_caches.add(location)
+        return True
+
 
 
 class ScopusSearch(object):
@@ -46,178 +66,80 @@ class ScopusSearch(object):
     :type items_per_query: int
     :param max_items: max items to fetch from the in an execution (many queries), default=2000
     :type max_items: int
+    :param workers: number of pages downloaded concurrently once totalResults is known, default=1 (sequential)
+    :type workers: int
+    :param session: requests.Session used for the HTTP calls, default=None (the pooled session shared by all the API clients)
+    :type session: requests.Session
+    :param cursor: use cursor paging (cursor=* then the next cursor token) instead of start offsets, so result sets
+        larger than 5000 items can be walked (raise max_items too), the cursor position is saved to cursor.json
+        and an interrupted download is resumed from it; pages are downloaded sequentially, default=False
+    :type cursor: bool
+    :param validators: callables run over each valid entry, after the default ones (eid and author required,
+        citedby-count as int), returning the entry or None to drop it, see api/scopus_validation.py. The cache
+        stores the entries passing the default validators, whatever validators are given: these run over them every
+        time the results are read, default=None
+    :type validators: list
+    :param lazy: only check the parameters in the constructor, the results are loaded from the cache or downloaded
+        on the first access to valid_results_list, valid_results_json or results_n, default=False
+    :type lazy: bool
+    :param incremental: parse each page response incrementally from the response stream, entry by entry,
+        instead of decoding the whole payload at once; lowers the peak memory of large COMPLETE view pages,
+        requires ijson, default=False. With a single worker, iter_results() hands each entry of the pages after the
+        first one to the validators and to the page file as soon as it is parsed, those pages are never held in memory
+    :type incremental: bool
+    :param refresh: discard the cached results of the query and download them again, e.g. when its citedby-count
+        tells they are stale, default=False
+    :type refresh: bool
 
     """
-    def __init__(self, query, fields=None, view=None, items_per_query=100, max_items=5000, no_log=False):
+    def __init__(self, query, fields=None, view=None, items_per_query=100, max_items=5000, no_log=False, workers=1,
+                 session=None, cursor=False, validators=None, lazy=False, incremental=False, refresh=False):
         """
         ScopusSearch class initialization
         IMPORTANT: default parameters only work with a subscriber APIKey
         IMPORTANT: ScopusSearch max results limit is 5000 :( you get HTTP 404 for more results
         Not paying users can get only 25 items per query and only STANDARD view or selected fields from a STANDARD view
         """
-        search_log = logging.getLogger(' ScopusSearch.{} '.format(query))
-        
-        if no_log:
-            search_log.setLevel(logging.WARNING)
-            requests_log.setLevel(logging.WARNING)
-        
-        search_log.info('ScopusSearch class initialization with query {}'.format(query))
-
-        if fields is None and view is None:
-            search_log.error('You must pass the fields parameter XOR the view parameter to select the result data.\n'
-                   'Check ScopusSearch class documentation for more info.'
-                   )
-            quit()
-        if fields is not None and view is not None:
-            search_log.warn('You passed both the fields parameter and the view parameter. Fields search will be used.\n'
-                   'Check ScopusSearch class documentation for more info.'
-                   )
-
-        if not os.path.exists(SCOPUS_SEARCH_DIR):
-            os.makedirs(SCOPUS_SEARCH_DIR)
-            search_log.info('Search data directory not found, created a new one at \n\t{}\n'.format(SCOPUS_SEARCH_DIR))
-
-        # check if items_per_query is ok for the current request:
-        # complete view max 100 items per query
-        if items_per_query > 100 and view == 'COMPLETE':
-            items_per_query = 100
-        # fields, standard view max 200 items per query
-        if items_per_query > 200:
-            items_per_query = 200
-
-        # print ('Search data directory found at \n\t{}\n'.format(SCOPUS_SEARCH_DIR))
-
-        # set data file path strings
-        _QUERY_DIR = os.path.join(SCOPUS_SEARCH_DIR, query.replace('/', '_slash_').replace(' ', '_'))
-        _JSON_RAW_DATA_FILE = os.path.join(_QUERY_DIR, 'raw.json')
-        _JSON_CLEAN_DATA_FILE = os.path.join(_QUERY_DIR, 'clean.json')
-
-        # data from the single queries will be combined here
-        self._combined_results_list = []
-
-
-
-        self._url = 'http://api.elsevier.com/content/search/scopus'
-        # self._query = query
-        # self._fields = fields
-        # self._view = view
-        # self._items_per_query = items_per_query
-        self._max_items = max_items
-        self._start_item = 0
-        self._still_to_download_n = 1
-        self._eid_list = []
-        self._eid_authors_dict = {}
-        self._affil_dict = {}
-        self._author_dict = {}
+        self._setup(query, fields, view, items_per_query, max_items, no_log, session, cursor, validators, incremental,
+                    refresh)
+        self._workers = workers
 
-        self._first_run = True
-        self._json_loaded = False
-        self._results_n = 0
+        if not lazy:
+            self._load()
 
-        if not os.path.exists(_QUERY_DIR):
-            os.makedirs(_QUERY_DIR)
-        else:
-            if not os.path.exists(_JSON_RAW_DATA_FILE):
-                pass
-            else:
-                search_log.info(
-                        'This query has already been cached in the data directory. '
-                        'Loading json from file \n\t{}\n'.format(_JSON_RAW_DATA_FILE)
-                      )
-                # load results list from a previously saved JSON data file
-                with open(_JSON_RAW_DATA_FILE) as data:
-                    self._combined_results_list = json.load(data)
-                    data.close()
-                self._json_loaded = True
+    # end __init__
 
-        if not self._json_loaded:
-            while self._still_to_download_n > 0:
-                search_log.info("GET from remote...")
-                start = time.time()
-                # view or fields search selection
-                if fields is not None:
-                    resp = requests.get(self._url,
-                                        headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                        params={'query': query, 'field': fields, 'count': items_per_query,
-                                                'start': self._start_item})
-                else:
-                    resp = requests.get(self._url,
-                                        headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
-                                        params={'query': query, 'view': view, 'count': items_per_query,
-                                                'start': self._start_item})
-
-                # print ('Current query url:\n\t{}\n'.format(resp.url))
-                search_log.info("Request completed in %.3fs" % (time.time() - start))
-
-                if resp.status_code != 200:
-                    # error
-                    raise Exception('ScopusSearchApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.json()))
-
-                # we set found_items_num=1 at initialization, on the first call it has to be set to the actual value
-                if self._still_to_download_n == 1 and self._first_run:
-                    self._still_to_download_n = int(resp.json().get('search-results').get('opensearch:totalResults'))
-                    self._first_run = False
-                    self._results_n = self._still_to_download_n
-
-
-                    search_log.info("Returned {} articles".format(self._results_n))
-                    #print ('GET returned {} articles.'.format(self._found_items_num))
-
-                if self._still_to_download_n == 0:
-                    pass
-                else:
-                    # write fetched JSON to a file
-                    out_file = os.path.join(_QUERY_DIR, str(self._start_item) + '.json')
-
-                    with open(out_file, 'w') as f:
-                        json.dump(resp.json(), f, indent=4)
-                        f.close()
-                    search_log.info('Stored JSON file for this partial response.')
-
-                    # check if results number exceed the given limit
-                    if self._still_to_download_n > self._max_items:
-                        search_log.warn('Too many results, truncating to {}'.format(self._max_items))
-                        self._still_to_download_n = self._max_items
-
-                    # check if returned some result
-                    if 'entry' in resp.json().get('search-results', []):
-                        # add it to this json file - combination of all "entry" fields from the json payloads
-                        self._combined_results_list += resp.json()['search-results']['entry']
-
-                # set counters for the next cycle
-                self._still_to_download_n -= items_per_query
-                self._start_item += items_per_query
-                search_log.info('Still {} results to be downloaded'.format(self._still_to_download_n if self._still_to_download_n > 0 else 0))
-
-            # end while - finished downloading JSON data
+    def _load(self):
+        """Load the results from the cache or download them, only the first time it is called"""
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load_results()
+            self._loaded = True
+
+    def _load_results(self):
+        """Load the validated results list from the cache, or download and validate it"""
+        self._load_cached()
+
+        if not self._json_loaded and self._cursor:
+            # cursor paging: every request needs the token returned by the previous one
+            for entries in self._iter_cursor_pages():
+                self._combined_results_list += entries
+            self._store_raw()
+            if os.path.exists(self._cursor_file):
+                os.remove(self._cursor_file)
+        elif not self._json_loaded:
+            for entries in self._iter_offset_pages(self._workers):
+                self._combined_results_list += entries
+
+            # finished downloading JSON data
 
             # write abstracts JSON to a file - combination of all "entry" fields from the json payloads got from API
-            with open(_JSON_RAW_DATA_FILE, 'w') as f:
-                json.dump(self._combined_results_list, f, indent=4)
-                f.close()
+            self._store_raw()
         # end if
-        search_log.info("Cleaning results list from invalid entries...")
-        start = time.time()
-
-        # cleanup JSON, keep only consistent values with both eid and author
-        i = 0
-        dropped_n = 0
-        while i < len(self._combined_results_list):
-            if 'author' not in self._combined_results_list[i] or 'eid' not in self._combined_results_list[i]:
-                dropped_n += 1
-                self._combined_results_list.pop(i)
-            else:
-                i += 1
-
-        if dropped_n > 0:
-            search_log.warn('No eid or author, dropped {} results'.format(dropped_n))
-
-        # save a clean.json with the valid entries
-        with open(_JSON_CLEAN_DATA_FILE, 'w') as f:
-            json.dump(self._combined_results_list, f, indent=4)
-            f.close()
-
-        search_log.info("Results cleaned and written to file in %.3fs" % (time.time() - start))
+        self._validate_results()
+        self._record_query(len(self._combined_results_list), downloaded=not self._json_loaded)
+        self._filter_results()
 
         # TODO: MOVE OUTSIDE CLASS
 
@@ -323,9 +245,559 @@ class ScopusSearch(object):
         # if self._results_n-len(self._combined_results_list) > 0:
         #   print 'dropped {} elements'.format(self._results_n - len(self._combined_results_list))
 
-        search_log.info('\n@@@@@@ ScopusSearch completed. {} valid elements found @@@@@@\n'.format(len(self._combined_results_list)))
+        if self._first_read:
+            self._log.info('\n@@@@@@ ScopusSearch completed. {} valid elements found @@@@@@\n'.format(len(self._combined_results_list)))
 
-    # end __init__
+    @classmethod
+    def iter_results(cls, query, fields=None, view=None, items_per_query=100, max_items=5000, no_log=False,
+                     session=None, cursor=False, validators=None, incremental=False):
+        """
+        Iterate over the valid entries (eid AND author) of a search, page by page, without building the results list.
+
+        Entries are yielded as soon as each page is downloaded, or read from the cached page files,
+        so memory use does not depend on the number of results.
+        A download writes the same files as the ScopusSearch constructor ({start}.json, raw.json and clean.json);
+        raw.json and clean.json are only written once the iteration is complete.
+
+        Parameters are the same as the ScopusSearch constructor.
+        """
+        search = cls.__new__(cls)
+        search._setup(query, fields, view, items_per_query, max_items, no_log, session, cursor, validators, incremental)
+        if search._store is not None:
+            if search._store.contains('search', search._cache_params, ttl=cache_ttl('search')):
+                results = search._store.get('search', search._cache_params)
+                search._record_query(len(results), downloaded=False)
+                return search._filtered(results)
+        elif os.path.exists(search._compact_file) or os.path.exists(search._raw_file) or os.path.exists(search._clean_file):
+            return search._iter_cached()
+        return search._iter_download()
+
+    def _iter_cached(self):
+        entries_n = 0
+
+        def counted(entries):
+            nonlocal entries_n
+            for entry in entries:
+                entries_n += 1
+                yield entry
+
+        for entry in self._filtered(counted(self._iter_cached_entries())):
+            yield entry
+        self._record_query(entries_n, downloaded=False)
+
+    def _filtered(self, entries):
+        """The entries passing the custom validators, if any, out of the valid (cached or downloaded) entries"""
+        if not self._validators:
+            return iter(entries)
+        return iter_valid_entries(entries, self._validators, dedup_key=None)
+
+    def _iter_cached_entries(self):
+        if os.path.exists(self._compact_file):
+            # stored one entry per line, already validated
+            if _first_cache_read(self._compact_file):
+                self._log.info('This query has already been cached in the data directory. Reading {}'.format(self._compact_file))
+                touch_cache_file(self._compact_file)
+            for entry in iter_ndjson_gz(self._compact_file):
+                yield entry
+            return
+
+        offsets = search_page_offsets(self._query_dir)
+        if offsets:
+            if _first_cache_read(self._query_dir):
+                self._log.info('This query has already been cached in the data directory. Reading {} page files'.format(len(offsets)))
+            seen = set()
+            for start_item in offsets:
+                page = read_json(search_page_file(self._query_dir, start_item))
+                for entry in iter_valid_entries(page.get('search-results', {}).get('entry', []), DEFAULT_VALIDATORS, seen=seen):
+                    yield entry
+        elif os.path.exists(self._clean_file):
+            # page files have been removed, only the validated list is left
+            if _first_cache_read(self._clean_file):
+                touch_cache_file(self._clean_file)
+            for entry in iter_json_list(self._clean_file):
+                yield entry
+        else:
+            # only the combined results are left, validated as the constructor does
+            if _first_cache_read(self._raw_file):
+                touch_cache_file(self._raw_file)
+            for entry in iter_valid_entries(iter_json_list(self._raw_file), DEFAULT_VALIDATORS, seen=set()):
+                yield entry
+
+    def _load_stored_pages(self):
+        """Page files left on disk by a previous (maybe interrupted) download that can be parsed, as {start_item: page}"""
+        pages = {}
+        for start_item in search_page_offsets(self._query_dir):
+            if start_item % self._items_per_query != 0:
+                # stored with a different items_per_query
+                continue
+            try:
+                page = read_json(search_page_file(self._query_dir, start_item))
+            except ValueError:
+                # truncated while writing
+                continue
+            if isinstance(page, dict) and 'opensearch:totalResults' in page.get('search-results', {}):
+                pages[start_item] = page
+        return pages
+
+    def _stored_page_entries(self, stored_pages, start_item):
+        """The entries of the stored page at start_item, None if it is missing or incomplete"""
+        page = stored_pages.get(start_item)
+        # a stored page is complete when it holds all the entries expected at its offset
+        if page is not None and len(page['search-results'].get('entry', [])) == min(self._items_per_query, self._results_n - start_item):
+            return page['search-results']['entry']
+        return None
+
+    def _iter_offset_pages(self, workers=1):
+        """
+        Download the pages by start offset, yield the entries of each stored page in offset order.
+
+        Valid page files left on disk by an interrupted download are reused and only the missing offsets are fetched.
+        After the first response every remaining offset is known: with workers > 1 they are fetched concurrently.
+        Incremental sequential downloads yield iterators, each page being parsed and stored while it is consumed.
+        """
+        # pages after the first one are streamed entry by entry: the first one tells how many to download
+        streamed = self._incremental and workers <= 1
+        stored_pages = self._load_stored_pages()
+        if stored_pages:
+            self._log.info('Resuming download, {} page files already on disk'.format(len(stored_pages)))
+            first_page = stored_pages[min(stored_pages)]
+        else:
+            first_page = self._get_page(0)
+        self._first_run = False
+
+        self._results_n = int(first_page.get('search-results').get('opensearch:totalResults'))
+        self._log.info("Returned {} articles".format(self._results_n))
+        to_download_n = self._results_n
+        # check if results number exceed the given limit
+        if to_download_n > self._max_items:
+            self._log.warning('Too many results, truncating to {}'.format(self._max_items))
+            to_download_n = self._max_items
+
+        def load_or_fetch(start_item):
+            entries = self._stored_page_entries(stored_pages, start_item)
+            if entries is not None:
+                return entries
+            if start_item == 0 and not stored_pages:
+                return self._store_page(0, first_page)
+            if streamed:
+                return self._store_streamed_page(start_item)
+            return self._store_page(start_item, self._get_page(start_item))
+
+        offsets = range(0, to_download_n, self._items_per_query)
+        if workers > 1 and len(offsets) > 1:
+            self._log.info('Fetching {} pages with {} workers...'.format(len(offsets), workers))
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map() yields in submission order, so pages are combined in offset order
+                for entries in executor.map(load_or_fetch, offsets):
+                    yield entries
+            self._log.info("Parallel download completed in %.3fs" % (time.time() - start))
+        else:
+            for start_item in offsets:
+                yield load_or_fetch(start_item)
+                self._log.info('Still {} results to be downloaded'.format(max(0, to_download_n - start_item - self._items_per_query)))
+
+    def _iter_cursor_pages(self):
+        """
+        Download the pages one after the other following the cursor tokens, yield the entries of each stored page.
+        The next cursor is saved to cursor.json after each page, an interrupted download is resumed from it.
+        """
+        cursor = '*'
+        to_download_n = None
+        if os.path.exists(self._cursor_file):
+            state = read_json(self._cursor_file)
+            cursor, self._start_item, self._results_n = state['cursor'], state['start_item'], state['results_n']
+            to_download_n = min(self._results_n, self._max_items)
+            self._log.info('Resuming cursor download at item {} of {}'.format(self._start_item, to_download_n))
+            # pages downloaded before the interruption
+            for start_item in search_page_offsets(self._query_dir):
+                if start_item < self._start_item:
+                    page = read_json(search_page_file(self._query_dir, start_item))
+                    yield page.get('search-results', {}).get('entry', [])
+
+        while to_download_n is None or self._start_item < to_download_n:
+            page = self._get_page(self._start_item, cursor=cursor)
+
+            if to_download_n is None:
+                self._results_n = int(page.get('search-results').get('opensearch:totalResults'))
+                self._log.info("Returned {} articles".format(self._results_n))
+                to_download_n = self._results_n
+                if to_download_n > self._max_items:
+                    self._log.warning('Too many results, truncating to {}'.format(self._max_items))
+                    to_download_n = self._max_items
+                if to_download_n == 0:
+                    break
+
+            entries = self._store_page(self._start_item, page)
+            cursor = page['search-results'].get('cursor', {}).get('@next')
+            self._start_item += self._items_per_query
+            write_json(self._cursor_file, {'cursor': cursor, 'start_item': self._start_item, 'results_n': self._results_n})
+            yield entries
+
+            if not entries or cursor is None:
+                break
+            self._log.info('Still {} results to be downloaded'.format(max(0, to_download_n - self._start_item)))
+
+    def _iter_download(self):
+        if self._store is not None:
+            raw_writer = None
+            clean_writer = StoreListWriter(self._store, 'search', self._cache_params)
+        elif self._format == 'json':
+            raw_writer = JsonListWriter(self._raw_file)
+            clean_writer = JsonListWriter(self._clean_file)
+        else:
+            raw_writer = None
+            clean_writer = NdjsonGzWriter(self._compact_file)
+        pages = self._iter_cursor_pages() if self._cursor else self._iter_offset_pages()
+        seen = set()
+        entries_n = 0
+
+        def stored(entries):
+            """The valid entries of a page, written to the clean output as they are validated"""
+            nonlocal entries_n
+            for entry in entries:
+                clean_writer.write(entry)
+                entries_n += 1
+                yield entry
+
+        def written(entries):
+            """The entries of a page, written to raw.json as they are read: a streamed page can be read once"""
+            for entry in entries:
+                raw_writer.write(entry)
+                yield entry
+
+        try:
+            for entries in pages:
+                if raw_writer is not None:
+                    entries = written(entries)
+                for entry in self._filtered(stored(iter_valid_entries(entries, DEFAULT_VALIDATORS, seen=seen))):
+                    yield entry
+        except BaseException:
+            # interrupted: keep the page files, but never leave an incomplete raw.json
+            if raw_writer is not None:
+                raw_writer.discard()
+            clean_writer.discard()
+            raise
+        if raw_writer is not None:
+            raw_writer.close()
+        clean_writer.close()
+        if self._store is not None or self._format != 'json':
+            self._remove_page_files()
+        if os.path.exists(self._cursor_file):
+            os.remove(self._cursor_file)
+        self._record_query(entries_n, downloaded=True)
+
+    def _setup(self, query, fields, view, items_per_query, max_items, no_log, session, cursor=False, validators=None,
+               incremental=False, refresh=False):
+        """Check the parameters and declare the attributes, no data is loaded or downloaded here"""
+        search_log = logging.getLogger(' ScopusSearch.{} '.format(query))
+        
+        if no_log:
+            search_log.setLevel(logging.WARNING)
+            requests_log.setLevel(logging.WARNING)
+        
+        search_log.info('ScopusSearch class initialization with query {}'.format(query))
+
+        if fields is None and view is None:
+            search_log.error('You must pass the fields parameter XOR the view parameter to select the result data.\n'
+                   'Check ScopusSearch class documentation for more info.'
+                   )
+            quit()
+        if fields is not None and view is not None:
+            search_log.warning('You passed both the fields parameter and the view parameter. Fields search will be used.\n'
+                   'Check ScopusSearch class documentation for more info.'
+                   )
+        if incremental and not has_incremental_parser():
+            raise ImportError('Incremental parsing of the search pages needs ijson, install it with: pip install ijson')
+
+        if not os.path.exists(SCOPUS_SEARCH_DIR):
+            os.makedirs(SCOPUS_SEARCH_DIR)
+            search_log.info('Search data directory not found, created a new one at \n\t{}\n'.format(SCOPUS_SEARCH_DIR))
+
+        # check if items_per_query is ok for the current request:
+        # complete view max 100 items per query
+        if items_per_query > 100 and view == 'COMPLETE':
+            items_per_query = 100
+        # fields, standard view max 200 items per query
+        if items_per_query > 200:
+            items_per_query = 200
+
+        # print ('Search data directory found at \n\t{}\n'.format(SCOPUS_SEARCH_DIR))
+
+        # set data file path strings
+        self._query_dir = search_query_dir(query)
+        self._raw_file = os.path.join(self._query_dir, 'raw.json')
+        self._clean_file = os.path.join(self._query_dir, 'clean.json')
+        self._cursor_file = os.path.join(self._query_dir, 'cursor.json')
+        self._compact_file = compact_results_file(self._query_dir)
+        self._format = search_cache_format()
+        self._store = get_cache_store()
+
+        # data from the single queries will be combined here
+        self._combined_results_list = []
+
+
+
+        self._url = SCOPUS_API_URL + '/content/search/scopus'
+        self._session = session if session is not None else get_session()
+        self._query = query
+        self._fields = fields
+        self._view = view
+        self._items_per_query = items_per_query
+        self._log = search_log
+        self._max_items = max_items
+        self._cursor = cursor
+        self._incremental = incremental
+        self._start_item = 0
+        self._still_to_download_n = 1
+        self._eid_list = []
+        self._eid_authors_dict = {}
+        self._affil_dict = {}
+        self._author_dict = {}
+
+        # cache key of the sqlite backend: every parameter changing the results
+        self._cache_params = {'query': query, 'field': fields, 'view': view if fields is None else None,
+                              'count': items_per_query, 'max_items': max_items, 'cursor': cursor or None}
+        # custom validators, run over the valid entries every time they are read
+        self._validators = tuple(validators) if validators is not None else ()
+        self._validated = False
+
+        self._first_run = True
+        self._json_loaded = False
+        self._loaded = False
+        # False when this process has already read the same cached search
+        self._first_read = True
+        self._load_lock = threading.Lock()
+        self._results_n = 0
+
+        if refresh:
+            search_log.info('Refresh requested, discarding the cached results')
+            if self._store is not None:
+                self._store.delete('search', self._cache_params)
+            else:
+                remove_search_query(self._query_dir)
+        elif self._store is None and search_query_expired(self._query_dir):
+            search_log.info('Cached results older than the search cache TTL, downloading them again')
+            remove_search_query(self._query_dir)
+        if self._store is None and not os.path.exists(self._query_dir):
+            os.makedirs(self._query_dir)
+
+    def _load_cached(self):
+        """
+        Load the results list from a previously saved compact file or clean.json, already validated, if any.
+        Otherwise load it from raw.json, it will be validated and stored.
+        With the sqlite backend the validated list is looked up by the request parameters instead.
+        results_n is the totalResults recorded when the search was downloaded.
+        """
+        if self._store is not None:
+            cached = self._store.get('search', self._cache_params, ttl=cache_ttl('search'))
+            if cached is not None:
+                self._first_read = _first_cache_read(self._store.path + ':' + cache_key('search', self._cache_params))
+                if self._first_read:
+                    self._log.info('This query has already been cached in {}'.format(self._store.path))
+                self._combined_results_list = cached
+                self._json_loaded = True
+                self._validated = True
+                self._results_n = self._cached_results_n()
+            return
+
+        if os.path.exists(self._compact_file):
+            self._first_read = _first_cache_read(self._compact_file)
+            if self._first_read:
+                self._log.info(
+                        'This query has already been cached in the data directory. '
+                        'Loading entries from file \n\t{}\n'.format(self._compact_file)
+                      )
+                touch_cache_file(self._compact_file)
+            self._combined_results_list = read_ndjson_gz(self._compact_file)
+            self._json_loaded = True
+            self._validated = True
+            self._results_n = self._cached_results_n()
+            return
+
+        for cached_file in (self._clean_file, self._raw_file):
+            if os.path.exists(cached_file):
+                self._first_read = _first_cache_read(cached_file)
+                if self._first_read:
+                    self._log.info(
+                            'This query has already been cached in the data directory. '
+                            'Loading json from file \n\t{}\n'.format(cached_file)
+                          )
+                    touch_cache_file(cached_file)
+                # load results list from a previously saved JSON data file
+                self._combined_results_list = read_json(cached_file)
+                self._json_loaded = True
+                self._validated = cached_file == self._clean_file
+                self._results_n = self._cached_results_n()
+                return
+
+    def _cached_results_n(self):
+        """
+        totalResults of a cached search: recorded in the query catalog, else read from its first page file if any is
+        left, else the number of cached entries (searches cached before the catalog, without page files)
+        """
+        backend, location, _ = self._catalog_location()
+        total_results = get_query_catalog().total_results(backend, location)
+        if total_results is not None:
+            return total_results
+        offsets = search_page_offsets(self._query_dir) if self._store is None else []
+        if offsets:
+            try:
+                return int(read_json(search_page_file(self._query_dir, offsets[0]))['search-results']['opensearch:totalResults'])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return len(self._combined_results_list)
+
+    def _store_raw(self):
+        """Write the combined results of a completed download to raw.json, only in the legacy json format"""
+        if self._store is None and self._format == 'json':
+            write_json(self._raw_file, self._combined_results_list)
+
+    def _validate_results(self):
+        """
+        Run the default validators over the results list in a single pass and save the valid entries to clean.json.
+        Nothing is done when the list has been loaded from clean.json.
+        """
+        if self._validated:
+            return
+        self._log.info("Cleaning results list from invalid entries...")
+        start = time.time()
+
+        self._combined_results_list, dropped_n = validate_entries(self._combined_results_list, DEFAULT_VALIDATORS)
+        self._validated = True
+
+        if dropped_n > 0:
+            self._log.warning('Invalid or duplicate entries, dropped {} results'.format(dropped_n))
+
+        # save the valid entries
+        if self._store is not None:
+            self._store.put('search', self._cache_params, self._combined_results_list)
+            self._remove_page_files()
+        elif self._format == 'json':
+            write_json(self._clean_file, self._combined_results_list)
+        else:
+            # written once, the page files are not needed anymore
+            write_ndjson_gz(self._compact_file, self._combined_results_list)
+            self._remove_page_files()
+
+        self._log.info("Results cleaned and written to file in %.3fs" % (time.time() - start))
+
+    def _filter_results(self):
+        """Run the custom validators, if any, over the valid results list; the cache keeps the whole list"""
+        if self._validators:
+            self._combined_results_list = list(self._filtered(self._combined_results_list))
+
+    def _record_query(self, entries_n, downloaded):
+        """
+        Record the query in the query catalog with the number of valid entries stored.
+        A download replaces its row, a query read from the cache is only added if it is missing (cached before the catalog)
+        """
+        catalog = get_query_catalog()
+        backend, location, store_path = self._catalog_location()
+        if downloaded:
+            catalog.record(self._query, normalize_params(self._cache_params), backend, location, entries_n,
+                           self._results_n, store=store_path)
+        elif not catalog.contains(backend, location, counted=True):
+            fetched = search_query_created(self._query_dir) if self._store is None else None
+            catalog.record(self._query, normalize_params(self._cache_params), backend, location, entries_n,
+                           fetched=fetched, store=store_path, replace=False)
+
+    def _catalog_location(self):
+        """(backend, location, store path) of the query in the query catalog"""
+        if self._store is not None:
+            return 'sqlite', cache_key('search', self._cache_params), self._store.path
+        return 'files', os.path.basename(self._query_dir), None
+
+    def _remove_page_files(self):
+        """Remove the page files of a completed download, and the query folder too if nothing else is left in it"""
+        if os.path.exists(self._query_dir):
+            remove_search_pages(self._query_dir)
+            if self._store is not None and not os.listdir(self._query_dir):
+                os.rmdir(self._query_dir)
+
+    def _page_params(self, start_item, cursor=None):
+        """Query parameters for the page starting at start_item, or for the given cursor token in cursor mode"""
+        # view or fields search selection
+        if self._fields is not None:
+            params = {'query': self._query, 'field': self._fields, 'count': self._items_per_query}
+        else:
+            params = {'query': self._query, 'view': self._view, 'count': self._items_per_query}
+        if cursor is not None:
+            params['cursor'] = cursor
+        else:
+            params['start'] = start_item
+        return params
+
+    def _get_page(self, start_item, cursor=None):
+        """
+        GET a single results page starting at start_item (or at cursor), raise on any non-200 status.
+        Return the page document, the response is decoded exactly once (incrementally if so configured)
+        """
+        self._log.info("GET from remote...")
+        start = time.time()
+        resp = self._session.get(self._url,
+                                 headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                 params=self._page_params(start_item, cursor), stream=self._incremental)
+        try:
+            # print ('Current query url:\n\t{}\n'.format(resp.url))
+            if resp.status_code != 200:
+                # error
+                raise Exception('ScopusSearchApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.text))
+            if self._incremental:
+                # gzip/deflate decoded on the fly, the payload is never read as a whole
+                resp.raw.decode_content = True
+                page = parse_page(resp.raw)
+            else:
+                page = decode_page(resp)
+        finally:
+            resp.close()
+        self._log.info("Request completed in %.3fs" % (time.time() - start))
+        return page
+
+    def _store_streamed_page(self, start_item):
+        """
+        GET a single results page starting at start_item with stream=True, raise on any non-200 status.
+        Yield its entries as they are parsed from the response stream, writing them to {start_item}.json
+        """
+        self._log.info("GET from remote...")
+        start = time.time()
+        resp = self._session.get(self._url,
+                                 headers={'Accept': 'application/json', 'X-ELS-APIKey': MY_API_KEY},
+                                 params=self._page_params(start_item), stream=True)
+        try:
+            if resp.status_code != 200:
+                raise Exception('ScopusSearchApi status {0}, JSON dump:\n{1}\n'.format(resp.status_code, resp.text))
+            # gzip/deflate decoded on the fly, the payload is never read as a whole
+            resp.raw.decode_content = True
+            if not os.path.exists(self._query_dir):
+                os.makedirs(self._query_dir, exist_ok=True)
+            # the stored page keeps the totalResults a resumed download needs
+            writer = SearchPageWriter(search_page_file(self._query_dir, start_item),
+                                      {'opensearch:totalResults': str(self._results_n)}, pretty=self._format == 'json')
+            try:
+                for entry in iter_page_entries(resp.raw):
+                    writer.write(entry)
+                    yield entry
+            except BaseException:
+                writer.discard()
+                raise
+            writer.close()
+        finally:
+            resp.close()
+        self._log.info("Request completed and stored in %.3fs" % (time.time() - start))
+
+    def _store_page(self, start_item, page):
+        """Write a decoded page response to {start_item}.json and return its entries"""
+        if not os.path.exists(self._query_dir):
+            os.makedirs(self._query_dir, exist_ok=True)
+        write_json(search_page_file(self._query_dir, start_item), page, compact=self._format != 'json')
+        self._log.info('Stored JSON file for this partial response.')
+
+        # check if returned some result
+        if 'entry' in page.get('search-results', []):
+            # combination of all "entry" fields from the json payloads
+            return page['search-results']['entry']
+        return []
 
     @property
     def eid_list(self):
@@ -348,6 +820,7 @@ class ScopusSearch(object):
         Return a list containing the cleaned response
         only valid entries (eid AND author) are listed
         """
+        self._load()
         return self._combined_results_list
 
     @property
@@ -356,7 +829,8 @@ class ScopusSearch(object):
         Return JSON string containing the cleaned response
         only valid entries (eid AND author) are listed
         """
-        return json.dumps(self._combined_results_list)
+        self._load()
+        return scopus_json.dumps(self._combined_results_list).decode('utf-8')
 
 #    @property
 #    def json_final_str(self):
@@ -366,4 +840,5 @@ class ScopusSearch(object):
     @property
     def results_n(self):
         """Return JSON string of the final output"""
+        self._load()
         return self._results_n
@@ -0,0 +1,124 @@
+import os
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api.scopus_rate_limit import RETRY_STATUSES, MAX_RETRIES, backoff_delay, get_rate_limiter, retry_after
+
+# base url of the Elsevier APIs, can be pointed to a local stub server through the environment
+SCOPUS_API_URL = os.environ.get('SCOPUS_API_URL', 'http://api.elsevier.com').rstrip('/')
+
+DEFAULT_POOL_SIZE = 10
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+session_log = logging.getLogger(' ScopusSession ')
+
+
+class ScopusSession(requests.Session):
+    """
+    requests.Session going through the shared rate limiter.
+
+    Before each request a token is taken from the rate limiter, each response is reported back to it.
+    Throttling (HTTP 429), transient server errors (5xx) and connection errors are retried
+    up to max_retries times with jittered exponential backoff, instead of failing the whole run.
+    requests_n counts the HTTP requests sent, retries included.
+
+    :param rate_limiter: RateLimiter used by this session, default=None (the one shared by all the API clients)
+    :type rate_limiter: RateLimiter
+    :param max_retries: max retries for each request, default=8
+    :type max_retries: int
+    """
+
+    def __init__(self, rate_limiter=None, max_retries=MAX_RETRIES):
+        super(ScopusSession, self).__init__()
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.requests_n = 0
+        self._requests_n_lock = threading.Lock()
+
+    def request(self, method, url, *args, **kwargs):
+        limiter = self.rate_limiter if self.rate_limiter is not None else get_rate_limiter()
+        attempt = 0
+        while True:
+            limiter.acquire()
+            with self._requests_n_lock:
+                self.requests_n += 1
+            try:
+                resp = super(ScopusSession, self).request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                session_log.warning('{}, retrying in {:.1f}s'.format(e, delay))
+            else:
+                limiter.update(resp.status_code, resp.headers)
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return resp
+                # give the connection back to the pool, a streamed response still holds it
+                resp.close()
+                delay = retry_after(resp.headers)
+                if delay is not None:
+                    limiter.pause(delay)
+                else:
+                    delay = backoff_delay(attempt)
+                session_log.warning('HTTP {} from {}, retrying in {:.1f}s'.format(resp.status_code, url, delay))
+            time.sleep(delay)
+            attempt += 1
+
+
+def build_session(pool_size=DEFAULT_POOL_SIZE, keep_alive=True, compression=True, rate_limiter=None,
+                  max_retries=MAX_RETRIES):
+    """
+    Build a ScopusSession backed by a connection pool.
+
+    Connections to api.elsevier.com are reused between requests (and between threads, up to pool_size
+    concurrent connections), so only the first request to the host pays the TCP/TLS handshake.
+
+    :param pool_size: max number of connections kept open to the same host, default=10
+    :type pool_size: int
+    :param keep_alive: keep connections open after each response, default=True
+    :type keep_alive: bool
+    :param compression: ask the server for gzip/deflate compressed responses, default=True
+    :type compression: bool
+    :param rate_limiter: RateLimiter used by the session, default=None (the one shared by all the API clients)
+    :type rate_limiter: RateLimiter
+    :param max_retries: max retries on throttling, server and connection errors, default=8
+    :type max_retries: int
+    """
+    session = ScopusSession(rate_limiter=rate_limiter, max_retries=max_retries)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    session.headers['Accept-Encoding'] = 'gzip, deflate' if compression else 'identity'
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+
+    return session
+
+
+def get_session():
+    """Return the session shared by all the API clients, built with default settings on first use"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = build_session()
+        return _shared_session
+
+
+def configure_session(**kwargs):
+    """
+    Replace the shared session with a new one, kwargs are passed to build_session().
+    Call it before creating any API client, e.g. configure_session(pool_size=32)
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is not None:
+            _shared_session.close()
+        _shared_session = build_session(**kwargs)
+        return _shared_session
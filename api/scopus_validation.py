@@ -0,0 +1,70 @@
+"""
+Validation stage for search entries.
+
+A validator is a callable taking an entry and returning it (maybe modified) or None to drop it.
+The default validators run in a single pass when the data is ingested, the valid entries are then stored to
+clean.json; the custom validators given to ScopusSearch run over the stored entries every time they are read.
+"""
+
+import logging
+
+validation_log = logging.getLogger(' ScopusValidation ')
+
+
+def require_keys(*keys):
+    """Validator dropping the entries missing any of the given keys"""
+    def validator(entry):
+        for key in keys:
+            if key not in entry:
+                return None
+        return entry
+    return validator
+
+
+def coerce(key, func, default=None):
+    """
+    Validator converting entry[key] with func, e.g. coerce('citedby-count', int, default=0).
+    Entries it fails on are kept, with a warning: entry[key] is set to default, or left as it is if default is None
+    """
+    def validator(entry):
+        if key in entry:
+            try:
+                entry[key] = func(entry[key])
+            except (TypeError, ValueError):
+                validation_log.warning('Entry {}: cannot convert {} {!r}, {}'.format(
+                    entry.get('eid'), key, entry[key], 'kept as it is' if default is None else 'set to {!r}'.format(default)))
+                if default is not None:
+                    entry[key] = default
+        return entry
+    return validator
+
+
+# keep only consistent entries with both eid and author, citedby-count as int (0 when it is not a number)
+DEFAULT_VALIDATORS = (require_keys('eid', 'author'), coerce('citedby-count', int, default=0))
+
+
+def iter_valid_entries(entries, validators=DEFAULT_VALIDATORS, dedup_key='eid', seen=None):
+    """
+    Yield the entries passing all the validators, skipping duplicates by dedup_key (None to keep duplicates).
+    Pass the same seen set to several calls to deduplicate across them.
+    """
+    if seen is None:
+        seen = set()
+    for entry in entries:
+        for validator in validators:
+            entry = validator(entry)
+            if entry is None:
+                break
+        else:
+            if dedup_key is not None:
+                key = entry.get(dedup_key)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield entry
+
+
+def validate_entries(entries, validators=DEFAULT_VALIDATORS, dedup_key='eid'):
+    """Single pass validation of a list of entries, return (valid entries list, dropped entries number)"""
+    valid = list(iter_valid_entries(entries, validators, dedup_key))
+    return valid, len(entries) - len(valid)
@@ -0,0 +1,61 @@
+"""
+Benchmark: blocking ScopusSearch objects built one after the other vs AsyncScopusSearch.fetch()
+scheduled together under a single concurrency limit, on the local fake Scopus server.
+
+From the repository root (data is cached under a temporary folder):
+
+    python -m benchmarks.bench_async_search --queries 200 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.stub_server import start_stub_server
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--queries', type=int, default=200, help='number of REFEID searches')
+parser.add_argument('--results', type=int, default=60, help='results returned by each search')
+parser.add_argument('--latency', type=float, default=0.05, help='stub server latency per request, in seconds')
+parser.add_argument('--concurrency', type=int, default=100, help='max requests in flight for the async run')
+args = parser.parse_args()
+
+server = start_stub_server(total_results=args.results, latency=args.latency)
+os.environ['SCOPUS_API_URL'] = server.base_url
+
+# the api package reads its key and cache folders relative to the working directory
+from api import scopus_cache
+work_dir = tempfile.mkdtemp()
+scopus_cache.SCOPUS_SEARCH_DIR = os.path.join(work_dir, 'search')
+
+from api.scopus_rate_limit import configure_rate_limiter
+from api.scopus_search import ScopusSearch
+from api.scopus_async import AsyncScopusClient, AsyncScopusSearch
+
+# no throttling against the local server
+configure_rate_limiter(rate=1e6)
+
+
+async def fetch_all(queries):
+    async with AsyncScopusClient(concurrency=args.concurrency) as client:
+        return await asyncio.gather(*[AsyncScopusSearch(q, view='COMPLETE', items_per_query=25, no_log=True,
+                                                        client=client).fetch() for q in queries])
+
+
+try:
+    start = time.time()
+    for i in range(args.queries):
+        ScopusSearch('REFEID(sync-{})'.format(i), view='COMPLETE', items_per_query=25, no_log=True)
+    blocking = time.time() - start
+
+    start = time.time()
+    asyncio.run(fetch_all(['REFEID(async-{})'.format(i) for i in range(args.queries)]))
+    concurrent = time.time() - start
+
+    print('{} searches: blocking {:.2f}s | asyncio {:.2f}s | x{:.1f}'.format(
+        args.queries, blocking, concurrent, blocking / concurrent))
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,68 @@
+"""
+Benchmark: legacy search cache layout (pretty printed page files, raw.json and clean.json)
+vs the compact layout (one gzip compressed newline-delimited JSON file), on synthetic search entries.
+
+    python -m benchmarks.bench_cache_format --entries 5000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_cache import read_json, write_json, write_ndjson_gz, read_ndjson_gz, compact_results_file, \
+    search_page_file
+
+
+def folder_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def timed(func, repeat=1):
+    """Best wall-clock time of repeat runs, in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--entries', type=int, default=5000, help='synthetic entries in the search results')
+parser.add_argument('--items-per-query', type=int, default=25, help='entries in each page file')
+args = parser.parse_args()
+
+entries = [fake_entry(i) for i in range(args.entries)]
+work_dir = tempfile.mkdtemp()
+legacy_dir = os.path.join(work_dir, 'legacy')
+compact_dir = os.path.join(work_dir, 'compact')
+os.makedirs(legacy_dir)
+os.makedirs(compact_dir)
+
+
+def write_legacy():
+    for start in range(0, args.entries, args.items_per_query):
+        write_json(search_page_file(legacy_dir, start),
+                   {'search-results': {'entry': entries[start:start + args.items_per_query]}})
+    write_json(os.path.join(legacy_dir, 'raw.json'), entries)
+    write_json(os.path.join(legacy_dir, 'clean.json'), entries)
+
+
+try:
+    legacy_write_ms = timed(write_legacy)
+    compact_write_ms = timed(lambda: write_ndjson_gz(compact_results_file(compact_dir), entries))
+    legacy_load_ms = timed(lambda: read_json(os.path.join(legacy_dir, 'clean.json')), repeat=3)
+    compact_load_ms = timed(lambda: read_ndjson_gz(compact_results_file(compact_dir)), repeat=3)
+
+    print('{} entries'.format(args.entries))
+    print('  legacy  : {:8.1f} KB on disk | write {:7.1f} ms | load clean.json {:7.1f} ms'.format(
+        folder_size(legacy_dir) / 1024., legacy_write_ms, legacy_load_ms))
+    print('  compact : {:8.1f} KB on disk | write {:7.1f} ms | load {} {:7.1f} ms'.format(
+        folder_size(compact_dir) / 1024., compact_write_ms, os.path.basename(compact_results_file(compact_dir)),
+        compact_load_ms))
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,131 @@
+"""
+Benchmark: the row-wise pandas idioms 3_authors_citations_csv_builder.py used to unpack the author and affiliation
+lists (apply(pd.Series) and stack()) vs the columnar flattening stage of api/scopus_flatten.py, on a synthetic corpus.
+Both build the nodes, edges and textblob tables of the script (without the AuthorRetrieval fill of the missing
+affiliations) and their CSV output is checked to be the same.
+
+    python -m benchmarks.bench_flatten --articles 50000
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_flatten import flatten_entries, authorship_with
+
+NODES_COLS = ["eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "citedby-count", "dc:identifier",
+              "prism:aggregationType", "prism:coverDate", "prism:publicationName", "source-id", "subtype",
+              "subtypeDescription"]
+
+
+def stack(df):
+    # stack() dropped the missing values before pandas 3
+    return df.stack().dropna()
+
+
+def textblob(eid_author_df, new_df):
+    eid_author_df = pd.concat([eid_author_df, new_df], axis=0).fillna(' ')
+    eid_author_df['text'] = eid_author_df['dc:title'] + ' ' + eid_author_df['dc:description'].apply(str) + ' ' + eid_author_df['authkeywords']
+    return eid_author_df[["authid", "text"]].groupby('authid').agg(lambda x: ' '.join(x.tolist())).reset_index()
+
+
+def edges(with_cit_authid_eid, citations_search_df):
+    edges_df = pd.merge(left=with_cit_authid_eid, right=citations_search_df[['external_eid', 'eid', 'authid', 'dc:title']],
+                        left_on='eid', right_on='external_eid')
+    return edges_df[['authid_y', 'authid_x', 'eid_y', 'dc:title_y', 'eid_x', 'dc:title_x']]
+
+
+def legacy_tables(entries, citations):
+    """The former steps of the script"""
+    keywords_df = pd.json_normalize(entries).dropna(subset=['author', 'eid'])
+    affiliations_df = stack(keywords_df.apply(lambda x: pd.Series(x['affiliation']), axis=1)).reset_index(level=1, drop=True)
+    affiliations_df = pd.DataFrame(list(affiliations_df)).dropna(subset=['afid']).drop_duplicates(subset=['afid'])
+    affiliations_df = affiliations_df[['afid', 'affilname', 'affiliation-city', 'affiliation-country']]
+    keywords_df = keywords_df[NODES_COLS + ['author']]
+    keywords_df['citedby-count'] = keywords_df['citedby-count'].apply(int)
+    author_series = stack(keywords_df.apply(lambda x: pd.Series(x['author']), axis=1)).reset_index(level=1, drop=True)
+    author_series.name = 'author'
+    authors = pd.DataFrame(list(author_series)).drop_duplicates(subset=['authid'])
+    authors['afid'] = authors.apply(lambda row: row['afid'][-1]['$'] if type(row['afid']) is list else '', axis=1)
+    authors = authors[['authid', 'authname', 'surname', 'given-name', 'initials', 'afid']]
+    nodes_df = pd.merge(left=authors, right=affiliations_df, left_on='afid', right_on='afid', how='left')
+
+    with_cit_authid_eid = keywords_df[keywords_df['citedby-count'] > 0]
+    with_cit_authid_eid = with_cit_authid_eid.apply(
+        lambda row: pd.Series({'dc:title': row['dc:title'], 'eid': row['eid'],
+                               'author': [a['authid'] for a in row['author']]}), axis=1)
+    authid_series = stack(with_cit_authid_eid['author'].apply(pd.Series)).reset_index(level=1, drop=True)
+    authid_series.name = 'authid'
+    with_cit_authid_eid = with_cit_authid_eid.drop('author', axis=1).join(authid_series)
+
+    citations_search_df = pd.DataFrame(dict([(k, pd.Series(v)) for k, v in citations.items()]))
+    citations_search_df = stack(citations_search_df.transpose()).reset_index(level=1, drop=True).to_frame()
+    citations_search_df.reset_index(level=0, inplace=True)
+    citations_search_df = pd.concat([citations_search_df.drop([0], axis=1).rename(columns={'index': 'external_eid'}),
+                                     citations_search_df[0].apply(pd.Series)], axis=1)
+    cit_author_df = stack(citations_search_df.apply(lambda x: pd.Series(x['author']), axis=1)).reset_index(level=1, drop=True).apply(pd.Series)
+    cit_author_df = cit_author_df[['authid', 'authname', 'surname', 'given-name', 'initials']]
+    citations_search_df = citations_search_df[["external_eid", "eid", "dc:title", "dc:description", "authkeywords"]]
+    citations_search_df = citations_search_df.join(cit_author_df).drop_duplicates(subset=['eid', 'authid'])
+    citations_search_df = citations_search_df[citations_search_df.authid.isin(nodes_df.authid)]
+
+    eid_author_df = keywords_df.drop('author', axis=1).join(author_series)
+    eid_author_df = eid_author_df[["eid", "author", "dc:title", "dc:description", "authkeywords"]]
+    eid_author_df = pd.concat([eid_author_df.drop(['author'], axis=1), eid_author_df['author'].apply(pd.Series)['authid']],
+                              axis=1).drop_duplicates(subset=['eid', 'authid'])
+    new_df = citations_search_df[["eid", "dc:title", "dc:description", "authkeywords", "authid"]]
+    return nodes_df, edges(with_cit_authid_eid, citations_search_df), textblob(eid_author_df, new_df)
+
+
+def flat_tables(entries, citations):
+    """The columnar flattening stage, as the script uses it now"""
+    entries = [e for e in entries if e.get('author') is not None and e.get('eid') is not None]
+    keywords_flat = flatten_entries(entries, NODES_COLS)
+    keywords_df = keywords_flat.articles
+    keywords_df['citedby-count'] = keywords_df['citedby-count'].apply(int)
+    authorship_df = authorship_with(keywords_flat, ["eid", "dc:title", "dc:description", "authkeywords", "citedby-count"])
+    nodes_df = pd.merge(left=keywords_flat.authors, right=keywords_flat.affiliations, left_on='afid', right_on='afid', how='left')
+
+    with_cit_authid_eid = authorship_df.loc[authorship_df['citedby-count'] > 0, ['dc:title', 'eid', 'authid']]
+
+    citing_entries = [entry for v in citations.values() for entry in v]
+    citations_flat = flatten_entries(citing_entries, ["eid", "dc:title", "dc:description", "authkeywords"])
+    citations_flat.articles.insert(0, 'external_eid', [eid for eid, v in citations.items() for _ in v])
+    citations_search_df = authorship_with(citations_flat, ["external_eid", "eid", "dc:title", "dc:description", "authkeywords"])
+    citations_search_df = citations_search_df.drop_duplicates(subset=['eid', 'authid'])
+    citations_search_df = citations_search_df[citations_search_df.authid.isin(nodes_df.authid)]
+
+    eid_author_df = authorship_df[["eid", "dc:title", "dc:description", "authkeywords", "authid"]].drop_duplicates(subset=['eid', 'authid'])
+    new_df = citations_search_df[["eid", "dc:title", "dc:description", "authkeywords", "authid"]]
+    return nodes_df, edges(with_cit_authid_eid, citations_search_df), textblob(eid_author_df, new_df)
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--articles', type=int, default=50000, help='synthetic articles in the joined search')
+args = parser.parse_args()
+
+entries = []
+for i in range(args.articles):
+    entry = fake_entry(i)
+    entry['citedby-count'] = int(entry['citedby-count'])
+    if i % 10 == 0:
+        # authors without affiliation, filled by AuthorRetrieval in the script
+        del entry['author'][0]['afid']
+    entries.append(entry)
+# the citing articles of each cited article, articles of the corpus and external ones
+citations = dict((entry['eid'], [fake_entry((i * 7 + k) % (args.articles * 2)) for k in range(entry['citedby-count'])])
+                 for i, entry in enumerate(entries) if entry['citedby-count'] > 0)
+print('{} articles, {} citations'.format(len(entries), sum(len(v) for v in citations.values())))
+
+results = {}
+for name, func in (('row-wise apply(pd.Series)', legacy_tables), ('columnar flattening', flat_tables)):
+    start = time.time()
+    results[name] = func(entries, citations)
+    print('{:<28}{:>10.2f}s'.format(name, time.time() - start))
+
+legacy, flat = results.values()
+for table, a, b in zip(('nodes', 'edges', 'textblob'), legacy, flat):
+    assert a.to_csv() == b.to_csv(), '{} CSV differs'.format(table)
+print('same nodes ({}), edges ({}) and textblob ({}) CSV output'.format(*(len(t.index) for t in flat)))
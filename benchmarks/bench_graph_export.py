@@ -0,0 +1,132 @@
+"""
+Benchmark: graph export throughput on a synthetic authors citations graph (1M edges by default).
+
+Compares the former route (nodes.csv and edges.csv, then 4_csv_to_gdf.py opening graph.gdf once per line),
+the CSV route with the buffered GDF writer, and write_graph() straight from the DataFrames in the three formats.
+The GDF node and edge lines of all the routes are checked to be the same.
+
+    python -m benchmarks.bench_graph_export --nodes 100000 --edges 1000000
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from api.scopus_graph_export import GRAPH_FORMATS, graph_writer, write_graph
+
+
+def legacy_csv_to_gdf(nodes_csv, edges_csv, output_gdf):
+    """The former 4_csv_to_gdf.py"""
+    def write_file(line):
+        with open(output_gdf, 'a') as output:
+            output.write(line+'\n')
+
+    with open(nodes_csv, 'rt') as nodes:
+        reader = csv.reader(nodes)
+        header = next(reader)
+        write_file('nodedef>name VARCHAR,'+' VARCHAR, '.join(header[2:]) +' VARCHAR')
+        for row in reader:
+            write_file(', '.join('"{}"'.format(i.replace(',',';')) for i in row[1:]))
+
+    with open(edges_csv, 'rt') as edges:
+        reader = csv.reader(edges)
+        header = next(reader)
+        write_file('edgedef>node1 VARCHAR, node2 VARCHAR, '+' VARCHAR, '.join(header[3:-1]) + ' VARCHAR, directed BOOLEAN')
+        for row in reader:
+            write_file(', '.join(i.replace(',',';') for i in row[1:]))
+
+
+def buffered_csv_to_gdf(nodes_csv, edges_csv, output_gdf):
+    """The current 4_csv_to_gdf.py"""
+    with open(nodes_csv, 'rt') as nodes, open(edges_csv, 'rt') as edges:
+        nodes_reader = csv.reader(nodes)
+        edges_reader = csv.reader(edges)
+        nodes_header = next(nodes_reader)
+        edges_header = next(edges_reader)
+        writer = graph_writer(output_gdf, 'gdf', nodes_header[2:], edges_header[3:])
+        writer.write_nodes(row[1:] for row in nodes_reader)
+        writer.write_edges(row[1:] for row in edges_reader)
+        writer.close()
+
+
+def data_lines(path):
+    """Lines of a GDF file without the nodedef and edgedef lines"""
+    with open(path, 'rt') as f:
+        return [line for line in f if not line.startswith(('nodedef>', 'edgedef>'))]
+
+
+def synthetic_graph(nodes_n, edges_n):
+    """Nodes and edges DataFrames shaped like the ones of 3_authors_citations_csv_builder.py"""
+    ids = ['{}'.format(7000000000 + i) for i in range(nodes_n)]
+    nodes_df = pd.DataFrame({'Id': ids,
+                             'Label': ['Author{}, A.'.format(i) for i in range(nodes_n)],
+                             'surname': ['Author{}'.format(i) for i in range(nodes_n)],
+                             'firstname': ['Anna' if i % 2 else 'Bruno' for i in range(nodes_n)],
+                             'initials': ['A.' if i % 2 else 'B.' for i in range(nodes_n)],
+                             'afid': ['{}'.format(60000000 + i % 500) for i in range(nodes_n)],
+                             'affilname': ['University {}'.format(i % 500) for i in range(nodes_n)],
+                             'affilcity': ['City {}'.format(i % 90) for i in range(nodes_n)],
+                             'affilcountry': ['Italy' if i % 3 else 'France' for i in range(nodes_n)]})
+    edges_df = pd.DataFrame({'Source': [ids[(i * 7919) % nodes_n] for i in range(edges_n)],
+                             'Target': [ids[(i * 104729 + 1) % nodes_n] for i in range(edges_n)],
+                             'source_eid': ['2-s2.0-{}'.format(84000000000 + i % 400000) for i in range(edges_n)],
+                             'source_title': ['On the synthetic article {}'.format(i % 400000) for i in range(edges_n)],
+                             'target_eid': ['2-s2.0-{}'.format(85000000000 + i % 300000) for i in range(edges_n)],
+                             'target_title': ['A cited article {}, revisited'.format(i % 300000) for i in range(edges_n)]})
+    edges_df['directed'] = 'true'
+    return nodes_df, edges_df
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--nodes', type=int, default=100000, help='synthetic nodes')
+parser.add_argument('--edges', type=int, default=1000000, help='synthetic edges')
+parser.add_argument('--skip-legacy', action='store_true', help='do not run the former line by line GDF conversion')
+args = parser.parse_args()
+
+nodes_df, edges_df = synthetic_graph(args.nodes, args.edges)
+work_dir = tempfile.mkdtemp()
+nodes_csv = os.path.join(work_dir, 'nodes.csv')
+edges_csv = os.path.join(work_dir, 'edges.csv')
+try:
+    print('{} nodes, {} edges'.format(args.nodes, args.edges))
+    print('{:<36}{:>10}{:>14}{:>10}'.format('', 'seconds', 'edges/s', 'MB'))
+
+    def report(name, elapsed, path=None):
+        size = '{:.1f}'.format(os.path.getsize(path) / 1048576.0) if path is not None else ''
+        print('{:<36}{:>10.2f}{:>14.0f}{:>10}'.format(name, elapsed, args.edges / elapsed, size))
+
+    start = time.time()
+    nodes_df.to_csv(nodes_csv, sep=',', encoding='utf-8')
+    edges_df.to_csv(edges_csv, sep=',', encoding='utf-8')
+    report('nodes.csv + edges.csv', time.time() - start)
+
+    gdf_files = []
+    routes = [('csv -> gdf, buffered writer', buffered_csv_to_gdf)]
+    if not args.skip_legacy:
+        routes.insert(0, ('csv -> gdf, one open() per line', legacy_csv_to_gdf))
+    for i, (name, convert) in enumerate(routes):
+        path = os.path.join(work_dir, 'csv{}.gdf'.format(i))
+        start = time.time()
+        convert(nodes_csv, edges_csv, path)
+        report(name, time.time() - start, path)
+        gdf_files.append(path)
+
+    for graph_format in GRAPH_FORMATS:
+        path = os.path.join(work_dir, 'direct.{}'.format(graph_format))
+        start = time.time()
+        write_graph(path, nodes_df, edges_df, graph_format)
+        report('dataframes -> {}'.format(graph_format), time.time() - start, path)
+        if graph_format == 'gdf':
+            gdf_files.append(path)
+
+    expected = data_lines(gdf_files[0])
+    for path in gdf_files[1:]:
+        assert data_lines(path) == expected, '{} node and edge lines differ'.format(os.path.basename(path))
+    print('same GDF node and edge lines in {} files'.format(len(gdf_files)))
+finally:
+    shutil.rmtree(work_dir)
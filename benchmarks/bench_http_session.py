@@ -0,0 +1,45 @@
+"""
+Benchmark: module-level requests.get (one new connection per call) vs the pooled keep-alive session.
+
+Runs against the local fake Scopus server, from the repository root:
+
+    python -m benchmarks.bench_http_session --requests 500 --threads 8
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.stub_server import start_stub_server
+from api.scopus_session import build_session
+from api.scopus_rate_limit import RateLimiter
+
+
+def run(get, url, requests_n, threads):
+    start = time.time()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda i: get(url, params={'eid': i}).json(), range(requests_n)))
+    else:
+        for i in range(requests_n):
+            get(url, params={'eid': i}).json()
+    return requests_n / (time.time() - start)
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--requests', type=int, default=500, help='requests issued for each run')
+parser.add_argument('--threads', type=int, default=8, help='concurrent threads for the parallel runs')
+args = parser.parse_args()
+
+server = start_stub_server()
+url = server.base_url + '/content/abstract/eid/2-s2.0-0'
+# no throttling against the local server, only the connection handling is measured
+session = build_session(pool_size=args.threads, rate_limiter=RateLimiter(rate=1e6))
+
+for threads in (1, args.threads):
+    before = run(requests.get, url, args.requests, threads)
+    after = run(session.get, url, args.requests, threads)
+    print('{:>2} thread(s): requests.get {:8.1f} req/s | pooled session {:8.1f} req/s | x{:.2f}'.format(
+        threads, before, after, after / before))
@@ -0,0 +1,86 @@
+"""
+Benchmark: full vs incremental citation searches of a builder rebuild, on the local fake Scopus server.
+
+A first build searches the citing articles of every cited article and saves its citations state; the corpus then
+gets new articles and some articles get new citations. The rebuild is timed as an incremental build and as a
+full one that downloads every search again, as it must once the cached searches are stale.
+
+From the repository root (data is cached under a temporary folder):
+
+    python -m benchmarks.bench_incremental_citations --articles 2000 --changed 0.05 --new 0.05
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.stub_server import start_stub_server, fake_entry
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--articles', type=int, default=2000, help='cited articles of the first build')
+parser.add_argument('--changed', type=float, default=0.05, help='share of the articles with new citations')
+parser.add_argument('--new', type=float, default=0.05, help='new articles, as a share of the first build')
+parser.add_argument('--latency', type=float, default=0.02, help='stub server latency per request, in seconds')
+args = parser.parse_args()
+
+citations = {}
+server = start_stub_server(total_results=60, latency=args.latency, citations=citations)
+os.environ['SCOPUS_API_URL'] = server.base_url
+
+# the api package reads its key and cache folders relative to the working directory
+work_dir = tempfile.mkdtemp()
+os.environ['SCOPUS_QUERY_CATALOG'] = os.path.join(work_dir, 'search_catalog.sqlite')
+from api import scopus_cache
+scopus_cache.SCOPUS_SEARCH_DIR = os.path.join(work_dir, 'search')
+
+from api.scopus_rate_limit import configure_rate_limiter
+from api.scopus_citations import CITATIONS_STATE_FILE, search_citations, update_citations, write_citations_state, \
+    read_citations_state
+
+# no throttling against the local server
+configure_rate_limiter(rate=1e6)
+
+
+def cite(i, n):
+    """Cited article i with n citing articles"""
+    eid = fake_entry(i)['eid']
+    citations[eid] = list(range(100000 + i * 100, 100000 + i * 100 + n))
+    return eid, n
+
+
+def timed(func, *func_args, **kwargs):
+    """(seconds, requests, result) of func"""
+    start_n = server.requests_n
+    start = time.time()
+    result = func(*func_args, **kwargs)
+    return time.time() - start, server.requests_n - start_n, result
+
+
+try:
+    cited = [cite(i, i % 7) for i in range(args.articles)]
+    elapsed, requests_n, first = timed(search_citations, cited)
+    state_path = os.path.join(work_dir, CITATIONS_STATE_FILE)
+    write_citations_state(state_path, cited, first, columns=['eid', 'dc:title'])
+    print('{} cited articles, first build: {} requests in {:.2f}s'.format(len(cited), requests_n, elapsed))
+
+    changed = set()
+    for i in range(0, args.articles, max(1, int(round(1 / args.changed))) if args.changed else args.articles + 1):
+        cited[i] = cite(i, cited[i][1] + 2)
+        changed.add(cited[i][0])
+    cited += [cite(args.articles + i, 3) for i in range(int(args.articles * args.new))]
+    previous = read_citations_state(state_path)
+    print('{} changed, {} new articles'.format(len(changed), len(cited) - args.articles))
+
+    print('{:<24}{:>10}{:>10}'.format('rebuild', 'requests', 'seconds'))
+    elapsed, requests_n, incremental = timed(update_citations, cited, previous)
+    print('{:<24}{:>10}{:>10.2f}'.format('incremental', requests_n, elapsed))
+    # a full rebuild with up to date citations downloads every search again
+    elapsed, requests_n, full = timed(search_citations, cited, refresh=[eid for eid, _ in cited])
+    print('{:<24}{:>10}{:>10.2f}'.format('full', requests_n, elapsed))
+    for eid, _ in cited:
+        assert sorted(e['eid'] for e in incremental[eid]) == sorted(e['eid'] for e in full[eid])
+    print('same citing articles for every cited article')
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,76 @@
+"""
+Benchmark: the former join of 2_join_queries.py (every clean.json read and concatenated with +=, then dumped)
+vs the streaming join of api/scopus_join.py, on synthetic overlapping cached queries: time, peak memory
+and entries written.
+
+    python -m benchmarks.bench_join --queries 4 --entries 20000 --overlap 0.5
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stub_server import fake_entry
+
+
+def measure(func):
+    """(seconds, peak MB, result) of func, from two separate runs: tracemalloc slows the allocations down"""
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024.0 / 1024.0, result
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--queries', type=int, default=4, help='cached queries joined')
+parser.add_argument('--entries', type=int, default=20000, help='entries of each query')
+parser.add_argument('--overlap', type=float, default=0.5, help='share of the entries of a query also in the next one')
+args = parser.parse_args()
+
+# the cache folders and the query catalog are read when the api modules are imported
+work_dir = tempfile.mkdtemp()
+search_dir = os.path.join(work_dir, 'search')
+output_dir = os.path.join(work_dir, 'joined')
+os.environ['SCOPUS_QUERY_CATALOG'] = os.path.join(work_dir, 'search_catalog.sqlite')
+from api import scopus_cache
+scopus_cache.SCOPUS_SEARCH_DIR = search_dir
+
+from api import scopus_join
+from api.scopus_cache import read_search_results, safe_name, write_json
+from api.scopus_query_catalog import get_query_catalog
+
+step = int(args.entries * (1 - args.overlap))
+queries = ['QUERY({})'.format(q) for q in range(args.queries)]
+try:
+    catalog = get_query_catalog()
+    for q, query in enumerate(queries):
+        query_dir = os.path.join(search_dir, safe_name(query))
+        os.makedirs(query_dir)
+        write_json(os.path.join(query_dir, 'clean.json'), [fake_entry(i) for i in range(q * step, q * step + args.entries)])
+        # joined queries are looked up in the catalog, as ScopusSearch records them
+        catalog.record(query, {'query': query, 'view': 'COMPLETE'}, 'files', safe_name(query), args.entries,
+                       total_results=args.entries)
+
+    def legacy_join():
+        combined_results_list = []
+        for query in queries:
+            combined_results_list += read_search_results(os.path.join(search_dir, safe_name(query)))
+        write_json(os.path.join(work_dir, 'legacy.json'), combined_results_list)
+        return len(combined_results_list)
+
+    def streaming_join():
+        return scopus_join.join_queries(queries, output_dir)[1]
+
+    print('{} queries of {} entries, {:.0%} overlap'.format(args.queries, args.entries, args.overlap))
+    print('{:<20}{:>10}{:>10}{:>10}'.format('', 'seconds', 'peak MB', 'entries'))
+    for name, func in (('+= and dump', legacy_join), ('streaming join', streaming_join)):
+        print('{:<20}{:>10.2f}{:>10.1f}{:>10}'.format(name, *measure(func)))
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,86 @@
+"""
+Benchmark: a joined search stored as clean.json vs clean.parquet (requires pyarrow), on synthetic COMPLETE view
+entries: size, write time, and load time and peak memory of the columns the authors CSV builder needs,
+against the former load of the whole clean.json followed by json_normalize.
+
+    python -m benchmarks.bench_joined_format --entries 50000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_cache import read_json, write_json
+from api.scopus_dataset import JOINED_JSON_FILE, JOINED_PARQUET_FILE, has_parquet, read_joined_entries, write_parquet
+
+COLUMNS = ["eid", "dc:title", "dc:creator", "dc:description", "authkeywords", "citedby-count", "dc:identifier",
+           "prism:aggregationType", "prism:coverDate", "prism:publicationName", "source-id", "subtype",
+           "subtypeDescription", "author", "affiliation"]
+
+
+def complete_entry(i):
+    """A synthetic entry with the fields of a COMPLETE view entry the builders do not use"""
+    entry = fake_entry(i)
+    entry['citedby-count'] = int(entry['citedby-count'])
+    entry.update({'@_fa': 'true', 'prism:url': 'https://api.elsevier.com/content/abstract/scopus_id/{}'.format(i),
+                  'prism:issn': '12345678', 'prism:volume': str(i % 40), 'prism:pageRange': '{}-{}'.format(i % 300, i % 300 + 12),
+                  'prism:doi': '10.1000/synthetic.{}'.format(i), 'author-count': {'@limit': '100', '$': '3'},
+                  'link': [{'@_fa': 'true', '@ref': ref, '@href': 'https://www.scopus.com/{}/{}'.format(ref, i)}
+                           for ref in ('self', 'author-affiliation', 'scopus', 'scopus-citedby')],
+                  'fund-sponsor': 'Synthetic Foundation', 'openaccess': '0', 'openaccessFlag': False})
+    return entry
+
+
+def measure(func):
+    """(seconds, peak MB) of func, from two separate runs: tracemalloc slows the allocations down"""
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024.0 / 1024.0
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--entries', type=int, default=50000, help='synthetic entries in the joined search')
+args = parser.parse_args()
+
+entries = [complete_entry(i) for i in range(args.entries)]
+work_dir = tempfile.mkdtemp()
+json_dir = os.path.join(work_dir, 'json')
+parquet_dir = os.path.join(work_dir, 'parquet')
+os.makedirs(json_dir)
+os.makedirs(parquet_dir)
+
+try:
+    print('{} entries'.format(args.entries))
+    print('{:<40}{:>10}{:>10}{:>12}'.format('', 'seconds', 'peak MB', 'file MB'))
+    json_file = os.path.join(json_dir, JOINED_JSON_FILE)
+    start = time.time()
+    write_json(json_file, entries)
+    print('{:<40}{:>10.2f}{:>10}{:>12.1f}'.format('write clean.json', time.time() - start, '', os.path.getsize(json_file) / 1048576.0))
+    if has_parquet():
+        parquet_file = os.path.join(parquet_dir, JOINED_PARQUET_FILE)
+        start = time.time()
+        write_parquet(parquet_file, entries)
+        print('{:<40}{:>10.2f}{:>10}{:>12.1f}'.format('write clean.parquet', time.time() - start, '', os.path.getsize(parquet_file) / 1048576.0))
+    del entries
+
+    loads = [('load clean.json + json_normalize', lambda: pd.json_normalize(read_json(json_file))),
+             ('load clean.json, projected', lambda: read_joined_entries(json_dir, COLUMNS))]
+    if has_parquet():
+        loads.append(('load clean.parquet, projected', lambda: read_joined_entries(parquet_dir, COLUMNS)))
+    else:
+        print('pyarrow not installed, clean.parquet is not measured')
+    for name, func in loads:
+        print('{:<40}{:>10.2f}{:>10.1f}'.format(name, *measure(func)))
+finally:
+    shutil.rmtree(work_dir)
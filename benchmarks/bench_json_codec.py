@@ -0,0 +1,74 @@
+"""
+Benchmark: load and dump times of a joined clean.json, with the former json.load/json.dump(indent=4) calls
+and with the cache JSON codec (api/scopus_json.py) on each available backend, on synthetic search entries.
+
+    python -m benchmarks.bench_json_codec --entries 20000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_json import JSON_BACKENDS, configure_json
+from api.scopus_cache import read_json, write_json, write_ndjson_gz, read_ndjson_gz
+
+
+def timed(func, repeat=1):
+    """Best wall-clock time of repeat runs, in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        elapsed = (time.time() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def legacy_dump(path, data):
+    # what 2_join_queries.py and the cache did before
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+def legacy_load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--entries', type=int, default=20000, help='synthetic entries in the joined clean.json')
+parser.add_argument('--repeat', type=int, default=3, help='runs of each measure, the best one is reported')
+args = parser.parse_args()
+
+entries = [fake_entry(i) for i in range(args.entries)]
+work_dir = tempfile.mkdtemp()
+path = os.path.join(work_dir, 'clean.json')
+compact_path = os.path.join(work_dir, 'clean.ndjson.gz')
+
+try:
+    print('{} entries'.format(args.entries))
+    print('{:<28}{:>12}{:>12}{:>12}'.format('', 'dump ms', 'load ms', 'size KB'))
+    dump_ms = timed(lambda: legacy_dump(path, entries), args.repeat)
+    load_ms = timed(lambda: legacy_load(path), args.repeat)
+    print('{:<28}{:>12.1f}{:>12.1f}{:>12.1f}'.format('json.dump(indent=4)', dump_ms, load_ms, os.path.getsize(path) / 1024.0))
+    for backend in JSON_BACKENDS:
+        try:
+            configure_json(backend)
+        except ImportError:
+            print('{:<28}not installed'.format(backend))
+            continue
+        dump_ms = timed(lambda: write_json(path, entries), args.repeat)
+        load_ms = timed(lambda: read_json(path), args.repeat)
+        assert read_json(path) == entries
+        print('{:<28}{:>12.1f}{:>12.1f}{:>12.1f}'.format('codec ' + backend, dump_ms, load_ms, os.path.getsize(path) / 1024.0))
+        dump_ms = timed(lambda: write_ndjson_gz(compact_path, entries), args.repeat)
+        load_ms = timed(lambda: read_ndjson_gz(compact_path), args.repeat)
+        print('{:<28}{:>12.1f}{:>12.1f}{:>12.1f}'.format('codec ' + backend + ', ndjson.gz', dump_ms, load_ms,
+                                                         os.path.getsize(compact_path) / 1024.0))
+    configure_json()
+finally:
+    shutil.rmtree(work_dir)
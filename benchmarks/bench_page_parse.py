@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: CPU time per search page of the former paging loop (resp.json() called four times on the same
+response) vs a single decode vs the incremental parsers (need ijson), on a synthetic COMPLETE view page.
+The peak memory of each decode is measured too, without the payload bytes: a response read as a whole holds them
+on top of it, the incremental parsers only read them a chunk at a time.
+
+    python -m benchmarks.bench_page_parse --entries 100 --pages 50
+"""
+
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+import requests
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_page_parser import decode_page, parse_page, iter_page_entries, has_incremental_parser
+
+
+def response(payload):
+    """A requests.Response holding an already downloaded payload"""
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.encoding = 'utf-8'
+    resp._content = payload
+    return resp
+
+
+def four_decodes(payload):
+    # what the paging loop of ScopusSearch did before: totalResults, dump, 'entry' check, concatenation
+    resp = response(payload)
+    int(resp.json().get('search-results').get('opensearch:totalResults'))
+    json.dumps(resp.json())
+    if 'entry' in resp.json().get('search-results', []):
+        return resp.json()['search-results']['entry']
+
+
+def single_decode(payload):
+    return decode_page(response(payload))['search-results']['entry']
+
+
+def incremental(payload):
+    return parse_page(io.BytesIO(payload))['search-results']['entry']
+
+
+def streamed(payload):
+    # entries consumed one at a time, the page document is never built
+    return sum(1 for _ in iter_page_entries(io.BytesIO(payload)))
+
+
+def cpu_ms_per_page(func, payload, pages):
+    start = time.process_time()
+    for _ in range(pages):
+        func(payload)
+    return (time.process_time() - start) * 1000 / pages
+
+
+def peak_kb(func, payload):
+    tracemalloc.start()
+    func(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024.0
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--entries', type=int, default=100, help='entries in the page, 100 is the COMPLETE view maximum')
+parser.add_argument('--pages', type=int, default=50, help='pages decoded by each implementation')
+args = parser.parse_args()
+
+page = {'search-results': {'opensearch:totalResults': '5000', 'opensearch:startIndex': '0',
+                           'entry': [fake_entry(i) for i in range(args.entries)]}}
+payload = json.dumps(page).encode('utf-8')
+assert single_decode(payload) == page['search-results']['entry']
+
+implementations = [('resp.json() x4', four_decodes), ('single decode', single_decode)]
+if has_incremental_parser():
+    assert incremental(payload) == page['search-results']['entry']
+    implementations.append(('incremental (ijson)', incremental))
+    implementations.append(('streamed entries', streamed))
+else:
+    print('ijson not installed, the incremental parsers are not measured')
+
+print('page of {} entries, {:.1f} KB payload'.format(args.entries, len(payload) / 1024.0))
+for name, func in implementations:
+    print('{:<22}{:>10.2f} ms CPU/page{:>12.1f} KB peak'.format(name, cpu_ms_per_page(func, payload, args.pages),
+                                                               peak_kb(func, payload)))
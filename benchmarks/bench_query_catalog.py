@@ -0,0 +1,58 @@
+"""
+Benchmark: listing the joinable cached queries with a scan of data/search (os.listdir, REFEID folders filtered by
+name, query texts rebuilt from the folder names) vs a query of the query catalog, on synthetic cache folders
+with many REFEID citation searches.
+
+    python -m benchmarks.bench_query_catalog --queries 200 --citations 20000
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from api import scopus_query_catalog
+from api.scopus_query_catalog import QueryCatalog
+
+
+def best_of(func, repeat=5):
+    """(best seconds, result) of func over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--queries', type=int, default=200, help='cached queries')
+parser.add_argument('--citations', type=int, default=20000, help='cached REFEID citation searches')
+args = parser.parse_args()
+
+work_dir = tempfile.mkdtemp()
+search_dir = os.path.join(work_dir, 'search')
+scopus_query_catalog.SCOPUS_SEARCH_DIR = search_dir
+try:
+    names = ['TITLE-ABS-KEY(topic_{})'.format(i) for i in range(args.queries)] + \
+            ['REFEID(2-s2.0-{})'.format(i) for i in range(args.citations)]
+    for name in names:
+        os.makedirs(os.path.join(search_dir, name))
+        open(os.path.join(search_dir, name, 'clean.json'), 'w').write('[]')
+
+    catalog = QueryCatalog(os.path.join(work_dir, 'catalog.sqlite'))
+    start = time.time()
+    catalog.rebuild()
+    print('{} cached searches, catalog rebuilt once in {:.2f}s'.format(len(names), time.time() - start))
+
+    def scan():
+        return sorted(name.replace('_', ' ') for name in os.listdir(search_dir) if 'REFEID' not in name and '.' not in name)
+
+    print('{:<24}{:>12}{:>10}'.format('', 'ms', 'queries'))
+    for name, func in (('scan of data/search', scan), ('query catalog', catalog.queries)):
+        elapsed, queries = best_of(func)
+        print('{:<24}{:>12.2f}{:>10}'.format(name, elapsed * 1000, len(queries)))
+finally:
+    shutil.rmtree(work_dir)
@@ -0,0 +1,50 @@
+"""
+Micro-benchmark: the former list.pop() cleanup loop vs the single pass validation stage,
+on a synthetic list of search entries with some invalid ones.
+
+    python -m benchmarks.bench_validation --entries 5000
+"""
+
+import argparse
+import copy
+import timeit
+
+from benchmarks.stub_server import fake_entry
+from api.scopus_validation import DEFAULT_VALIDATORS, require_keys, validate_entries
+
+
+def pop_cleanup(results_list):
+    # the cleanup loop ScopusSearch used before the validation stage
+    i = 0
+    while i < len(results_list):
+        if 'author' not in results_list[i] or 'eid' not in results_list[i]:
+            results_list.pop(i)
+        else:
+            i += 1
+    return results_list
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--entries', type=int, default=5000, help='synthetic entries in the results list')
+parser.add_argument('--invalid', type=float, default=0.1, help='fraction of entries without author')
+parser.add_argument('--repeat', type=int, default=20, help='runs averaged for each implementation')
+args = parser.parse_args()
+
+entries = [fake_entry(i) for i in range(args.entries)]
+for entry in entries[::int(1 / args.invalid)]:
+    del entry['author']
+
+
+
+def bench(func):
+    return timeit.timeit(lambda: func(copy.copy(entries)), number=args.repeat) / args.repeat * 1000
+
+
+pop_ms = bench(pop_cleanup)
+# same checks as the pop loop
+keys_ms = bench(lambda l: validate_entries(l, validators=(require_keys('eid', 'author'),), dedup_key=None))
+# required keys, citedby-count coercion and eid deduplication
+full_ms = bench(lambda l: validate_entries(l, validators=DEFAULT_VALIDATORS))
+
+print('{} entries, {:.0%} invalid: list.pop loop {:.2f} ms | single pass, same checks {:.2f} ms | '
+      'single pass, default validators {:.2f} ms'.format(args.entries, args.invalid, pop_ms, keys_ms, full_ms))
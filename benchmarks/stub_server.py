@@ -0,0 +1,146 @@
+"""
+Local fake Scopus server used by the benchmarks.
+
+Serves the three endpoints used by the api package (search, abstract retrieval, author retrieval)
+with synthetic but well-formed JSON payloads, over HTTP/1.1 so that keep-alive can be measured.
+Point the API clients at it by setting SCOPUS_API_URL before importing the api package.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_entry(i):
+    """Return a synthetic search entry, shaped like a COMPLETE view entry"""
+    return {
+        'eid': '2-s2.0-{}'.format(i),
+        'dc:identifier': 'SCOPUS_ID:{}'.format(i),
+        'dc:title': 'Synthetic article {}'.format(i),
+        'dc:creator': 'Author {}'.format(i % 97),
+        'dc:description': 'Abstract of the synthetic article number {}.'.format(i),
+        'authkeywords': 'graph | citations | synthetic',
+        'citedby-count': str(i % 5),
+        'prism:aggregationType': 'Journal',
+        'prism:coverDate': '2016-01-01',
+        'prism:publicationName': 'Journal {}'.format(i % 13),
+        'source-id': str(i % 13),
+        'subtype': 'ar',
+        'subtypeDescription': 'Article',
+        'affiliation': [{'afid': str(60000000 + i % 31), 'affilname': 'University {}'.format(i % 31),
+                         'affiliation-city': 'City {}'.format(i % 31), 'affiliation-country': 'Italy'}],
+        'author': [{'authid': str(7000000 + (i + k) % 997), 'authname': 'Author {}'.format((i + k) % 997),
+                    'surname': 'Surname', 'given-name': 'Name', 'initials': 'N.',
+                    'afid': [{'$': str(60000000 + i % 31)}]} for k in range(3)],
+    }
+
+
+def fake_author_profile(authid):
+    """Return a synthetic AuthorRetrieval profile, with a current affiliation"""
+    afid = str(60000000 + int(authid) % 31)
+    return {'coredata': {'dc:identifier': 'AUTHOR_ID:' + authid},
+            'author-profile': {'affiliation-current': {'affiliation': {'ip-doc': {
+                '@id': afid, 'afdispname': 'University {}'.format(int(authid) % 31),
+                'address': {'city': 'City {}'.format(int(authid) % 31), 'country': 'Italy'}}}}}}
+
+
+class FakeScopusHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-RateLimit-Limit', str(self.server.quota))
+        self.send_header('X-RateLimit-Remaining', str(max(0, self.server.quota - self.server.requests_n)))
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests_n += 1
+            throttled = server.throttle_every and server.requests_n % server.throttle_every == 0
+        if server.latency:
+            time.sleep(server.latency)
+        if throttled:
+            self._send_json({'error-response': {'error-code': 'TOO_MANY_REQUESTS'}}, status=429)
+            return
+
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+
+        if url.path == '/content/search/scopus':
+            count = int(params.get('count', 25))
+            if 'cursor' in params:
+                # cursor tokens are just the encoded start offset
+                start = 0 if params['cursor'] == '*' else int(params['cursor'][len('c'):])
+            else:
+                start = int(params.get('start', 0))
+                if start + count > 5000:
+                    self._send_json({'service-error': {'status': {'statusText': 'Exceeds the maximum number allowed'}}},
+                                    status=400)
+                    return
+            cited = re.findall(r'REFEID\(([^)]+)\)', params.get('query', ''))
+            if server.citations is not None and cited:
+                # citing articles of the cited eids in the query
+                citing = sorted(set(i for eid in cited for i in server.citations.get(eid, [])))
+                total_results = len(citing)
+                entries = [fake_entry(i) for i in citing[start:start + count]]
+            else:
+                total_results = server.total_results
+                entries = [fake_entry(i) for i in range(start, min(start + count, total_results))]
+            results = {'opensearch:totalResults': str(total_results), 'entry': entries}
+            if 'cursor' in params:
+                results['cursor'] = {'@current': params['cursor'], '@next': 'c{}'.format(start + count)}
+            self._send_json({'search-results': results})
+        elif url.path.startswith('/content/abstract/eid/'):
+            eid = url.path.rsplit('/', 1)[-1]
+            response = {'coredata': {'eid': eid, 'dc:title': 'Abstract {}'.format(eid), 'prism:coverDate': '2016-01-01'}}
+            if params.get('view') == 'REF' and server.citations is not None:
+                references = [{'scopus-eid': cited} for cited, citing in sorted(server.citations.items())
+                              if int(eid[len('2-s2.0-'):]) in citing]
+                response['references'] = {'@total-references': str(len(references)), 'reference': references}
+            self._send_json({'abstracts-retrieval-response': response})
+        elif url.path.startswith('/content/author/author_id/'):
+            authid = url.path.rsplit('/', 1)[-1]
+            self._send_json({'author-retrieval-response': [fake_author_profile(authid)]})
+        elif url.path == '/content/author':
+            # multi-ID request: author_id=id1,id2,...
+            profiles = [fake_author_profile(authid) for authid in params.get('author_id', '').split(',')]
+            self._send_json({'author-retrieval-response-list': {'author-retrieval-response': profiles}})
+        else:
+            self._send_json({'service-error': {'status': {'statusText': 'Not found'}}}, status=404)
+
+
+def start_stub_server(total_results=1000, latency=0.0, throttle_every=0, citations=None, quota=10 ** 9):
+    """
+    Start the fake Scopus server on a free local port in a daemon thread.
+    With throttle_every=n, every n-th request gets an HTTP 429 response.
+    With citations={cited eid: [citing article numbers]}, REFEID searches return the citing articles
+    of the eids in the query and REF view abstracts list the references of each citing article.
+    quota is the X-RateLimit-Limit of the quota headers, reset an hour after each response; the default one is large
+    enough not to slow the clients down.
+    Return the server; its base url is server.base_url
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeScopusHandler)
+    server.daemon_threads = True
+    server.total_results = total_results
+    server.latency = latency
+    server.throttle_every = throttle_every
+    server.citations = citations
+    server.quota = quota
+    server.requests_n = 0
+    server.lock = threading.Lock()
+    server.base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,48 @@
+"""
+The tests run against the local fake Scopus server of the benchmarks (benchmarks/stub_server.py), from a temporary
+working directory: the api package reads its key and keeps its cache folders and databases relative to it.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.stub_server import start_stub_server
+
+WORK_DIR = tempfile.mkdtemp()
+os.makedirs(os.path.join(WORK_DIR, 'api'))
+with open(os.path.join(WORK_DIR, 'api', 'api_key.py'), 'w') as f:
+    f.write("MY_API_KEY = 'test'\n")
+os.chdir(WORK_DIR)
+
+SERVER = start_stub_server(total_results=60)
+os.environ['SCOPUS_API_URL'] = SERVER.base_url
+
+from api.scopus_rate_limit import configure_rate_limiter
+
+# no throttling against the local server
+configure_rate_limiter(rate=1e6)
+
+
+@pytest.fixture
+def stub_server():
+    """The fake Scopus server, reset to 60 results per search and no citations"""
+    SERVER.total_results = 60
+    SERVER.citations = None
+    SERVER.throttle_every = 0
+    SERVER.latency = 0.0
+    return SERVER
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    """The sqlite cache backend, on a new database"""
+    from api.scopus_cache import configure_cache
+    configure_cache(backend='sqlite', sqlite_path=str(tmp_path / 'cache.sqlite'))
+    yield
+    configure_cache(backend='files')
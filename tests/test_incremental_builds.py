@@ -0,0 +1,50 @@
+import glob
+import os
+import subprocess
+import sys
+import time
+
+from api.scopus_cache import write_json
+from benchmarks.stub_server import fake_entry
+from conftest import REPO_DIR
+
+
+def build(stub_server, folder, *options):
+    """Run 3_authors_citations_csv_builder.py against the fake server, return the new output folder"""
+    env = dict(os.environ, SCOPUS_API_URL=stub_server.base_url)
+    subprocess.check_call([sys.executable, os.path.join(REPO_DIR, '3_authors_citations_csv_builder.py'), folder]
+                          + list(options), env=env, stderr=subprocess.DEVNULL)
+    builds = glob.glob(os.path.join('output', folder, 'authors_citations', '*'))
+    return max(builds, key=os.path.getmtime)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_unchanged_incremental_build_writes_the_same_edges(stub_server):
+    # citing article 3997 cites every corpus article, 3998 all but the first one...
+    # (fake authors are numbered modulo 997: the citing articles share authors with the corpus)
+    stub_server.citations = {}
+    entries = []
+    for i in range(3000, 3012):
+        entry = fake_entry(i)
+        citing = list(range(3997, 3997 + i % 5 + 1))
+        stub_server.citations[entry['eid']] = citing
+        entry['citedby-count'] = str(len(citing))
+        entries.append(entry)
+    os.makedirs('debug', exist_ok=True)
+    os.makedirs(os.path.join('data', 'joined_searches', 'incremental'))
+    write_json(os.path.join('data', 'joined_searches', 'incremental', 'clean.json'), entries)
+
+    full = build(stub_server, 'incremental', '--workers', '4')
+    # output folders are timestamped to the second
+    time.sleep(1.1)
+    incremental = build(stub_server, 'incremental', '--workers', '4', '--incremental')
+
+    assert os.path.dirname(full) == os.path.dirname(incremental) and full != incremental
+    edges = read(os.path.join(full, 'edges.csv'))
+    assert len(edges.splitlines()) > 10
+    assert read(os.path.join(incremental, 'edges.csv')) == edges
+    assert read(os.path.join(incremental, 'nodes.csv')) == read(os.path.join(full, 'nodes.csv'))
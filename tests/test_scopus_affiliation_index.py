@@ -0,0 +1,24 @@
+from api import scopus_affiliation_index
+from api.scopus_affiliation_index import AffiliationIndex
+
+
+def entry(date, *authors):
+    """Search entry of authors given as (authid, afid) with the affiliations named after their afid"""
+    return {'prism:coverDate': date,
+            'affiliation': [{'afid': afid, 'affilname': 'Univ ' + afid} for _, afid in authors],
+            'author': [{'authid': authid, 'afid': [{'$': afid}]} for authid, afid in authors]}
+
+
+def test_current_affiliations_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(scopus_affiliation_index, 'LOOKUP_CHUNK_SIZE', 3)
+    index = AffiliationIndex(str(tmp_path / 'index.sqlite'))
+    index.add_entries([entry('2010-01-01', *[(str(i), 'old') for i in range(10)]),
+                       entry('2020-01-01', *[(str(i), 'new{}'.format(i)) for i in range(0, 10, 2)])])
+
+    current = index.current_affiliations([str(i) for i in range(12)] + ['0'])
+
+    assert sorted(current, key=int) == [str(i) for i in range(10)]
+    for i in range(10):
+        assert current[str(i)] == dict((col, index.affiliations(str(i))[0][col] or '')
+                                       for col in scopus_affiliation_index.AFFILIATION_COLUMNS)
+        assert current[str(i)]['afid'] == ('new{}'.format(i) if i % 2 == 0 else 'old')
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from api.scopus_async import AsyncScopusClient, AsyncScopusSearch
+
+
+def test_async_search_requires_client():
+    with pytest.raises(ValueError):
+        AsyncScopusSearch('TITLE(no client)', view='COMPLETE')
+
+
+def test_async_search_retries_throttled_requests(stub_server):
+    stub_server.throttle_every = 2
+
+    async def fetch():
+        async with AsyncScopusClient(concurrency=4) as client:
+            return await AsyncScopusSearch('TITLE(async throttled)', view='COMPLETE', items_per_query=20,
+                                           client=client).fetch()
+
+    assert len(asyncio.run(fetch())) == 60
+
+
+def test_async_client_retries_timeouts(stub_server):
+    stub_server.latency = 0.3
+    start_n = stub_server.requests_n
+
+    async def fetch():
+        async with AsyncScopusClient(max_retries=1, timeout=0.1) as client:
+            await AsyncScopusSearch('TITLE(async timeout)', view='COMPLETE', client=client).fetch()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(fetch())
+    assert stub_server.requests_n - start_n == 2
+
+
+def test_async_client_concurrency_adapts_to_throttling(stub_server):
+    stub_server.throttle_every = 1
+
+    async def throttled():
+        async with AsyncScopusClient(concurrency=8, max_retries=0) as client:
+            with pytest.raises(Exception, match='status 429'):
+                await client.get_json(stub_server.base_url + '/content/search/scopus', {'query': 'x'}, 'ScopusSearchApi')
+            limits = [client.concurrency_limit]
+            stub_server.throttle_every = 0
+            await client.get_json(stub_server.base_url + '/content/search/scopus', {'query': 'x'}, 'ScopusSearchApi')
+            return limits + [client.concurrency_limit]
+
+    assert asyncio.run(throttled()) == [4, 5]
+
+
+def test_async_search_results_need_fetch(stub_server):
+    async def read_before_fetch():
+        async with AsyncScopusClient() as client:
+            search = AsyncScopusSearch('TITLE(async not fetched)', view='COMPLETE', client=client)
+            with pytest.raises(RuntimeError, match='fetch'):
+                search.valid_results_list
+            await search.fetch()
+            return search.results_n, len(search.valid_results_list)
+
+    assert asyncio.run(read_before_fetch()) == (60, 60)
+
+
+def test_interrupted_async_search_resumes_from_stored_pages(stub_server):
+    # one of the two pages after the first one is throttled and not retried
+    stub_server.requests_n = 0
+    stub_server.throttle_every = 3
+
+    async def fetch(max_retries):
+        async with AsyncScopusClient(max_retries=max_retries) as client:
+            return await AsyncScopusSearch('TITLE(async resumed)', view='COMPLETE', items_per_query=20,
+                                           client=client).fetch()
+
+    with pytest.raises(Exception, match='status 429'):
+        asyncio.run(fetch(0))
+    stub_server.throttle_every = 0
+    start_n = stub_server.requests_n
+
+    assert len(asyncio.run(fetch(8))) == 60
+    assert stub_server.requests_n - start_n == 1
@@ -0,0 +1,20 @@
+from api.scopus_bulk import iter_abstracts
+from api.scopus_abstract_retrieval import ScopusAbstractRetrieval
+
+
+def test_iter_abstracts_dedups_and_reads_the_cache_first(stub_server):
+    ScopusAbstractRetrieval('2-s2.0-9001', view='META')
+    start_n = stub_server.requests_n
+
+    pairs = list(iter_abstracts(['2-s2.0-9002', '2-s2.0-9001', '2-s2.0-9003', '2-s2.0-9002', '2-s2.0-9001'],
+                                view='META', workers=4))
+
+    # the cached abstract comes first, without a request; each missing one is downloaded once
+    assert pairs[0][0] == '2-s2.0-9001'
+    assert sorted(eid for eid, _ in pairs) == ['2-s2.0-9001', '2-s2.0-9002', '2-s2.0-9003']
+    assert stub_server.requests_n - start_n == 2
+    assert dict(pairs)['2-s2.0-9003']['abstracts-retrieval-response']['coredata']['eid'] == '2-s2.0-9003'
+
+    # all of them cached now
+    assert len(list(iter_abstracts(['2-s2.0-9003', '2-s2.0-9002'], view='META'))) == 2
+    assert stub_server.requests_n - start_n == 2
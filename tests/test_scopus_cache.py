@@ -0,0 +1,18 @@
+import os
+
+from api.scopus_cache import MAX_NAME_LENGTH, safe_name, search_query_dir
+
+
+def test_safe_name_keeps_names_the_file_system_accepts():
+    query = 'TITLE(' + ' OR '.join(['graph'] * 25) + ')'
+    assert 200 < len(query) <= MAX_NAME_LENGTH
+    assert safe_name(query) == query.replace(' ', '_')
+
+
+def test_safe_name_hashes_names_over_the_file_system_limit():
+    query = 'TITLE(' + ' OR '.join(['réseau'] * 40) + ')'
+    name = safe_name(query)
+
+    assert len(name.encode('utf-8')) <= MAX_NAME_LENGTH
+    assert name != safe_name(query + ' ')
+    os.makedirs(search_query_dir(query))
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+
+from api.scopus_cache import configure_cache, get_cache_store
+from api.scopus_cache_admin import cache_stats, prune_cache
+from api.scopus_cache_store import cache_key
+from api.scopus_query_catalog import get_query_catalog
+from api.scopus_search import ScopusSearch
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def backend(request, tmp_path):
+    """Each cache backend, the sqlite one on a new database; no time to live left configured afterwards"""
+    if request.param == 'sqlite':
+        configure_cache(backend='sqlite', sqlite_path=str(tmp_path / 'cache.sqlite'))
+    yield request.param
+    configure_cache(backend='files', ttl={'search': None})
+
+
+def age(search, seconds):
+    """Make the cached results of a search created and last read seconds ago"""
+    timestamp = time.time() - seconds
+    store = get_cache_store()
+    if store is not None:
+        with store._connection() as conn:
+            conn.execute('UPDATE cache SET created = ?, accessed = ? WHERE key = ?',
+                         (timestamp, timestamp, cache_key('search', search._cache_params)))
+    else:
+        for name in os.listdir(search._query_dir):
+            os.utime(os.path.join(search._query_dir, name), (timestamp, timestamp))
+
+
+def cached_n(query):
+    return len(get_query_catalog().lookup(query))
+
+
+def test_expired_search_is_downloaded_again(stub_server, backend):
+    query = 'TITLE(ttl {})'.format(backend)
+    age(ScopusSearch(query, view='COMPLETE'), 3 * 86400)
+    configure_cache(ttl={'search': '2d'})
+    start_n = stub_server.requests_n
+
+    assert len(ScopusSearch(query, view='COMPLETE').valid_results_list) == 60
+    assert stub_server.requests_n - start_n == 1
+    # downloaded again just now, read from the cache
+    ScopusSearch(query, view='COMPLETE')
+    assert stub_server.requests_n - start_n == 1
+
+
+def test_prune_expired_searches(stub_server, backend):
+    query = 'TITLE(pruned ttl {})'.format(backend)
+    age(ScopusSearch(query, view='COMPLETE'), 3 * 86400)
+    assert cache_stats(ttls={'search': 2 * 86400})['search']['expired'] >= 1
+
+    removed_n, freed = prune_cache(ttls={'search': 2 * 86400})
+
+    assert removed_n >= 1 and freed > 0
+    assert cached_n(query) == 0
+    assert cache_stats(ttls={'search': 2 * 86400}).get('search', {}).get('expired', 0) == 0
+
+
+def test_prune_to_size_budget_removes_least_recently_used(stub_server, backend):
+    old = ScopusSearch('TITLE(lru old {})'.format(backend), view='COMPLETE')
+    ScopusSearch('TITLE(lru recent {})'.format(backend), view='COMPLETE')
+    age(old, 86400)
+    total = sum(s['bytes'] for s in cache_stats().values())
+    # the least recently used entry alone goes over a budget one byte short
+    removed_n, old_size = prune_cache(max_size=total - 1, dry_run=True)
+    assert removed_n == 1
+
+    prune_cache(max_size=total - old_size)
+
+    assert cached_n('TITLE(lru old {})'.format(backend)) == 0
+    assert cached_n('TITLE(lru recent {})'.format(backend)) == 1
+    assert sum(s['bytes'] for s in cache_stats().values()) == total - old_size
@@ -0,0 +1,31 @@
+from api.scopus_cache import get_cache_store
+from api.scopus_cache_store import SqliteCacheStore, cache_key
+from api.scopus_search import ScopusSearch
+
+
+def test_keys_separate_views_and_params(tmp_path):
+    store = SqliteCacheStore(str(tmp_path / 'cache.sqlite'))
+    store.put('search', {'query': 'TITLE(x)', 'view': 'COMPLETE'}, ['complete'])
+    store.put('search', {'query': 'TITLE(x)', 'view': 'STANDARD'}, ['standard'])
+    store.put('search', {'query': 'TITLE(x)', 'field': 'eid,dc:title'}, ['fields'])
+
+    assert store.get('search', {'query': 'TITLE(x)', 'view': 'complete'}) == ['complete']
+    assert store.get('search', {'query': 'TITLE(x)', 'view': 'STANDARD', 'field': None}) == ['standard']
+    # field lists are keyed whatever their order
+    assert store.get('search', {'query': 'TITLE(x)', 'field': 'dc:title, eid'}) == ['fields']
+    assert store.get('abstract', {'query': 'TITLE(x)', 'view': 'COMPLETE'}) is None
+    assert cache_key('search', {'query': 'TITLE(x)', 'count': 25}) != cache_key('search', {'query': 'TITLE(x)', 'count': 100})
+
+
+def test_searches_cached_by_view_and_params(stub_server, sqlite_cache):
+    start_n = stub_server.requests_n
+    for view, items_per_query in (('COMPLETE', 100), ('STANDARD', 100), ('STANDARD', 20)):
+        ScopusSearch('TITLE(sqlite keys)', view=view, items_per_query=items_per_query)
+    downloaded_n = stub_server.requests_n - start_n
+
+    for view, items_per_query in (('COMPLETE', 100), ('STANDARD', 100), ('STANDARD', 20)):
+        assert len(ScopusSearch('TITLE(sqlite keys)', view=view, items_per_query=items_per_query).valid_results_list) == 60
+
+    assert downloaded_n == 1 + 1 + 3
+    assert stub_server.requests_n - start_n == downloaded_n
+    assert get_cache_store().stats()['search']['entries'] == 3
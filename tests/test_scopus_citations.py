@@ -0,0 +1,21 @@
+from api.scopus_citations import iter_citations
+
+
+def cited_articles(stub_server, first, n):
+    """n cited articles numbered from first, article i cited i % 7 times, as (eid, citedby-count) pairs"""
+    stub_server.citations = {}
+    cited = []
+    for i in range(first, first + n):
+        eid = '2-s2.0-{}'.format(i)
+        stub_server.citations[eid] = list(range(100000 + i * 10, 100000 + i * 10 + i % 7))
+        cited.append((eid, i % 7))
+    return cited
+
+
+def test_iter_citations_yields_in_scheduling_order(stub_server):
+    cited = cited_articles(stub_server, 1000, 60)
+    stub_server.latency = 0.002
+    results = list(iter_citations(cited, workers=8, items_per_query=2))
+
+    assert [eid for eid, _ in results] == [eid for eid, _ in sorted(cited, key=lambda item: item[1], reverse=True)]
+    assert all(len(citing) == dict(cited)[eid] for eid, citing in results)
@@ -0,0 +1,32 @@
+import itertools
+import os
+
+from api.scopus_search import ScopusSearch
+
+
+def test_cursor_paging_walks_past_5000_results(stub_server):
+    stub_server.total_results = 5400
+
+    results = ScopusSearch('TITLE(cursor walk)', view='STANDARD', items_per_query=200, max_items=6000,
+                           cursor=True).valid_results_list
+
+    assert [entry['eid'] for entry in results] == ['2-s2.0-{}'.format(i) for i in range(5400)]
+
+
+def test_interrupted_cursor_walk_resumes_from_cursor_json(stub_server):
+    stub_server.total_results = 5400
+    search = ScopusSearch('TITLE(cursor resumed)', view='STANDARD', items_per_query=200, max_items=6000,
+                          cursor=True, lazy=True)
+
+    # interrupted after 10 pages
+    entries = ScopusSearch.iter_results('TITLE(cursor resumed)', view='STANDARD', items_per_query=200,
+                                        max_items=6000, cursor=True)
+    assert len(list(itertools.islice(entries, 2000))) == 2000
+    entries.close()
+    assert os.path.exists(search._cursor_file)
+    start_n = stub_server.requests_n
+
+    results = search.valid_results_list
+
+    assert stub_server.requests_n - start_n == 17
+    assert [entry['eid'] for entry in results] == ['2-s2.0-{}'.format(i) for i in range(5400)]
@@ -0,0 +1,74 @@
+import csv
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+import pytest
+
+from api.scopus_graph_export import write_graph
+
+NODES = pd.DataFrame({'Id': ['1', '2', '3'],
+                      'Label': ['Rossi, M.', 'O"Brien & <co>', 'Line\nbreak'],
+                      'citations': [3, 0, 12]})
+EDGES = pd.DataFrame({'Source': ['1', '2'], 'Target': ['2', '3'], 'weight': [0.5, float('nan')],
+                      'directed': [True, True]})
+
+
+def test_gdf_parses_back(tmp_path):
+    path = str(tmp_path / 'graph.gdf')
+    assert write_graph(path, NODES, EDGES) == (3, 2)
+
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    rows = list(csv.reader(lines, skipinitialspace=True))
+
+    assert rows[0] == ['nodedef>name VARCHAR', 'Label VARCHAR', 'citations INTEGER']
+    assert rows[1:4] == [['1', 'Rossi; M.', '3'], ['2', "O'Brien & <co>", '0'], ['3', 'Line break', '12']]
+    assert rows[4] == ['edgedef>node1 VARCHAR', 'node2 VARCHAR', 'weight DOUBLE', 'directed BOOLEAN']
+    assert rows[5:] == [['1', '2', '0.5', 'true'], ['2', '3', '', 'true']]
+
+
+def test_graphml_parses_back(tmp_path):
+    path = str(tmp_path / 'graph.graphml')
+    write_graph(path, NODES, EDGES)
+
+    ns = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+    root = ET.parse(path).getroot()
+    keys = dict((key.get('id'), (key.get('attr.name'), key.get('attr.type'))) for key in root.findall('g:key', ns))
+    graph = root.find('g:graph', ns)
+    nodes = dict((node.get('id'), dict((keys[d.get('key')][0], d.text) for d in node.findall('g:data', ns)))
+                 for node in graph.findall('g:node', ns))
+    edges = [(edge.get('source'), edge.get('target'), dict((keys[d.get('key')][0], d.text) for d in edge.findall('g:data', ns)))
+             for edge in graph.findall('g:edge', ns)]
+
+    assert graph.get('edgedefault') == 'directed'
+    assert sorted(keys.values()) == [('Label', 'string'), ('citations', 'long'), ('weight', 'double')]
+    assert nodes == {'1': {'Label': 'Rossi, M.', 'citations': '3'}, '2': {'Label': 'O"Brien & <co>', 'citations': '0'},
+                     '3': {'Label': 'Line\nbreak', 'citations': '12'}}
+    assert edges == [('1', '2', {'weight': '0.5'}), ('2', '3', {})]
+
+
+def test_gexf_parses_back(tmp_path):
+    path = str(tmp_path / 'graph.gexf')
+    write_graph(path, NODES, EDGES)
+
+    ns = {'g': 'http://www.gexf.net/1.2draft'}
+    graph = ET.parse(path).getroot().find('g:graph', ns)
+    titles = dict(((attributes.get('class'), a.get('id')), a.get('title'))
+                  for attributes in graph.findall('g:attributes', ns) for a in attributes.findall('g:attribute', ns))
+
+    def values(element, attribute_class):
+        return dict((titles[(attribute_class, v.get('for'))], v.get('value'))
+                    for v in element.findall('g:attvalues/g:attvalue', ns))
+
+    nodes = dict((node.get('id'), (node.get('label'), values(node, 'node'))) for node in graph.findall('g:nodes/g:node', ns))
+    edges = [(edge.get('source'), edge.get('target'), values(edge, 'edge')) for edge in graph.findall('g:edges/g:edge', ns)]
+
+    assert graph.get('defaultedgetype') == 'directed'
+    assert nodes == {'1': ('Rossi, M.', {'citations': '3'}), '2': ('O"Brien & <co>', {'citations': '0'}),
+                     '3': ('Line\nbreak', {'citations': '12'})}
+    assert edges == [('1', '2', {'weight': '0.5'}), ('2', '3', {})]
+
+
+def test_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        write_graph(str(tmp_path / 'graph.dot'), NODES, EDGES)
@@ -0,0 +1,51 @@
+import pytest
+
+from api.scopus_cache import remove_search_query
+from api.scopus_cache_admin import prune_cache
+from api.scopus_join import iter_joined, join_queries
+from api.scopus_query_catalog import get_query_catalog
+from api.scopus_search import ScopusSearch
+
+
+def test_join_queries_streams_unique_entries(stub_server, tmp_path):
+    ScopusSearch('TITLE(join a)', view='COMPLETE')
+    ScopusSearch('TITLE(join b)', view='COMPLETE')
+
+    output_file, written_n = join_queries(['TITLE(join a)', 'TITLE(join b)'], str(tmp_path / 'joined'))
+
+    assert written_n == 60
+
+
+def test_sqlite_prune_removes_catalog_rows(stub_server, sqlite_cache):
+    ScopusSearch('TITLE(pruned sqlite)', view='COMPLETE')
+    assert get_query_catalog().lookup('TITLE(pruned sqlite)')
+
+    prune_cache(max_size=0)
+
+    assert get_query_catalog().lookup('TITLE(pruned sqlite)') == []
+    with pytest.raises(ValueError):
+        list(iter_joined(['TITLE(pruned sqlite)']))
+
+
+def test_join_of_removed_query_raises(stub_server, tmp_path):
+    search = ScopusSearch('TITLE(removed files)', view='COMPLETE')
+    # removed behind the catalog's back
+    remove_search_query(search._query_dir)
+
+    with pytest.raises(ValueError, match='search it again'):
+        join_queries(['TITLE(removed files)'], str(tmp_path / 'joined'))
+    assert not (tmp_path / 'joined').exists()
+    assert get_query_catalog().lookup('TITLE(removed files)') == []
+
+
+def test_iter_joined_streams_clean_json(stub_server, monkeypatch):
+    pytest.importorskip('ijson')
+    ScopusSearch('TITLE(join streamed)', view='COMPLETE')
+
+    def read_json(path):
+        raise AssertionError('{} loaded whole'.format(path))
+
+    monkeypatch.setattr('api.scopus_cache.read_json', read_json)
+    joined = iter_joined(['TITLE(join streamed)'])
+
+    assert len([entry['eid'] for entry in joined]) == 60
@@ -0,0 +1,54 @@
+import io
+import os
+import json
+
+from api.scopus_cache import read_json, search_page_file
+from api.scopus_page_parser import iter_page_entries, parse_page
+from api.scopus_search import ScopusSearch
+from benchmarks.stub_server import fake_entry
+
+
+class ReadCounter(io.BytesIO):
+    """BytesIO counting the bytes read"""
+    read_n = 0
+
+    def read(self, size=-1):
+        data = io.BytesIO.read(self, size)
+        self.read_n += len(data)
+        return data
+
+
+def page_payload(entries_n):
+    return json.dumps({'search-results': {'opensearch:totalResults': '1000',
+                                          'entry': [fake_entry(i) for i in range(entries_n)]}}).encode('utf-8')
+
+
+def test_iter_page_entries_yields_before_the_page_is_read():
+    payload = page_payload(200)
+    stream = ReadCounter(payload)
+    entries = iter_page_entries(stream)
+
+    assert next(entries) == fake_entry(0)
+    assert stream.read_n < len(payload) / 2
+    assert len(list(entries)) == 199
+
+
+def test_parse_page_builds_the_decoded_document():
+    payload = page_payload(30)
+    assert parse_page(io.BytesIO(payload)) == json.loads(payload)
+
+
+def test_incremental_iter_results_streams_pages_to_disk(stub_server):
+    results = ScopusSearch.iter_results('TITLE(streamed)', view='COMPLETE', items_per_query=25, incremental=True)
+    entries = [next(results) for _ in range(26)]
+    search = ScopusSearch('TITLE(streamed)', view='COMPLETE', lazy=True)
+    # the second page is being read: its first entry has been yielded before the page file is complete
+    assert os.path.exists(search_page_file(search._query_dir, 25) + '.part')
+    assert not os.path.exists(search_page_file(search._query_dir, 25))
+
+    entries += list(results)
+
+    assert entries == ScopusSearch('TITLE(not streamed)', view='COMPLETE', items_per_query=25).valid_results_list
+    page = read_json(search_page_file(search._query_dir, 50))
+    assert page['search-results']['opensearch:totalResults'] == '60'
+    assert page['search-results']['entry'] == [fake_entry(i) for i in range(50, 60)]
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from api.scopus_rate_limit import DEFAULT_MAX_RATE, RateLimiter
+
+
+def quota_headers(remaining, reset_in):
+    return {'X-RateLimit-Remaining': str(remaining), 'X-RateLimit-Reset': str(time.time() + reset_in)}
+
+
+def test_quota_headers_pace_the_requests():
+    limiter = RateLimiter(rate=9, quota_pacing=True, min_rate=0.1)
+    assert limiter.quota_rate is None
+
+    limiter.update(200, quota_headers(100, 100))
+    assert limiter.quota_rate == pytest.approx(1.0, rel=0.01)
+    assert limiter.rate == pytest.approx(1.0, rel=0.01)
+
+    limiter.update(200, quota_headers(50, 100))
+    assert limiter.rate == pytest.approx(0.5, rel=0.01)
+
+    # a quota large enough leaves the adaptive rate in charge
+    limiter.update(200, quota_headers(100000, 100))
+    assert limiter.rate == pytest.approx(9.3)
+
+    # responses without the headers keep the last pace
+    limiter.update(200, quota_headers(50, 100))
+    limiter.update(200, {})
+    assert limiter.rate == pytest.approx(0.5, rel=0.01)
+
+
+def test_paced_requests_wait():
+    limiter = RateLimiter(rate=9, burst=1, quota_pacing=True)
+    limiter.update(200, quota_headers(20, 10))
+    limiter.acquire()
+    start = time.time()
+    limiter.acquire()
+    assert time.time() - start == pytest.approx(0.5, abs=0.1)
+
+
+def test_exhausted_quota_pauses_until_reset():
+    limiter = RateLimiter(rate=9, burst=1)
+    limiter.update(200, quota_headers(0, 0.3))
+    start = time.time()
+    limiter.acquire()
+    assert time.time() - start == pytest.approx(0.3, abs=0.1)
+    # past the reset, the next response tells the new quota
+    limiter.update(200, quota_headers(1000, -1))
+    assert limiter.quota_rate is None
+
+
+def test_quota_pacing_is_off_by_default():
+    limiter = RateLimiter(rate=9)
+    # a weekly quota
+    limiter.update(200, quota_headers(20000, 7 * 86400))
+    assert limiter.rate == pytest.approx(9.1)
+
+
+def test_quota_pace_never_below_min_rate():
+    limiter = RateLimiter(rate=9, min_rate=0.5, quota_pacing=True)
+    limiter.update(200, quota_headers(20000, 7 * 86400))
+    assert limiter.quota_rate == pytest.approx(0.033, rel=0.01)
+    assert limiter.rate == 0.5
+
+
+def test_adaptive_rate_grows_above_the_starting_rate():
+    limiter = RateLimiter(rate=9)
+    for _ in range(1000):
+        limiter.update(200, {})
+    assert limiter.rate == DEFAULT_MAX_RATE
+
+    limiter.update(429, {})
+    assert limiter.rate == DEFAULT_MAX_RATE / 2
+
+    assert RateLimiter(rate=9, max_rate=9).rate == 9
+    limiter = RateLimiter(rate=9, max_rate=9)
+    limiter.update(200, {})
+    assert limiter.rate == 9
@@ -0,0 +1,86 @@
+import os
+
+from api.scopus_cache import search_page_file, write_json
+from api.scopus_search import ScopusSearch
+
+
+def test_iter_results_validates_raw_only_cache():
+    search = ScopusSearch('TITLE(raw only)', view='COMPLETE', lazy=True)
+    write_json(search._raw_file, [{'eid': '1', 'author': []}, {'noeid': 1}, {'eid': '1', 'author': []}])
+    assert not os.path.exists(search._clean_file)
+
+    entries = list(ScopusSearch.iter_results('TITLE(raw only)', view='COMPLETE'))
+
+    assert entries == [{'eid': '1', 'author': []}]
+    assert entries == ScopusSearch('TITLE(raw only)', view='COMPLETE').valid_results_list
+
+
+def test_entries_without_numeric_citedby_count_are_kept():
+    search = ScopusSearch('TITLE(citedby null)', view='COMPLETE', lazy=True)
+    write_json(search._raw_file, [{'eid': '1', 'author': [], 'citedby-count': None},
+                                  {'eid': '2', 'author': [], 'citedby-count': 'n/a'},
+                                  {'eid': '3', 'author': [], 'citedby-count': '4'}])
+
+    results = ScopusSearch('TITLE(citedby null)', view='COMPLETE').valid_results_list
+
+    assert [entry['citedby-count'] for entry in results] == [0, 0, 4]
+
+
+def test_custom_validators_run_over_cached_results(stub_server):
+    def even(entry):
+        return entry if int(entry['eid'].rsplit('-', 1)[-1]) % 2 == 0 else None
+
+    first = ScopusSearch('TITLE(custom validators)', view='COMPLETE', validators=[even]).valid_results_list
+    cached = ScopusSearch('TITLE(custom validators)', view='COMPLETE')
+
+    assert len(first) == 30
+    assert len(cached.valid_results_list) == 60
+    assert ScopusSearch('TITLE(custom validators)', view='COMPLETE', validators=[even]).valid_results_list == first
+    assert list(ScopusSearch.iter_results('TITLE(custom validators)', view='COMPLETE', validators=[even])) == first
+
+
+def test_cache_hit_results_n_and_repeat_reads(stub_server, caplog, monkeypatch):
+    touched = []
+    monkeypatch.setattr('api.scopus_search.touch_cache_file', touched.append)
+    stub_server.total_results = 45
+    ScopusSearch('TITLE(lazy hit)', view='COMPLETE')
+    search = ScopusSearch('TITLE(lazy hit)', view='COMPLETE', lazy=True)
+    assert search.results_n == 45
+    assert touched == [search._clean_file]
+
+    caplog.clear()
+    again = ScopusSearch('TITLE(lazy hit)', view='COMPLETE', lazy=True)
+
+    assert again.results_n == 45
+    assert len(again.valid_results_list) == 45
+    assert touched == [search._clean_file]
+    assert 'already been cached' not in caplog.text
+    assert 'ScopusSearch completed' not in caplog.text
+
+
+
+def test_parallel_paging_keeps_page_order(stub_server):
+    stub_server.total_results = 250
+    stub_server.latency = 0.005
+    start_n = stub_server.requests_n
+
+    results = ScopusSearch('TITLE(parallel pages)', view='STANDARD', items_per_query=25, workers=8).valid_results_list
+
+    assert [entry['eid'] for entry in results] == ['2-s2.0-{}'.format(i) for i in range(250)]
+    assert stub_server.requests_n - start_n == 10
+
+
+def test_download_resumes_from_partial_page_files(stub_server):
+    search = ScopusSearch('TITLE(resumed pages)', view='COMPLETE', items_per_query=10)
+    # interrupted download: no raw.json nor clean.json, a page missing and a page truncated while written
+    os.remove(search._raw_file)
+    os.remove(search._clean_file)
+    os.remove(search_page_file(search._query_dir, 20))
+    with open(search_page_file(search._query_dir, 40), 'r+') as f:
+        f.truncate(100)
+    start_n = stub_server.requests_n
+
+    results = ScopusSearch('TITLE(resumed pages)', view='COMPLETE', items_per_query=10).valid_results_list
+
+    assert stub_server.requests_n - start_n == 2
+    assert [entry['eid'] for entry in results] == ['2-s2.0-{}'.format(i) for i in range(60)]